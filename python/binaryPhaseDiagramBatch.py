@@ -0,0 +1,172 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import warnings
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import binaryPhaseDiagramFunctions
+
+# Headless generation of binary phase diagrams from a JSON spec file, e.g.
+#
+#   {
+#       "defaults": {"ntstep": 12, "nxstep": 12, "refine": 2, "smooth": 1},
+#       "jobs": [
+#           {"database": "data/Kaye_NobleMetals.dat", "el1": "Pd", "el2": "Ru", "tlo": 1000, "thi": 2500},
+#           {"name": "PdRu-C", "database": "data/Kaye_NobleMetals.dat", "el1": "Pd", "el2": "Ru", "tlo": 700, "thi": 2200, "tunit": "C"}
+#       ]
+#   }
+#
+# Each job starts from jobDefaults, updated by the spec defaults and then by the job itself. A job runs the
+# initial grid, then its refine and smooth passes (as the GUI Refine and Auto Smoothen buttons), then, if trace
+# is a positive calculation budget, traces the phase boundaries (as the GUI Trace Boundaries button), optionally
+# labels the diagram, and writes <name>.<format> (the plot), <name>.npz (the diagram archive, loadable as an
+# overlay), <name>.metrics.json (counters and timings of each pass, see diagramMetrics) and <name>.log
+# (Thermochimica output) to the output directory. Jobs run in a pool of processes,
+# each job in its own temporary working directory, so that their input and output files do not collide;
+# the parsed data-file and result caches are shared (see thermoCache).
+#
+# Usage (from the Thermochimica root directory):
+#   python3 python/binaryPhaseDiagramBatch.py spec.json [-j processes] [-o outputs/diagrams] [--trace budget]
+#
+# --trace sets the boundary tracing budget of every job, overriding the spec.
+
+jobDefaults = {
+    'name': None,
+    'pressure': 1,
+    'tunit': 'K',
+    'punit': 'atm',
+    'munit': 'moles',
+    'xlo': 0,
+    'xhi': 1,
+    'nxstep': 10,
+    'ntstep': 10,
+    'refine': 0,
+    'smooth': 0,
+    'trace': 0,
+    'fuzzy': False,
+    'warmStart': False,
+    'label': True,
+    'format': 'png',
+    'dpi': 300
+}
+
+def readSpec(specFile):
+    # List of complete job dictionaries from a spec file, with data-file paths made absolute
+    with open(specFile) as f:
+        spec = json.load(f)
+    if isinstance(spec, list):
+        spec = {'jobs': spec}
+    jobs = []
+    for entry in spec['jobs']:
+        job = dict(jobDefaults)
+        job.update(spec.get('defaults', {}))
+        job.update(entry)
+        for key in ['database', 'el1', 'el2', 'tlo', 'thi']:
+            if key not in job:
+                raise ValueError(f'Job {entry} is missing "{key}"')
+        job['database'] = os.path.abspath(job['database'])
+        if job['name'] is None:
+            job['name'] = f'{job["el1"]}-{job["el2"]}_{os.path.splitext(os.path.basename(job["database"]))[0]}'
+        jobs.append(job)
+    names = [job['name'] for job in jobs]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicates:
+        raise ValueError(f'Job names must be unique: {", ".join(duplicates)}')
+    return jobs
+
+def runJob(job, outputDir, thermochimica_path='.'):
+    # Generate one diagram in a temporary working directory; returns (name, status, seconds)
+    start = time.time()
+    thermochimica_path = os.path.abspath(thermochimica_path)
+    outputDir = os.path.abspath(outputDir)
+    # Caches are shared between jobs (and with interactive use) rather than kept per working directory
+    os.environ.setdefault('THERMOCHIMICA_CACHE_DIR', os.path.join(thermochimica_path, 'outputs'))
+    workDir = tempfile.mkdtemp(prefix=f'{job["name"]}-', dir=outputDir)
+    os.makedirs(os.path.join(workDir, 'inputs'))
+    os.makedirs(os.path.join(workDir, 'outputs'))
+    os.symlink(os.path.join(thermochimica_path, 'bin'), os.path.join(workDir, 'bin'))
+    cwd = os.getcwd()
+    # Thermochimica writes straight to the process stdout, so redirect at the file descriptor level
+    sys.stdout.flush()
+    stdout = os.dup(1)
+    log = open(os.path.join(outputDir, f'{job["name"]}.log'), 'w')
+    os.dup2(log.fileno(), 1)
+    status = 'done'
+    try:
+        os.chdir(workDir)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pd = binaryPhaseDiagramFunctions.diagram(job['database'], False, False)
+            pd.run(job['ntstep'], job['nxstep'], job['pressure'], job['tunit'], job['punit'], job['xlo'], job['xhi'],
+                   job['tlo'], job['thi'], job['el1'], job['el2'], job['munit'], fuzzy=job['fuzzy'], warmStart=job['warmStart'])
+            for i in range(job['refine']):
+                pd.refinery()
+            for i in range(job['smooth']):
+                pd.autoSmooth()
+            if job['trace'] > 0:
+                pd.traceBoundaries(budget=job['trace'])
+            if job['label']:
+                pd.autoLabel()
+            pd.makePlot()
+            pd.exportFormat = job['format']
+            pd.exportDPI = job['dpi']
+            pd.exportFileName = job['name']
+            if pd.exportPlot() != 0:
+                raise RuntimeError('Plot export failed')
+            shutil.move(os.path.join('outputs', f'{job["name"]}.{job["format"]}'), os.path.join(outputDir, f'{job["name"]}.{job["format"]}'))
+            pd.saveData(os.path.join(outputDir, f'{job["name"]}.npz'))
+            pd.metrics.export(os.path.join(outputDir, f'{job["name"]}.metrics.json'))
+    except (Exception, SystemExit):
+        traceback.print_exc(file=sys.stdout)
+        status = 'failed'
+    finally:
+        sys.stdout.flush()
+        os.dup2(stdout, 1)
+        os.close(stdout)
+        log.close()
+        os.chdir(cwd)
+        plt.close('all')
+        shutil.rmtree(workDir, ignore_errors=True)
+    return job['name'], status, time.time() - start
+
+def runBatch(jobs, outputDir='outputs/diagrams', processes=None, thermochimica_path='.'):
+    # Run jobs across a process pool, printing each result as it finishes; returns the list of results
+    os.makedirs(outputDir, exist_ok=True)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(min(processes, len(jobs)), 1)) as executor:
+        futures = [executor.submit(runJob, job, outputDir, thermochimica_path) for job in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            name, status, seconds = future.result()
+            results.append((name, status, seconds))
+            print(f'{name}: {status} ({seconds:.1f} s)', flush=True)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate binary phase diagrams listed in a JSON spec file.')
+    parser.add_argument('spec', help='JSON spec file')
+    parser.add_argument('-j', '--processes', type=int, default=None, help='number of diagrams generated at once (default: number of CPUs)')
+    parser.add_argument('-o', '--output', default='outputs/diagrams', help='directory for plots, diagram data and logs')
+    parser.add_argument('-t', '--thermochimica-path', default='.', help='Thermochimica root directory (containing bin/)')
+    parser.add_argument('--trace', type=int, default=None, metavar='BUDGET', help='trace phase boundaries in every diagram, running at most BUDGET calculations (0 to disable)')
+    args = parser.parse_args()
+    if not os.path.isfile(os.path.join(args.thermochimica_path, 'bin', 'PhaseDiagramDataGen')):
+        sys.exit('No Thermochimica executable available: run make, or give the Thermochimica root directory with -t.')
+    jobs = readSpec(args.spec)
+    if args.trace is not None:
+        for job in jobs:
+            job['trace'] = args.trace
+    results = runBatch(jobs, args.output, args.processes, args.thermochimica_path)
+    failed = [name for name, status, seconds in results if status != 'done']
+    print(f'{len(results) - len(failed)} of {len(results)} diagrams generated in {os.path.abspath(args.output)}')
+    if failed:
+        print(f'Failed: {", ".join(failed)} (see the .log files)')
+        sys.exit(1)
@@ -12,16 +12,159 @@ from shapely.geometry import LineString
 from shapely.geometry import GeometryCollection
 from shapely.prepared import prep
 from shapely.ops import split
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
 from functools import reduce
 import operator
 import csv
+import pickle
 import thermoTools
+import thermoCache
+import spatialIndex
+import diagramArchive
+import diagramMetrics
+from diagramMetrics import measured, timed
 
 phaseIncludeTol = 1e-8
 
+def groupBoundaries(b, nBoundaries):
+    # Point indices (in point order) of each boundary ID in b, from a single stable sort
+    order = np.argsort(b, kind='stable')
+    edges = np.searchsorted(np.asarray(b)[order], np.arange(nBoundaries+1))
+    return [order[edges[j]:edges[j+1]] for j in range(nBoundaries)]
+
+def boundaryPhases(name1, name2):
+    # If a miscibility gap label has been used unnecessarily, remove it
+    if name1.find('#') > 0:
+        if not(name1[0:name1.find('#')] == name2):
+            name1 = name1[0:name1.find('#')]
+    if name2.find('#') > 0:
+        if not(name2[0:name2.find('#')] == name1):
+            name2 = name2[0:name2.find('#')]
+    return name1, name2
+
+def recordPhases(record):
+    # Phases present in a calculation record with their mole fractions of the second element, or None if it failed
+    if not record:
+        return None
+    phases = []
+    for phaseType in ['solution phases','pure condensed phases']:
+        for phaseName, phase in record[phaseType].items():
+            if phase['moles'] > phaseIncludeTol:
+                phases.append((phaseName, phase['elements']))
+    return phases
+
+def diagramLines(ts, x1, x2, boundaries, boundaryIndices, phases, x0data, x1data, mint, maxt):
+    # Lines of a phase diagram (at unshifted temperatures): the lines joining the ends of the single-phase
+    # temperature ranges along x=0 and x=1 to the boundaries they meet, and for each boundary its two sides
+    # plus the invariant lines at its ends
+    edgeLines = []
+    bEdgeLine = [[False,False] for i in range(len(boundaries))]
+    for xEdge, edgeData, extreme in [(0, x0data, np.argmin), (1, x1data, np.argmax)]:
+        for j in range(len(edgeData[1])):
+            if not edgeData[0][j] in phases:
+                continue
+            # The bottom of the range meets the phase below, the top the phase above
+            for neighbour, tEdge in [(j-1, edgeData[1][j]), (j+1, edgeData[2][j])]:
+                if neighbour < 0 or neighbour >= len(edgeData[1]):
+                    continue
+                # Join to the end (nearest the edge) of the closest boundary between the two phases
+                match = []
+                for k in range(len(boundaries)):
+                    if (edgeData[0][j] in boundaries[k]) and (edgeData[0][neighbour] in boundaries[k]):
+                        inds = boundaryIndices[k]
+                        if len(inds) < 2:
+                            continue
+                        xs = x1[inds] if boundaries[k].index(edgeData[0][j]) == 0 else x2[inds]
+                        i = extreme(xs)
+                        match.append([(xEdge - xs[i])**2 + (tEdge - ts[inds][i])**2, k, xs[i], ts[inds][i]])
+                if len(match) > 0:
+                    length, k, xMatch, tMatch = min(match, key=lambda m: m[0])
+                    edgeLines.append(np.array([[xEdge, tEdge], [xMatch, tMatch]]))
+                    inds = boundaryIndices[k]
+                    if tMatch == np.min(ts[inds]):
+                        bEdgeLine[k][0] = True
+                    if tMatch == np.max(ts[inds]):
+                        bEdgeLine[k][1] = True
+
+    boundaryLines = []
+    for j in range(len(boundaries)):
+        lines = []
+        inds = boundaryIndices[j]
+        if len(inds) >= 2:
+            ttt = ts[inds]
+            x1t = x1[inds]
+            x2t = x2[inds]
+            lines.append(np.column_stack([x1t, ttt]))
+            lines.append(np.column_stack([x2t[::-1], ttt[::-1]]))
+            minj = np.argmin(ttt)
+            maxj = np.argmax(ttt)
+            # invariant temperatures
+            if (ttt[minj] > mint) and not(bEdgeLine[j][0]):
+                lines.append(np.array([[x1t[minj], ttt[minj]], [x2t[minj], ttt[minj]]]))
+            if (ttt[maxj] < maxt) and not(bEdgeLine[j][1]):
+                lines.append(np.array([[x1t[maxj], ttt[maxj]], [x2t[maxj], ttt[maxj]]]))
+        boundaryLines.append(lines)
+    return edgeLines, boundaryLines
+
+def splitStyle(style):
+    # Split a matplotlib format string such as '.-' into its line style ('-', or None for markers only)
+    # and its marker ('.', or None for lines only)
+    for lineStyle in ['--', '-.', ':', '-']:
+        if lineStyle in style:
+            marker = style.replace(lineStyle, '', 1)
+            return lineStyle, (marker if marker else None)
+    return None, (style if style else None)
+
+def drawLines(ax, edgeLines, boundaryLines, colors, style, tshift):
+    # Draw diagramLines output on ax with a single LineCollection: edge lines solid black, boundary j in
+    # colors[j] with the line style of style, plus one scatter of the points if style has a marker
+    lineStyle, marker = splitStyle(style)
+    shift = np.array([0, tshift])
+    segments = [line - shift for line in edgeLines]
+    segmentColors = [to_rgba('k') for line in edgeLines]
+    lineStyles = ['solid' for line in edgeLines]
+    points = []
+    pointColors = []
+    for j, lines in enumerate(boundaryLines):
+        for line in lines:
+            if marker:
+                points.append(line - shift)
+                pointColors.extend([to_rgba(colors[j]) for i in range(len(line))])
+            if lineStyle:
+                segments.append(line - shift)
+                segmentColors.append(to_rgba(colors[j]))
+                lineStyles.append(lineStyle)
+    if len(segments) > 0:
+        ax.add_collection(LineCollection(segments, colors=segmentColors, linestyles=lineStyles))
+    if len(points) > 0:
+        points = np.concatenate(points)
+        ax.scatter(points[:,0], points[:,1], s=plt.rcParams['lines.markersize']**2, c=pointColors, marker=marker)
+
+class SaveData(object):
+    def __init__(self,ts,x1,x2,boundaries,phases,b,x0data,x1data,mint,maxt):
+        self.ts = ts
+        self.x1 = x1
+        self.x2 = x2
+        self.boundaries = boundaries
+        self.phases = phases
+        self.b = b
+        self.x0data = x0data
+        self.x1data = x1data
+        self.mint = mint
+        self.maxt = maxt
+
+def loadDiagramData(filename):
+    # Saved diagram data for overlays: a diagram archive, or a SaveData pickle from earlier versions
+    if filename.lower().endswith('.pkl'):
+        with open(filename, 'rb') as inp:
+            return pickle.load(inp)
+    return diagramArchive.DiagramArchive(filename)
+
 class diagram:
-    def __init__(self, datafile, active, interactivePlot):
+    def __init__(self, datafile, active, interactivePlot, thermochimicaPath = '.'):
         self.datafile = datafile
+        self.thermochimicaPath = thermochimicaPath
         self.active = active
         self.interactivePlot = interactivePlot
         self.mint = 1e5
@@ -29,8 +172,11 @@ class diagram:
         self.ts = np.empty([0])
         self.x1 = np.empty([0])
         self.x2 = np.empty([0])
-        self.p1 = []
-        self.p2 = []
+        # Phases of each 2-phase point, as codes into phaseNames
+        self.c1 = np.empty([0], dtype=int)
+        self.c2 = np.empty([0], dtype=int)
+        self.phaseNames = []
+        self.phaseCodes = {}
         self.el1 = ''
         self.el2 = ''
         self.tunit = 'K'
@@ -47,7 +193,7 @@ class diagram:
         self.plotMarker = '-'
         self.plotColor = 'colorful'
         if self.active:
-            self.backup = diagram(self.datafile, False, self.interactivePlot)
+            self.backup = diagram(self.datafile, False, self.interactivePlot, self.thermochimicaPath)
         else:
             self.backup = []
         self.currentPlot = []
@@ -56,11 +202,20 @@ class diagram:
         self.exportDPI = 300
         self.resRef = 7
         self.resSmooth = 7
-        self.gapLimit = np.Inf
+        self.gapLimit = np.inf
         self.figureList = []
         self.boundaries = []
         self.phases = []
         self.b = []
+        # Point indices of each boundary, rebuilt by phaseBoundaries only when the inputs to the grouping change
+        self.boundaryIndices = []
+        self.boundaryState = None
+        # KD-tree over the (x, T) points of the 2-phase points, built on first query and then kept up to date
+        self.pointTree = None
+        self.pointPositions = None
+        # Plot line geometry of this diagram and of the loaded diagram, with the state it was computed for
+        self.lineCache = None
+        self.loadedLineCache = None
         self.congruentFound = [False for i in range(len(self.phases))]
         self.label1phase = True
         self.label2phase = True
@@ -69,14 +224,20 @@ class diagram:
         self.experimentColor = 'bland'
         self.showExperiment = True
         self.pointDetails = []
-        self.pointIndex = np.empty([0])
+        self.pointIndex = np.empty([0], dtype=int)
         self.suppressed = []
         self.loadedDiagram = []
         self.loaded = False
         self.showLoaded = True
         self.saveDataName = 'savedDiagram'
         self.fuzzy = False
-    def run(self,ntstep,nxstep,pressure,tunit,punit,xlo,xhi,tlo,thi,el1,el2,munit,fuzzy=False):
+        self.warmStart = False
+        # Persistent cache of solved points, opened on first use
+        self.resultCache = None
+        # Counters and timings of each run and refinement pass
+        self.metrics = diagramMetrics.DiagramMetrics()
+    @measured
+    def run(self,ntstep,nxstep,pressure,tunit,punit,xlo,xhi,tlo,thi,el1,el2,munit,fuzzy=False,warmStart=False):
         self.pressure = pressure
         self.tunit = tunit
         self.punit = punit
@@ -87,8 +248,11 @@ class diagram:
         self.ts = np.empty([0])
         self.x1 = np.empty([0])
         self.x2 = np.empty([0])
-        self.p1 = []
-        self.p2 = []
+        # Phases of each 2-phase point, as codes into phaseNames
+        self.c1 = np.empty([0], dtype=int)
+        self.c2 = np.empty([0], dtype=int)
+        self.phaseNames = []
+        self.phaseCodes = {}
         self.x0data = [[],[],[]]
         self.x1data = [[],[],[]]
         # Check temperature unit for shift
@@ -101,6 +265,8 @@ class diagram:
         self.maxt = thi + self.tshift
         # Get fuzzy stoichiometry setting
         self.fuzzy = fuzzy
+        # Seed each calculation from the previous one along the sweep
+        self.warmStart = warmStart
         self.labels = []
         self.resRef = 7
         self.resSmooth = 7
@@ -108,105 +274,118 @@ class diagram:
         self.experimentalData = []
         self.experimentNames = []
         self.pointDetails = []
-        self.pointIndex = np.empty([0])
+        self.pointIndex = np.empty([0], dtype=int)
+        self.pointTree = None
+        self.pointPositions = None
+        self.lineCache = None
         self.suppressed = []
         self.loadedDiagram = []
         self.loaded = False
         self.saveDataName = 'savedDiagram'
-        self.backup = diagram(self.datafile, False, self.interactivePlot)
+        self.backup = diagram(self.datafile, False, self.interactivePlot, self.thermochimicaPath)
         for fig in self.figureList:
             plt.close(fig=fig)
         self.runCalc()
         self.outline = MultiPolygon([Polygon([[0,self.mint], [0, self.maxt], [1, self.maxt], [1, self.mint]])])
+    @measured
     def refinery(self):
-        self.refineLimit(0,(self.maxt-self.mint)/(self.resRef**2)/10)
-        self.refineLimit(1,(self.maxt-self.mint)/(self.resRef**2)/10)
+        self.refineLimit([0,1],(self.maxt-self.mint)/(self.resRef**2)/10)
         self.autoRefine(self.resRef**2)
         self.resRef += 1
+    @measured
     def autoSmooth(self):
         self.autoRefine2Phase(self.resSmooth**2)
         self.resSmooth += 1
+    @timed('parsing')
     def processPhaseDiagramData(self):
-        f = open(self.outputFileName,)
+        # New 2-phase points are collected separately and then merged into the sorted arrays
+        ts = []
+        x1 = []
+        x2 = []
+        c1 = []
+        c2 = []
+        nResults = 0
+        # Stream the output one calculation at a time rather than loading it all at once
         try:
-            data = json.load(f)
-            f.close()
-        except:
-            f.close()
-            print('Data load failed, aborting phase diagram update')
-            return
-        if list(data.keys())[0] != '1':
-            print('Output does not contain data series')
-            exit()
-        ts = self.ts.tolist()
-        x1 = self.x1.tolist()
-        x2 = self.x2.tolist()
-        pointIndex = self.pointIndex.tolist()
-        for i in list(data.keys()):
-            try:
-                self.mint = min(self.mint,data[i]['temperature'])
-                self.maxt = max(self.maxt,data[i]['temperature'])
-            except:
-                continue
-            nPhases = 0
-            for phaseType in ['solution phases','pure condensed phases']:
-                for phaseName in list(data[i][phaseType].keys()):
-                    if (data[i][phaseType][phaseName]['moles'] > phaseIncludeTol):
-                        nPhases += 1
-            if nPhases == 2:
-                ts.append(data[i]['temperature'])
-                boundPhases = []
-                boundComps = []
+            for i, record in thermoTools.iterDatabase(self.outputFileName):
+                if not isinstance(i, int):
+                    print('Output does not contain data series')
+                    exit()
+                try:
+                    self.mint = min(self.mint,record['temperature'])
+                    self.maxt = max(self.maxt,record['temperature'])
+                except:
+                    continue
+                nResults += 1
+                nPhases = 0
                 for phaseType in ['solution phases','pure condensed phases']:
-                    for phaseName in list(data[i][phaseType].keys()):
-                        if (data[i][phaseType][phaseName]['moles'] > phaseIncludeTol):
-                            boundPhases.append(phaseName)
-                            boundComps.append(data[i][phaseType][phaseName]['elements'][self.el2]['mole fraction of phase by element'])
-                x1.append(boundComps[0])
-                x2.append(boundComps[1])
-                pointIndex.append(len(pointIndex))
-                self.p1.append(boundPhases[0])
-                self.p2.append(boundPhases[1])
-                self.pointDetails.append(f'Temperature = {data[i]["temperature"]:6.2f}\nMoles of {self.el1} = {data[i]["elements"][self.el1]["moles"]:9.8f}\nMoles of {self.el2} = {data[i]["elements"][self.el2]["moles"]:9.8f}\nPhase 1 = {boundPhases[0]} at {boundComps[0]:5.4f} moles {self.el2}\nPhase 2 = {boundPhases[1]} at {boundComps[1]:5.4f} moles {self.el2}\nIntegral Gibbs Energy = {data[i]["integral Gibbs energy"]:.2f}\nNumber of GEM iterations = {data[i]["GEM iterations"]}')
-                self.suppressed.append(False)
-            elif nPhases == 1:
-                if not(self.el2 in list(data[i]['elements'].keys())):
+                    for phaseName in list(record[phaseType].keys()):
+                        if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                            nPhases += 1
+                if nPhases == 2:
+                    ts.append(record['temperature'])
+                    boundPhases = []
+                    boundComps = []
                     for phaseType in ['solution phases','pure condensed phases']:
-                        for phaseName in list(data[i][phaseType].keys()):
-                            if (data[i][phaseType][phaseName]['moles'] > phaseIncludeTol):
-                                pname = phaseName
-                    if not(pname in self.x0data[0]):
-                        self.x0data[0].append(pname)
-                        self.x0data[1].append(data[i]['temperature'])
-                        self.x0data[2].append(data[i]['temperature'])
-                    pindex = self.x0data[0].index(pname)
-                    self.x0data[1][pindex] = min(self.x0data[1][pindex],data[i]['temperature'])
-                    self.x0data[2][pindex] = max(self.x0data[2][pindex],data[i]['temperature'])
-                elif float(data[i]['elements'][self.el2]['moles']) == 1:
-                    for phaseType in ['solution phases','pure condensed phases']:
-                        for phaseName in list(data[i][phaseType].keys()):
-                            if (data[i][phaseType][phaseName]['moles'] > phaseIncludeTol):
-                                pname = phaseName
-                    if not(pname in self.x1data[0]):
-                        self.x1data[0].append(pname)
-                        self.x1data[1].append(data[i]['temperature'])
-                        self.x1data[2].append(data[i]['temperature'])
-                    pindex = self.x1data[0].index(pname)
-                    self.x1data[1][pindex] = min(self.x1data[1][pindex],data[i]['temperature'])
-                    self.x1data[2][pindex] = max(self.x1data[2][pindex],data[i]['temperature'])
-
-        # Sort data here instead of repeatedly later
-        self.ts = np.array(ts)
-        self.x1 = np.array(x1)
-        self.x2 = np.array(x2)
-        self.pointIndex = np.array(pointIndex)
-        sindex  = np.argsort(self.ts)
-        self.ts = self.ts[sindex]
-        self.x1 = self.x1[sindex]
-        self.x2 = self.x2[sindex]
-        self.pointIndex = self.pointIndex[sindex]
-        self.p1 = [self.p1[i] for i in sindex]
-        self.p2 = [self.p2[i] for i in sindex]
+                        for phaseName in list(record[phaseType].keys()):
+                            if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                                boundPhases.append(phaseName)
+                                boundComps.append(record[phaseType][phaseName]['elements'][self.el2]['mole fraction of phase by element'])
+                    x1.append(boundComps[0])
+                    x2.append(boundComps[1])
+                    c1.append(self.phaseCode(boundPhases[0]))
+                    c2.append(self.phaseCode(boundPhases[1]))
+                    self.pointDetails.append(f'Temperature = {record["temperature"]:6.2f}\nMoles of {self.el1} = {record["elements"][self.el1]["moles"]:9.8f}\nMoles of {self.el2} = {record["elements"][self.el2]["moles"]:9.8f}\nPhase 1 = {boundPhases[0]} at {boundComps[0]:5.4f} moles {self.el2}\nPhase 2 = {boundPhases[1]} at {boundComps[1]:5.4f} moles {self.el2}\nIntegral Gibbs Energy = {record["integral Gibbs energy"]:.2f}\nNumber of GEM iterations = {record["GEM iterations"]}')
+                    self.suppressed.append(False)
+                elif nPhases == 1:
+                    if not(self.el2 in list(record['elements'].keys())):
+                        for phaseType in ['solution phases','pure condensed phases']:
+                            for phaseName in list(record[phaseType].keys()):
+                                if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                                    pname = phaseName
+                        if not(pname in self.x0data[0]):
+                            self.x0data[0].append(pname)
+                            self.x0data[1].append(record['temperature'])
+                            self.x0data[2].append(record['temperature'])
+                        pindex = self.x0data[0].index(pname)
+                        self.x0data[1][pindex] = min(self.x0data[1][pindex],record['temperature'])
+                        self.x0data[2][pindex] = max(self.x0data[2][pindex],record['temperature'])
+                    elif float(record['elements'][self.el2]['moles']) == 1:
+                        for phaseType in ['solution phases','pure condensed phases']:
+                            for phaseName in list(record[phaseType].keys()):
+                                if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                                    pname = phaseName
+                        if not(pname in self.x1data[0]):
+                            self.x1data[0].append(pname)
+                            self.x1data[1].append(record['temperature'])
+                            self.x1data[2].append(record['temperature'])
+                        pindex = self.x1data[0].index(pname)
+                        self.x1data[1][pindex] = min(self.x1data[1][pindex],record['temperature'])
+                        self.x1data[2][pindex] = max(self.x1data[2][pindex],record['temperature'])
+        except (OSError, ValueError):
+            print('Data load failed, phase diagram update stopped early')
+
+        # Keep the data sorted by temperature: sort the new batch, then merge it in after any existing points
+        # at equal temperature (pointIndex numbers points in order of arrival)
+        if len(ts) > 0:
+            sindex = np.argsort(ts, kind='stable')
+            newTs = np.array(ts)[sindex]
+            positions = np.searchsorted(self.ts, newTs, side='right')
+            newIndex = len(self.ts) + sindex
+            self.ts = np.insert(self.ts, positions, newTs)
+            self.x1 = np.insert(self.x1, positions, np.array(x1)[sindex])
+            self.x2 = np.insert(self.x2, positions, np.array(x2)[sindex])
+            self.c1 = np.insert(self.c1, positions, np.array(c1, dtype=int)[sindex])
+            self.c2 = np.insert(self.c2, positions, np.array(c2, dtype=int)[sindex])
+            self.pointIndex = np.insert(self.pointIndex.astype(int), positions, newIndex)
+            self.pointPositions = None
+            if self.pointTree is not None:
+                sortedXs = np.concatenate([np.array(x1)[sindex], np.array(x2)[sindex]])
+                self.pointTree.add(np.column_stack([sortedXs, np.concatenate([newTs, newTs])]), np.concatenate([newIndex, newIndex]))
+            # New points invalidate the boundary grouping
+            self.boundaryState = None
+        self.metrics.count('results', nResults)
+        self.metrics.count('twoPhase', len(ts))
 
         if len(self.x0data[1]) > 1:
             x0sort = [i[0] for i in sorted(enumerate(self.x0data[1]), key=lambda x:x[1])]
@@ -228,94 +407,128 @@ class diagram:
             xtemp[1] = sorted(self.x1data[1])
             xtemp[2] = sorted(self.x1data[2])
             self.x1data = xtemp
+        return nResults
+    def phaseCode(self,name):
+        # Integer code of a phase name in phaseNames, adding it if new
+        if name not in self.phaseCodes:
+            self.phaseCodes[name] = len(self.phaseNames)
+            self.phaseNames.append(name)
+        return self.phaseCodes[name]
+    @property
+    def p1(self):
+        return [self.phaseNames[c] for c in self.c1]
+    @property
+    def p2(self):
+        return [self.phaseNames[c] for c in self.c2]
+    def getPointTree(self):
+        # Index over both phase compositions of every 2-phase point, with temperature normalized by the
+        # temperature range; ids are point numbers (as in pointIndex)
+        scale = (1, 1/max(self.maxt - self.mint, 1e-12))
+        if self.pointTree is None or len(self.pointTree) != 2*len(self.ts):
+            self.pointTree = spatialIndex.SpatialIndex(scale)
+            positions = np.argsort(self.pointIndex)
+            self.pointTree.add(np.column_stack([np.concatenate([self.x1[positions], self.x2[positions]]), np.concatenate([self.ts[positions], self.ts[positions]])]),
+                               np.concatenate([self.pointIndex[positions], self.pointIndex[positions]]))
+            self.pointTree.rebuild()
+        self.pointTree.rescale(scale)
+        return self.pointTree
+    def positions(self, ids):
+        # Current positions in ts, x1 and x2 of point numbers
+        if self.pointPositions is None:
+            self.pointPositions = np.empty(len(self.pointIndex), dtype=int)
+            self.pointPositions[self.pointIndex.astype(int)] = np.arange(len(self.pointIndex))
+        return self.pointPositions[np.asarray(ids, dtype=int)]
+    def nearestPoint(self,x,t):
+        # Position of the 2-phase point with a phase composition nearest to (x, t), or -1 if there are none
+        ids, distances = self.getPointTree().nearest((x, t))
+        return int(self.positions(ids[0])) if len(ids) > 0 else -1
+    def pointsNear(self,x,t,r):
+        # Positions of the 2-phase points with a phase composition within normalized distance r of (x, t)
+        return np.unique(self.positions(self.getPointTree().radius((x, t), r)))
+    def pointsInBox(self,xlo,xhi,tlo,thi):
+        # Positions of the 2-phase points with temperature in [tlo, thi] and a phase composition in [xlo, xhi]
+        return np.unique(self.positions(self.getPointTree().box((xlo, tlo), (xhi, thi))))
     def runCalc(self):
         print('Thermochimica calculation initiated.')
-        subprocess.run(['./bin/PhaseDiagramDataGen',self.inputFileName])
+        with self.metrics.timer('solver'):
+            subprocess.run([f'{self.thermochimicaPath}/bin/PhaseDiagramDataGen',self.inputFileName])
         print('Thermochimica calculation finished.')
-        self.processPhaseDiagramData()
+        # Every calculation of the grid writes one result
+        self.metrics.count('calculations', self.processPhaseDiagramData())
     def phaseBoundaries(self):
+        # The grouping only changes when points are added (processPhaseDiagramData resets boundaryState),
+        # points are suppressed, or the gap limit or temperature range change
+        state = (len(self.c1), np.array(self.suppressed, dtype=bool).tobytes(), self.gapLimit, self.mint, self.maxt)
+        if state == self.boundaryState:
+            return
+        nPoints = len(self.c1)
+        nNames = len(self.phaseNames)
+        # If a miscibility gap label has been used unnecessarily, remove it (once per distinct phase pair)
+        pairCodes, pairInverse = np.unique(self.c1 * nNames + self.c2, return_inverse=True)
+        pairNames = []
+        for code in pairCodes:
+            pairNames.append(boundaryPhases(self.phaseNames[code // nNames], self.phaseNames[code % nNames]))
+        # Identical pairs after removing labels share a boundary
+        pairIds = {}
+        pairId = np.array([pairIds.setdefault(pair, len(pairIds)) for pair in pairNames], dtype=int)
+        pointPairs = pairId[pairInverse.reshape(-1)] if nPoints > 0 else np.empty(0, dtype=int)
+        uniquePairs = list(pairIds.keys())
+        self.c1 = np.array([self.phaseCode(pair[0]) for pair in uniquePairs], dtype=int)[pointPairs] if nPoints > 0 else self.c1
+        self.c2 = np.array([self.phaseCode(pair[1]) for pair in uniquePairs], dtype=int)[pointPairs] if nPoints > 0 else self.c2
+
+        # Boundaries are numbered in order of first appearance; suppressed points belong to none (-1)
         self.boundaries = []
+        self.b = np.full(nPoints, -1, dtype=int)
+        active = ~np.array(self.suppressed, dtype=bool)[self.pointIndex.astype(int)] if nPoints > 0 else np.empty(0, dtype=bool)
+        if np.any(active):
+            activePairs, firstIndex, activeInverse = np.unique(pointPairs[active], return_index=True, return_inverse=True)
+            rank = np.empty(len(activePairs), dtype=int)
+            rank[np.argsort(firstIndex)] = np.arange(len(activePairs))
+            self.b[active] = rank[activeInverse.reshape(-1)]
+            self.boundaries = [list(uniquePairs[k]) for k in activePairs[np.argsort(firstIndex)]]
+
         self.phases = []
-        self.b = []
-        for i in range(len(self.p1)):
-            # If a miscibility gap label has been used unnecessarily, remove it
-            if self.p1[i].find('#') > 0:
-                if not(self.p1[i][0:self.p1[i].find('#')] == self.p2[i]):
-                    self.p1[i] = self.p1[i][0:self.p1[i].find('#')]
-            if self.p2[i].find('#') > 0:
-                if not(self.p2[i][0:self.p2[i].find('#')] == self.p1[i]):
-                    self.p2[i] = self.p2[i][0:self.p2[i].find('#')]
-            repeat = False
-            if self.suppressed[self.pointIndex[i]]:
-                self.b.append(-1)
-            else:
-                for j in range(len(self.boundaries)):
-                    if (self.boundaries[j][0] == self.p1[i]) and (self.boundaries[j][1] == self.p2[i]):
-                        self.b.append(j)
-                        repeat = True
-                if not(repeat):
-                    self.boundaries.append([self.p1[i],self.p2[i]])
-                    self.b.append(len(self.boundaries)-1)
-
-        for i in range(len(self.boundaries)):
-            repeat1 = False
-            repeat2 = False
-            for j in range(len(self.phases)):
-                if (self.boundaries[i][0] == self.phases[j]):
-                    repeat1 = True
-                if (self.boundaries[i][1] == self.phases[j]):
-                    repeat2 = True
-            if not(repeat1 or self.boundaries[i][0].find('#') > 0):
-                self.phases.append(self.boundaries[i][0])
-            if not(repeat2 or self.boundaries[i][1].find('#') > 0):
-                self.phases.append(self.boundaries[i][1])
+        for boundary in self.boundaries:
+            for phase in boundary:
+                if not(phase in self.phases or phase.find('#') > 0):
+                    self.phases.append(phase)
 
         self.congruentFound = [False for i in range(len(self.phases))]
+        boundaryIndices = groupBoundaries(self.b, len(self.boundaries))
         for j in range(len(self.boundaries)):
-            inds = [i for i, k in enumerate(self.b) if k == j]
+            inds = boundaryIndices[j]
             if len(inds) < 2:
                 continue
-            ttt = self.ts[inds]
             x1t = self.x1[inds]
             x2t = self.x2[inds]
-            if x1t[0] > x2t[0]:
-                dir = True
+            flipped = (x1t > x2t) != (x1t[0] > x2t[0])
+            if not np.any(flipped):
+                continue
+            if self.boundaries[j][0].find('#') > 0 or self.boundaries[j][1].find('#') > 0:
+                # for miscibility gap, just flip them
+                self.x1[inds[flipped]] = x2t[flipped]
+                self.x2[inds[flipped]] = x1t[flipped]
             else:
-                dir = False
-            extraBound = []
-            for i in range(len(ttt)):
-                if (x1t[i] > x2t[i]) != dir:
-                    # for miscibility gap, just flip them
-                    if self.boundaries[j][0].find('#') > 0 or self.boundaries[j][1].find('#') > 0:
-                        temp = self.x1[inds[i]]
-                        self.x1[inds[i]] = self.x2[inds[i]]
-                        self.x2[inds[i]] = temp
-                    else:
-                        extraBound.append(i)
-            if len(extraBound):
                 self.congruentFound[self.phases.index(self.boundaries[j][0])] = True
                 self.congruentFound[self.phases.index(self.boundaries[j][1])] = True
                 self.boundaries.append(self.boundaries[j])
-                for k in extraBound:
-                    self.b[inds[k]] = len(self.boundaries)-1
+                self.b[inds[flipped]] = len(self.boundaries)-1
 
+        # Split boundaries wherever consecutive points are further apart than gapLimit
+        boundaryIndices = groupBoundaries(self.b, len(self.boundaries))
         for j in range(len(self.boundaries)):
-            inds = [i for i, k in enumerate(self.b) if k == j]
+            inds = boundaryIndices[j]
             if len(inds) < 2:
                 continue
-            ttt = self.ts[inds]
-            x1t = self.x1[inds]
-            x2t = self.x2[inds]
-            loc = False
-            firstLoc = True
-            for i in range(1,len(ttt)):
-                if np.sqrt((ttt[i] - ttt[i-1])**2 + ((self.maxt - self.mint)*(x1t[i] - x1t[i-1]))**2 + ((self.maxt - self.mint)*(x2t[i] - x2t[i-1]))**2) > self.gapLimit:
-                    loc = not(loc)
-                    if firstLoc:
-                        self.boundaries.append(self.boundaries[j])
-                        firstLoc = False
-                if loc:
-                    self.b[inds[i]] = len(self.boundaries)-1
+            steps = np.sqrt(np.diff(self.ts[inds])**2 + ((self.maxt - self.mint)*np.diff(self.x1[inds]))**2 + ((self.maxt - self.mint)*np.diff(self.x2[inds]))**2)
+            # Each gap toggles between the original and the split-off boundary
+            loc = np.cumsum(steps > self.gapLimit) % 2 == 1
+            if np.any(steps > self.gapLimit):
+                self.boundaries.append(self.boundaries[j])
+                self.b[inds[1:][loc]] = len(self.boundaries)-1
+
+        self.boundaryIndices = groupBoundaries(self.b, len(self.boundaries))
+        self.boundaryState = state
     def makePlot(self):
         self.phaseBoundaries()
         # Start figure
@@ -325,147 +538,13 @@ class diagram:
             plt.ion()
         ax = fig.add_axes([0.2, 0.1, 0.75, 0.85])
 
-        bEdgeLine = [[False,False] for i in range(len(self.boundaries))]
-        # Plot along x=0 and x=1 self.boundaries (this is the worst code I've ever written)
-        for j in range(len(self.x0data[1])):
-            if not self.x0data[0][j] in self.phases:
-                continue
-            i = self.phases.index(self.x0data[0][j])
-            if j > 0:
-                # ax.plot(0,self.x0data[1][j],'kv')
-                match = []
-                for k in range(len(self.boundaries)):
-                    if (self.x0data[0][j] in self.boundaries[k]) and (self.x0data[0][j-1] in self.boundaries[k]):
-                        inds = [i for i, l in enumerate(self.b) if l == k]
-                        if len(inds) < 2:
-                            continue
-                        bind = self.boundaries[k].index(self.x0data[0][j])
-                        if bind == 0:
-                            minj = np.argmin(np.array(self.x1)[inds])
-                            length = (0 - np.array(self.x1)[inds][minj])**2 + (self.x0data[1][j] - np.array(self.ts)[inds][minj])**2
-                            match.append([length,k,np.array(self.x1)[inds][minj],np.array(self.ts)[inds][minj]])
-                        elif bind == 1:
-                            minj = np.argmin(np.array(self.x2)[inds])
-                            length = (0 - np.array(self.x2)[inds][minj])**2 + (self.x0data[1][j] - np.array(self.ts)[inds][minj])**2
-                            match.append([length,k,np.array(self.x2)[inds][minj],np.array(self.ts)[inds][minj]])
-                if len(match) > 0:
-                    match = np.array(match)
-                    matchind = np.argmin(match[:,0])
-                    k = int(match[matchind,1])
-                    inds = [i for i, l in enumerate(self.b) if l == k]
-                    ax.plot([0,match[matchind,2]],[self.x0data[1][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                    if match[matchind,3] == np.min(np.array(self.ts)[inds]):
-                        bEdgeLine[k][0] = True
-                    if match[matchind,3] == np.max(np.array(self.ts)[inds]):
-                        bEdgeLine[k][1] = True
-            if j < len(self.x0data[1]) - 1:
-                # ax.plot(0,self.x0data[2][j],'k^')
-                match = []
-                for k in range(len(self.boundaries)):
-                    if (self.x0data[0][j] in self.boundaries[k]) and (self.x0data[0][j+1] in self.boundaries[k]):
-                        inds = [i for i, l in enumerate(self.b) if l == k]
-                        if len(inds) < 2:
-                            continue
-                        bind = self.boundaries[k].index(self.x0data[0][j])
-                        if bind == 0:
-                            minj = np.argmin(np.array(self.x1)[inds])
-                            length = (0 - np.array(self.x1)[inds][minj])**2 + (self.x0data[2][j] - np.array(self.ts)[inds][minj])**2
-                            match.append([length,k,np.array(self.x1)[inds][minj],np.array(self.ts)[inds][minj]])
-                        elif bind == 1:
-                            minj = np.argmin(np.array(self.x2)[inds])
-                            length = (0 - np.array(self.x2)[inds][minj])**2 + (self.x0data[2][j] - np.array(self.ts)[inds][minj])**2
-                            match.append([length,k,np.array(self.x2)[inds][minj],np.array(self.ts)[inds][minj]])
-                if len(match) > 0:
-                    match = np.array(match)
-                    matchind = np.argmin(match[:,0])
-                    k = int(match[matchind,1])
-                    inds = [i for i, l in enumerate(self.b) if l == k]
-                    ax.plot([0,match[matchind,2]],[self.x0data[2][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                    if match[matchind,3] == np.min(np.array(self.ts)[inds]):
-                        bEdgeLine[k][0] = True
-                    if match[matchind,3] == np.max(np.array(self.ts)[inds]):
-                        bEdgeLine[k][1] = True
-        for j in range(len(self.x1data[1])):
-            if not self.x1data[0][j] in self.phases:
-                continue
-            i = self.phases.index(self.x1data[0][j])
-            if j > 0:
-                # ax.plot(1,self.x1data[1][j],'kv')
-                match = []
-                for k in range(len(self.boundaries)):
-                    if (self.x1data[0][j] in self.boundaries[k]) and (self.x1data[0][j-1] in self.boundaries[k]):
-                        inds = [i for i, l in enumerate(self.b) if l == k]
-                        if len(inds) < 2:
-                            continue
-                        bind = self.boundaries[k].index(self.x1data[0][j])
-                        if bind == 0:
-                            maxj = np.argmax(np.array(self.x1)[inds])
-                            length = (1 - np.array(self.x1)[inds][maxj])**2 + (self.x1data[1][j] - np.array(self.ts)[inds][maxj])**2
-                            match.append([length,k,np.array(self.x1)[inds][maxj],np.array(self.ts)[inds][maxj]])
-                        elif bind == 1:
-                            maxj = np.argmax(np.array(self.x2)[inds])
-                            length = (1 - np.array(self.x2)[inds][maxj])**2 + (self.x1data[1][j] - np.array(self.ts)[inds][maxj])**2
-                            match.append([length,k,np.array(self.x2)[inds][maxj],np.array(self.ts)[inds][maxj]])
-                if len(match) > 0:
-                    match = np.array(match)
-                    matchind = np.argmin(match[:,0])
-                    k = int(match[matchind,1])
-                    inds = [i for i, l in enumerate(self.b) if l == k]
-                    ax.plot([1,match[matchind,2]],[self.x1data[1][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                    if match[matchind,3] == np.min(np.array(self.ts)[inds]):
-                        bEdgeLine[k][0] = True
-                    if match[matchind,3] == np.max(np.array(self.ts)[inds]):
-                        bEdgeLine[k][1] = True
-            if j < len(self.x1data[1]) - 1:
-                # ax.plot(1,self.x1data[2][j],'k^')
-                match = []
-                for k in range(len(self.boundaries)):
-                    if (self.x1data[0][j] in self.boundaries[k]) and (self.x1data[0][j+1] in self.boundaries[k]):
-                        inds = [i for i, l in enumerate(self.b) if l == k]
-                        if len(inds) < 2:
-                            continue
-                        bind = self.boundaries[k].index(self.x1data[0][j])
-                        if bind == 0:
-                            maxj = np.argmax(np.array(self.x1)[inds])
-                            length = (1 - np.array(self.x1)[inds][maxj])**2 + (self.x1data[2][j] - np.array(self.ts)[inds][maxj])**2
-                            match.append([length,k,np.array(self.x1)[inds][maxj],np.array(self.ts)[inds][maxj]])
-                        elif bind == 1:
-                            maxj = np.argmax(np.array(self.x2)[inds])
-                            length = (1 - np.array(self.x2)[inds][maxj])**2 + (self.x1data[2][j] - np.array(self.ts)[inds][maxj])**2
-                            match.append([length,k,np.array(self.x2)[inds][maxj],np.array(self.ts)[inds][maxj]])
-                if len(match) > 0:
-                    match = np.array(match)
-                    matchind = np.argmin(match[:,0])
-                    k = int(match[matchind,1])
-                    inds = [i for i, l in enumerate(self.b) if l == k]
-                    ax.plot([1,match[matchind,2]],[self.x1data[2][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                    if match[matchind,3] == np.min(np.array(self.ts)[inds]):
-                        bEdgeLine[k][0] = True
-                    if match[matchind,3] == np.max(np.array(self.ts)[inds]):
-                        bEdgeLine[k][1] = True
-
-        # plot 2-phase region boundaries
-        color = iter(plt.cm.rainbow(np.linspace(0, 1, len(self.boundaries))))
-        for j in range(len(self.boundaries)):
-            if self.plotColor == 'colorful':
-                c = next(color)
-            else:
-                c = 'k'
-            inds = [i for i, k in enumerate(self.b) if k == j]
-            if len(inds) < 2:
-                continue
-            ttt = self.ts[inds]
-            x1t = self.x1[inds]
-            x2t = self.x2[inds]
-            ax.plot(x1t,ttt-self.tshift,self.plotMarker,c=c)
-            ax.plot(x2t[::-1],ttt[::-1]-self.tshift,self.plotMarker,c=c)
-            minj = np.argmin(ttt)
-            maxj = np.argmax(ttt)
-            # plot invariant temperatures
-            if (ttt[minj] > self.mint) and not(bEdgeLine[j][0]):
-                ax.plot([x1t[minj],x2t[minj]],[ttt[minj]-self.tshift,ttt[minj]-self.tshift],self.plotMarker,c=c)
-            if (ttt[maxj] < self.maxt) and not(bEdgeLine[j][1]):
-                ax.plot([x1t[maxj],x2t[maxj]],[ttt[maxj]-self.tshift,ttt[maxj]-self.tshift],self.plotMarker,c=c)
+        # Boundaries and the lines joining them to x=0 and x=1, as one collection
+        edgeLines, boundaryLines = self.lineGeometry()
+        if self.plotColor == 'colorful':
+            colors = plt.cm.rainbow(np.linspace(0, 1, len(self.boundaries)))
+        else:
+            colors = ['k' for j in range(len(self.boundaries))]
+        drawLines(ax, edgeLines, boundaryLines, colors, self.plotMarker, self.tshift)
 
         # Plot experimental data
         if self.showExperiment:
@@ -492,150 +571,31 @@ class diagram:
 
         # Plot loaded phase diagram
         if self.loaded and self.showLoaded:
-            bEdgeLine = [[False,False] for i in range(len(self.loadedDiagram.boundaries))]
-            # Plot along x=0 and x=1 self.boundaries (this is the worst code I've ever written)
-            for j in range(len(self.loadedDiagram.x0data[1])):
-                if not self.loadedDiagram.x0data[0][j] in self.loadedDiagram.phases:
-                    continue
-                i = self.loadedDiagram.phases.index(self.loadedDiagram.x0data[0][j])
-                if j > 0:
-                    # ax.plot(0,self.loadedDiagram.x0data[1][j],'kv')
-                    match = []
-                    for k in range(len(self.loadedDiagram.boundaries)):
-                        if (self.loadedDiagram.x0data[0][j] in self.loadedDiagram.boundaries[k]) and (self.loadedDiagram.x0data[0][j-1] in self.loadedDiagram.boundaries[k]):
-                            inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                            if len(inds) < 2:
-                                continue
-                            bind = self.loadedDiagram.boundaries[k].index(self.loadedDiagram.x0data[0][j])
-                            if bind == 0:
-                                minj = np.argmin(np.array(self.loadedDiagram.x1)[inds])
-                                length = (0 - np.array(self.loadedDiagram.x1)[inds][minj])**2 + (self.loadedDiagram.x0data[1][j] - np.array(self.loadedDiagram.ts)[inds][minj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x1)[inds][minj],np.array(self.loadedDiagram.ts)[inds][minj]])
-                            elif bind == 1:
-                                minj = np.argmin(np.array(self.loadedDiagram.x2)[inds])
-                                length = (0 - np.array(self.loadedDiagram.x2)[inds][minj])**2 + (self.loadedDiagram.x0data[1][j] - np.array(self.loadedDiagram.ts)[inds][minj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x2)[inds][minj],np.array(self.loadedDiagram.ts)[inds][minj]])
-                    if len(match) > 0:
-                        match = np.array(match)
-                        matchind = np.argmin(match[:,0])
-                        k = int(match[matchind,1])
-                        inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                        ax.plot([0,match[matchind,2]],[self.loadedDiagram.x0data[1][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                        if match[matchind,3] == np.min(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][0] = True
-                        if match[matchind,3] == np.max(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][1] = True
-                if j < len(self.loadedDiagram.x0data[1]) - 1:
-                    # ax.plot(0,self.loadedDiagram.x0data[2][j],'k^')
-                    match = []
-                    for k in range(len(self.loadedDiagram.boundaries)):
-                        if (self.loadedDiagram.x0data[0][j] in self.loadedDiagram.boundaries[k]) and (self.loadedDiagram.x0data[0][j+1] in self.loadedDiagram.boundaries[k]):
-                            inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                            if len(inds) < 2:
-                                continue
-                            bind = self.loadedDiagram.boundaries[k].index(self.loadedDiagram.x0data[0][j])
-                            if bind == 0:
-                                minj = np.argmin(np.array(self.loadedDiagram.x1)[inds])
-                                length = (0 - np.array(self.loadedDiagram.x1)[inds][minj])**2 + (self.loadedDiagram.x0data[2][j] - np.array(self.loadedDiagram.ts)[inds][minj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x1)[inds][minj],np.array(self.loadedDiagram.ts)[inds][minj]])
-                            elif bind == 1:
-                                minj = np.argmin(np.array(self.loadedDiagram.x2)[inds])
-                                length = (0 - np.array(self.loadedDiagram.x2)[inds][minj])**2 + (self.loadedDiagram.x0data[2][j] - np.array(self.loadedDiagram.ts)[inds][minj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x2)[inds][minj],np.array(self.loadedDiagram.ts)[inds][minj]])
-                    if len(match) > 0:
-                        match = np.array(match)
-                        matchind = np.argmin(match[:,0])
-                        k = int(match[matchind,1])
-                        inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                        ax.plot([0,match[matchind,2]],[self.loadedDiagram.x0data[2][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                        if match[matchind,3] == np.min(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][0] = True
-                        if match[matchind,3] == np.max(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][1] = True
-            for j in range(len(self.loadedDiagram.x1data[1])):
-                if not self.loadedDiagram.x1data[0][j] in self.loadedDiagram.phases:
-                    continue
-                i = self.loadedDiagram.phases.index(self.loadedDiagram.x1data[0][j])
-                if j > 0:
-                    # ax.plot(1,self.loadedDiagram.x1data[1][j],'kv')
-                    match = []
-                    for k in range(len(self.loadedDiagram.boundaries)):
-                        if (self.loadedDiagram.x1data[0][j] in self.loadedDiagram.boundaries[k]) and (self.loadedDiagram.x1data[0][j-1] in self.loadedDiagram.boundaries[k]):
-                            inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                            if len(inds) < 2:
-                                continue
-                            bind = self.loadedDiagram.boundaries[k].index(self.loadedDiagram.x1data[0][j])
-                            if bind == 0:
-                                maxj = np.argmax(np.array(self.loadedDiagram.x1)[inds])
-                                length = (1 - np.array(self.loadedDiagram.x1)[inds][maxj])**2 + (self.loadedDiagram.x1data[1][j] - np.array(self.loadedDiagram.ts)[inds][maxj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x1)[inds][maxj],np.array(self.loadedDiagram.ts)[inds][maxj]])
-                            elif bind == 1:
-                                maxj = np.argmax(np.array(self.loadedDiagram.x2)[inds])
-                                length = (1 - np.array(self.loadedDiagram.x2)[inds][maxj])**2 + (self.loadedDiagram.x1data[1][j] - np.array(self.loadedDiagram.ts)[inds][maxj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x2)[inds][maxj],np.array(self.loadedDiagram.ts)[inds][maxj]])
-                    if len(match) > 0:
-                        match = np.array(match)
-                        matchind = np.argmin(match[:,0])
-                        k = int(match[matchind,1])
-                        inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                        ax.plot([1,match[matchind,2]],[self.loadedDiagram.x1data[1][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                        if match[matchind,3] == np.min(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][0] = True
-                        if match[matchind,3] == np.max(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][1] = True
-                if j < len(self.loadedDiagram.x1data[1]) - 1:
-                    # ax.plot(1,self.loadedDiagram.x1data[2][j],'k^')
-                    match = []
-                    for k in range(len(self.loadedDiagram.boundaries)):
-                        if (self.loadedDiagram.x1data[0][j] in self.loadedDiagram.boundaries[k]) and (self.loadedDiagram.x1data[0][j+1] in self.loadedDiagram.boundaries[k]):
-                            inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                            if len(inds) < 2:
-                                continue
-                            bind = self.loadedDiagram.boundaries[k].index(self.loadedDiagram.x1data[0][j])
-                            if bind == 0:
-                                maxj = np.argmax(np.array(self.loadedDiagram.x1)[inds])
-                                length = (1 - np.array(self.loadedDiagram.x1)[inds][maxj])**2 + (self.loadedDiagram.x1data[2][j] - np.array(self.loadedDiagram.ts)[inds][maxj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x1)[inds][maxj],np.array(self.loadedDiagram.ts)[inds][maxj]])
-                            elif bind == 1:
-                                maxj = np.argmax(np.array(self.loadedDiagram.x2)[inds])
-                                length = (1 - np.array(self.loadedDiagram.x2)[inds][maxj])**2 + (self.loadedDiagram.x1data[2][j] - np.array(self.loadedDiagram.ts)[inds][maxj])**2
-                                match.append([length,k,np.array(self.loadedDiagram.x2)[inds][maxj],np.array(self.loadedDiagram.ts)[inds][maxj]])
-                    if len(match) > 0:
-                        match = np.array(match)
-                        matchind = np.argmin(match[:,0])
-                        k = int(match[matchind,1])
-                        inds = [i for i, l in enumerate(self.loadedDiagram.b) if l == k]
-                        ax.plot([1,match[matchind,2]],[self.loadedDiagram.x1data[2][j]-self.tshift,match[matchind,3]-self.tshift],'k-')
-                        if match[matchind,3] == np.min(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][0] = True
-                        if match[matchind,3] == np.max(np.array(self.loadedDiagram.ts)[inds]):
-                            bEdgeLine[k][1] = True
-
-            # plot 2-phase region boundaries
-            color = iter(plt.cm.rainbow(np.linspace(0, 1, len(self.loadedDiagram.boundaries))))
-            for j in range(len(self.loadedDiagram.boundaries)):
-                c = 'k'
-                inds = [i for i, k in enumerate(self.loadedDiagram.b) if k == j]
-                if len(inds) < 2:
-                    continue
-                ttt = self.loadedDiagram.ts[inds]
-                x1t = self.loadedDiagram.x1[inds]
-                x2t = self.loadedDiagram.x2[inds]
-                ax.plot(x1t,ttt-self.tshift,'--',c=c)
-                ax.plot(x2t[::-1],ttt[::-1]-self.tshift,'--',c=c)
-                minj = np.argmin(ttt)
-                maxj = np.argmax(ttt)
-                # plot invariant temperatures
-                if (ttt[minj] > self.loadedDiagram.mint) and not(bEdgeLine[j][0]):
-                    ax.plot([x1t[minj],x2t[minj]],[ttt[minj]-self.tshift,ttt[minj]-self.tshift],'--',c=c)
-                if (ttt[maxj] < self.loadedDiagram.maxt) and not(bEdgeLine[j][1]):
-                    ax.plot([x1t[maxj],x2t[maxj]],[ttt[maxj]-self.tshift,ttt[maxj]-self.tshift],'--',c=c)
+            edgeLines, boundaryLines = self.loadedLineGeometry()
+            drawLines(ax, edgeLines, boundaryLines, ['k' for j in range(len(boundaryLines))], '--', self.tshift)
 
         plt.show()
         if self.interactivePlot:
             plt.pause(0.001)
         self.currentPlot = fig
         self.figureList.append(fig)
+    def lineGeometry(self):
+        # Line geometry of the diagram, recomputed only when the boundaries or the single-phase data at x=0 and
+        # x=1 have changed since the last plot (labels, experimental data and styles do not affect it)
+        self.phaseBoundaries()
+        state = (self.boundaryState, repr(self.x0data), repr(self.x1data))
+        if self.lineCache is None or self.lineCache[0] != state:
+            self.lineCache = (state, diagramLines(self.ts, self.x1, self.x2, self.boundaries, self.boundaryIndices, self.phases,
+                                                  self.x0data, self.x1data, self.mint, self.maxt))
+        return self.lineCache[1]
+    def loadedLineGeometry(self):
+        # Line geometry of the loaded diagram, computed once per loaded diagram
+        if self.loadedLineCache is None or self.loadedLineCache[0] is not self.loadedDiagram:
+            loaded = self.loadedDiagram
+            loadedIndices = groupBoundaries(np.asarray(loaded.b, dtype=int), len(loaded.boundaries))
+            self.loadedLineCache = (loaded, diagramLines(np.asarray(loaded.ts), np.asarray(loaded.x1), np.asarray(loaded.x2), loaded.boundaries, loadedIndices,
+                                                         loaded.phases, loaded.x0data, loaded.x1data, loaded.mint, loaded.maxt))
+        return self.loadedLineCache[1]
     def writeInputFile(self,xlo,xhi,nxstep,tlo,thi,ntstep):
         with open(self.inputFileName, 'w') as inputFile:
             inputFile.write('! Python-generated input file for Thermochimica\n')
@@ -655,12 +615,36 @@ class diagram:
             inputFile.write(f'mass unit         = \'{self.munit}\'\n')
             inputFile.write(f'iEl               = {thermoTools.atomic_number_map.index(self.el1)+1} {thermoTools.atomic_number_map.index(self.el2)+1}\n')
             inputFile.write(f'data file         = {self.datafile}\n')
+            inputFile.write(f'output file       = {self.outputFileName}\n')
+            inputFile.write(f'parse cache       = .TRUE.\n')
             # Fuzzy stoichiometry settings
             inputFile.write(f'fuzzy             = {".TRUE." if self.fuzzy else ".FALSE."}\n')
             inputFile.write(f'gibbs min         = {".TRUE." if self.fuzzy else ".FALSE."}\n')
+            # Warm start: traverse the grid as a serpentine path, seeding each calculation from the last
+            inputFile.write(f'reinitialization  = {".TRUE." if self.warmStart else ".FALSE."}\n')
+    def runCalcList(self,calcList):
+        order = list(range(len(calcList)))
+        if self.warmStart:
+            order = thermoTools.serpentineOrder(calcList)
+        calcList = [calcList[i] for i in order]
+        if self.resultCache is None:
+            self.resultCache = thermoCache.ResultCache(thermochimica_path=self.thermochimicaPath)
+        print('Thermochimica calculation initiated.')
+        # Points already in the result cache are not run again
+        self.metrics.count('calculations', len(calcList))
+        hits = self.resultCache.hits
+        with self.metrics.timer('solver'):
+            data = thermoCache.RunCalculationListCached(self.resultCache,self.inputFileName,self.datafile,[self.el1,self.el2],calcList,tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,fuzzyStoichiometry=self.fuzzy,gibbsMinCheck=self.fuzzy,reinitialization=self.warmStart,outputFile=self.outputFileName,thermochimica_path=self.thermochimicaPath,parseCache=True)
+        self.metrics.count('cached', self.resultCache.hits - hits)
+        print('Thermochimica calculation finished.')
+        # Records in the order of the calculation list as given
+        records = [None for i in order]
+        for n, i in enumerate(order):
+            records[i] = data[str(n+1)]
+        return records
+    @measured
     def addLabel(self,xlab,tlab):
-        self.writeInputFile(xlab,xlab,0,tlab,tlab,0)
-        subprocess.run(['./bin/PhaseDiagramDataGen',self.inputFileName])
+        self.runCalcList([[tlab,self.pressure,1-xlab,xlab]])
         f = open(self.outputFileName,)
         data = json.load(f)
         f.close()
@@ -676,22 +660,31 @@ class diagram:
                 labelName.append(phaseName)
         self.labels.append([[xlab,tlab],'+'.join(labelName)])
         self.processPhaseDiagramData()
-    def refineLimit(self,x,res):
-        maxit = 10
-        if x == 0:
-            for i in range(len(self.x0data[1])-1):
-                nit = 0
-                while ((self.x0data[1][i+1] - self.x0data[2][i]) > res) and (nit < maxit):
-                    nit += 1
-                    self.writeInputFile(0,0.001,2,self.x0data[2][i]-self.tshift,self.x0data[1][i+1]-self.tshift,4)
-                    self.runCalc()
-        if x == 1:
-            for i in range(len(self.x1data[1])-1):
-                nit = 0
-                while ((self.x1data[1][i+1] - self.x1data[2][i]) > res) and (nit < maxit):
-                    nit += 1
-                    self.writeInputFile(0.999,1,2,self.x1data[2][i]-self.tshift,self.x1data[1][i+1]-self.tshift,4)
-                    self.runCalc()
+    @measured
+    def refineLimit(self,x,res,maxit=10,nSplit=3):
+        # Narrow the temperature gaps between consecutive single phases at x = 0 and/or x = 1 (x may be a list of
+        # both edges). All open gaps are searched at once: each round solves nSplit evenly spaced temperatures
+        # inside every gap (nSplit = 1 is plain bisection) in one calculation list, and a gap is closed once it
+        # is narrower than res or a round leaves it unchanged.
+        edges = x if isinstance(x, list) else [x]
+        tried = set()
+        for nit in range(maxit):
+            calcList = []
+            for edge in edges:
+                edgeData = self.x0data if edge == 0 else self.x1data
+                for i in range(len(edgeData[1])-1):
+                    tlo = edgeData[2][i]
+                    thi = edgeData[1][i+1]
+                    if (thi - tlo) <= res or (edge, tlo, thi) in tried:
+                        continue
+                    tried.add((edge, tlo, thi))
+                    for k in range(1,nSplit+1):
+                        calcList.append([tlo + k*(thi - tlo)/(nSplit + 1) - self.tshift, self.pressure, 1 - edge, edge])
+            if len(calcList) == 0:
+                break
+            self.runCalcList(calcList)
+            self.processPhaseDiagramData()
+    @measured
     def autoRefine(self,res):
         nIt = 0
         while nIt < 4:
@@ -719,7 +712,7 @@ class diagram:
             # plot 2-phase region boundaries
             for j in range(len(self.boundaries)):
                 polygonPoints = []
-                inds = [i for i, k in enumerate(self.b) if k == j]
+                inds = self.boundaryIndices[j]
                 if len(inds) < 2:
                     continue
                 ttt = self.ts[inds]
@@ -808,10 +801,7 @@ class diagram:
                 for i in range(len(xs)):
                     calc = [ys[i],self.pressure,1-xs[i],xs[i]]
                     calcList.append(calc)
-                thermoTools.WriteRunCalculationList(self.inputFileName,self.datafile,[self.el1,self.el2],calcList,tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,fuzzyStoichiometry=self.fuzzy,gibbsMinCheck=self.fuzzy)
-                print('Thermochimica calculation initiated.')
-                thermoTools.RunRunCalculationList(self.inputFileName)
-                print('Thermochimica calculation finished.')
+                self.runCalcList(calcList)
                 self.processPhaseDiagramData()
 
             # Test the minimum subgrid region area to see if converged
@@ -819,6 +809,7 @@ class diagram:
                 break
             elif any(self.congruentFound):
                 break
+    @measured
     def autoRefine2Phase(self,res):
         self.phaseBoundaries()
         # Expand two-phase regions
@@ -826,7 +817,7 @@ class diagram:
         xs = []
         ys = []
         for j in range(len(self.boundaries)):
-            inds = [i for i, k in enumerate(self.b) if k == j]
+            inds = self.boundaryIndices[j]
             if len(inds) < 2:
                 continue
             ttt = self.ts[inds]
@@ -854,10 +845,7 @@ class diagram:
             for i in range(len(xs)):
                 calc = [ys[i],self.pressure,1-xs[i],xs[i]]
                 calcList.append(calc)
-            thermoTools.WriteRunCalculationList(self.inputFileName,self.datafile,[self.el1,self.el2],calcList,tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,fuzzyStoichiometry=self.fuzzy,gibbsMinCheck=self.fuzzy)
-            print('Thermochimica calculation initiated.')
-            thermoTools.RunRunCalculationList(self.inputFileName)
-            print('Thermochimica calculation finished.')
+            self.runCalcList(calcList)
             self.processPhaseDiagramData()
 
         nIt = 0
@@ -869,7 +857,7 @@ class diagram:
             xs = []
             ys = []
             for j in range(len(self.boundaries)):
-                inds = [i for i, k in enumerate(self.b) if k == j]
+                inds = self.boundaryIndices[j]
                 if len(inds) < 2:
                     continue
                 ttt = self.ts[inds]
@@ -893,16 +881,148 @@ class diagram:
                 for i in range(len(xs)):
                     calc = [ys[i],self.pressure,1-xs[i],xs[i]]
                     calcList.append(calc)
-                thermoTools.WriteRunCalculationList(self.inputFileName,self.datafile,[self.el1,self.el2],calcList,tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,fuzzyStoichiometry=self.fuzzy,gibbsMinCheck=self.fuzzy)
-                print('Thermochimica calculation initiated.')
-                thermoTools.RunRunCalculationList(self.inputFileName)
-                print('Thermochimica calculation finished.')
+                self.runCalcList(calcList)
                 self.processPhaseDiagramData()
 
             # Test the minimum difference between points to see if converged
             if maxGap <= 1/res:
                 break
         self.gapLimit = 3*tres
+    @measured
+    def traceBoundaries(self,tol=None,budget=1000,boundaryTol=None,maxRounds=50):
+        # Alternative to autoRefine/autoSmooth that follows the known two-phase boundaries instead of sampling
+        # regions of the diagram. Each boundary is traced up and down in temperature from its end points: the next
+        # point is predicted by extrapolating the tie-line, and a result with the same two phases is accepted (its
+        # phase compositions lie on the boundary), while a different assemblage brackets the end of the boundary,
+        # which is then bisected. Gaps between existing points of a boundary are bisected as well. Steps adapt so
+        # that consecutive points are about tol apart (in the scaled distance of autoRefine2Phase) and ends are
+        # located to within tol/10 of the temperature range. Other two-phase regions met at the end of a boundary
+        # (e.g. at a peritectic) are found by probing on and either side of its last tie-line, and are traced in
+        # turn; a probe that finds the same two phases past the end resumes the boundary from there (the tie-line
+        # prediction can miss a narrow region). All pending points are solved in one calculation list per round,
+        # and at most budget calculations are run. boundaryTol optionally maps a phase pair to its own tolerance.
+        # Returns the number of calculations run.
+        if tol is None:
+            tol = 1/self.resSmooth**2
+        if boundaryTol is None:
+            boundaryTol = {}
+        trange = self.maxt - self.mint
+        def key(phases):
+            return tuple(sorted(phases))
+        def distance(a, b):
+            return np.sqrt(((a[0]-b[0])/trange)**2 + (a[1]-b[1])**2 + (a[2]-b[2])**2)
+        def point(temperature, phases):
+            # Two-phase point as (temperature, lower composition, higher composition)
+            xs = sorted(elements.get(self.el2, {}).get('mole fraction of phase by element', 0) for name, elements in phases)
+            return (temperature, xs[0], xs[1])
+        def newFronts(pair, start, previous=None):
+            # One front going down and one going up in temperature from start
+            pairTol = boundaryTol.get(pair, tol)
+            return [{'pair': pair, 'tol': pairTol, 'good': start, 'prev': previous, 'dir': direction,
+                     'step': pairTol*trange, 'fail': None} for direction in [-1,1]]
+
+        self.phaseBoundaries()
+        fronts = []
+        segments = []
+        probes = []
+        knownPairs = set()
+        for j in range(len(self.boundaries)):
+            inds = self.boundaryIndices[j]
+            if len(inds) < 1:
+                continue
+            pair = key(self.boundaries[j])
+            knownPairs.add(pair)
+            points = [(self.ts[i], min(self.x1[i],self.x2[i]), max(self.x1[i],self.x2[i])) for i in inds]
+            down, up = newFronts(pair, points[0], points[1] if len(points) > 1 else None)
+            up['good'] = points[-1]
+            up['prev'] = points[-2] if len(points) > 1 else None
+            fronts.extend([down, up])
+            for a, b in zip(points[:-1], points[1:]):
+                if distance(a, b) > up['tol']:
+                    segments.append({'pair': pair, 'tol': up['tol'], 'a': a, 'b': b})
+
+        nCalc = 0
+        for nRound in range(maxRounds):
+            calcList = []
+            tasks = []
+            for front in fronts:
+                tg, xl, xh = front['good']
+                if front['fail'] is None:
+                    bound = self.maxt if front['dir'] > 0 else self.mint
+                    if abs(bound - tg) < 1e-6*trange:
+                        continue
+                    t = min(max(tg + front['dir']*front['step'], self.mint), self.maxt)
+                else:
+                    t = (tg + front['fail']) / 2
+                if front['prev'] is not None and front['prev'][0] != tg:
+                    # Extrapolate the tie-line to the new temperature
+                    slope = (t - tg) / (tg - front['prev'][0])
+                    xl = xl + slope*(xl - front['prev'][1])
+                    xh = xh + slope*(xh - front['prev'][2])
+                tasks.append((front, t))
+                calcList.append([t, min(max((xl + xh)/2, 1e-6), 1-1e-6)])
+            for segment in segments:
+                t = (segment['a'][0] + segment['b'][0]) / 2
+                tasks.append((segment, t))
+                calcList.append([t, (sum(segment['a'][1:]) + sum(segment['b'][1:])) / 4])
+            for t, x, origin in probes:
+                tasks.append((origin, t))
+                calcList.append([t, x])
+            if len(calcList) == 0 or nCalc >= budget:
+                break
+            tasks = tasks[:budget - nCalc]
+            calcList = [[t - self.tshift, self.pressure, 1 - x, x] for t, x in calcList[:len(tasks)]]
+            records = self.runCalcList(calcList)
+            nCalc += len(calcList)
+            self.processPhaseDiagramData()
+
+            nextFronts = []
+            segments = []
+            probes = []
+            resumed = set()
+            for (task, t), record in zip(tasks, records):
+                phases = recordPhases(record)
+                pair = key(boundaryPhases(phases[0][0], phases[1][0])) if phases is not None and len(phases) == 2 else None
+                if pair is not None and pair not in knownPairs:
+                    # A two-phase region not seen before is traced from here as well
+                    knownPairs.add(pair)
+                    nextFronts.extend(newFronts(pair, point(t, phases)))
+                if 'probe' in task:
+                    if pair == task['pair'] and (t - task['good'][0])*task['dir'] > 0 and id(task) not in resumed:
+                        resumed.add(id(task))
+                        front = newFronts(pair, point(t, phases), task['good'])[max(task['dir'], 0)]
+                        nextFronts.append(front)
+                    continue
+                samePair = pair == task['pair']
+                if 'a' in task:
+                    # Interior gap: keep bisecting halves that are still wider than the tolerance
+                    if samePair:
+                        new = point(t, phases)
+                        segments.extend({'pair': task['pair'], 'tol': task['tol'], 'a': a, 'b': b}
+                                        for a, b in [(task['a'], new), (new, task['b'])] if distance(a, b) > task['tol'])
+                    continue
+                front = task
+                if samePair:
+                    new = point(t, phases)
+                    d = distance(front['good'], new)
+                    if d > front['tol']:
+                        segments.append({'pair': front['pair'], 'tol': front['tol'], 'a': front['good'], 'b': new})
+                    front['prev'], front['good'] = front['good'], new
+                    if front['fail'] is None:
+                        # Aim for consecutive points about tol apart
+                        front['step'] *= min(max(front['tol'] / d, 0.5), 2) if d > 0 else 2
+                        front['step'] = min(max(front['step'], front['tol']*trange/10), trange/4)
+                else:
+                    front['fail'] = t
+                # The end of a boundary is located once the bracket is small enough
+                if front['fail'] is not None and abs(front['fail'] - front['good'][0]) < front['tol']*trange/10:
+                    tg, xl, xh = front['good']
+                    origin = {'probe': True, 'pair': front['pair'], 'good': front['good'], 'dir': front['dir']}
+                    probes.extend((temperature, x, origin) for temperature in [tg, front['fail']] for x in [xl/2, 0.9*xl, (xl + xh)/2, xh + 0.1*(1 - xh), (xh + 1)/2])
+                    continue
+                nextFronts.append(front)
+            fronts = nextFronts
+        return nCalc
     def autoLabel(self):
         self.phaseBoundaries()
 
@@ -926,7 +1046,7 @@ class diagram:
         # plot 2-phase region boundaries
         for j in range(len(self.boundaries)):
             polygonPoints = []
-            inds = [i for i, k in enumerate(self.b) if k == j]
+            inds = self.boundaryIndices[j]
             if len(inds) < 2:
                 continue
             ttt = self.ts[inds]
@@ -959,14 +1079,16 @@ class diagram:
                 center = tuple(map(operator.truediv, reduce(lambda x, y: map(operator.add, x, y), segcenters), [len(segcenters)] * 2))
                 self.labels.append([[center[0],center[1]-self.tshift],self.phases[i]])
     def makeBackup(self):
-        self.backup = diagram(self.datafile, False, self.interactivePlot)
+        self.backup = diagram(self.datafile, False, self.interactivePlot, self.thermochimicaPath)
         self.backup.mint = self.mint
         self.backup.maxt = self.maxt
         self.backup.ts = copy.deepcopy(self.ts)
         self.backup.x1 = copy.deepcopy(self.x1)
         self.backup.x2 = copy.deepcopy(self.x2)
-        self.backup.p1 = copy.deepcopy(self.p1)
-        self.backup.p2 = copy.deepcopy(self.p2)
+        self.backup.c1 = copy.deepcopy(self.c1)
+        self.backup.c2 = copy.deepcopy(self.c2)
+        self.backup.phaseNames = copy.deepcopy(self.phaseNames)
+        self.backup.phaseCodes = copy.deepcopy(self.phaseCodes)
         self.backup.x0data = copy.deepcopy(self.x0data)
         self.backup.x1data = copy.deepcopy(self.x1data)
         self.backup.labels = copy.deepcopy(self.labels)
@@ -999,6 +1121,8 @@ class diagram:
         self.backup.loadedDiagram = self.loadedDiagram
         self.backup.loaded = self.loaded
         self.backup.saveDataName = self.saveDataName
+        # Undo does not discard the record of passes already run
+        self.backup.metrics = self.metrics
     def exportPlot(self):
         # Make sure there is an open plot to save
         if not plt.fignum_exists(self.currentPlot.number):
@@ -1008,6 +1132,15 @@ class diagram:
             return 0
         except:
             return 1
+    def saveData(self,filename=None):
+        # Save the diagram data (as loaded for overlays) to a diagram archive, by default outputs/<saveDataName>.npz
+        if filename is None:
+            filename = f'outputs/{self.saveDataName}.npz'
+        self.phaseBoundaries()
+        metadata = {'el1': self.el1, 'el2': self.el2, 'tunit': self.tunit, 'punit': self.punit, 'munit': self.munit,
+                    'pressure': self.pressure, 'tshift': self.tshift, 'datafile': self.datafile}
+        diagramArchive.writeDiagramArchive(filename,self.ts,self.x1,self.x2,self.boundaries,self.phases,self.b,
+                                           self.x0data,self.x1data,self.mint,self.maxt,metadata)
     def addData(self,datafile,expName):
         newData = []
         with open(datafile) as f:
@@ -2,7 +2,6 @@ import binaryPhaseDiagramFunctions
 import PySimpleGUI as sg
 import os
 import sys
-import pickle
 import copy
 import matplotlib.pyplot as plt
 import numpy as np
@@ -106,6 +105,7 @@ class CalculationWindow:
                 self.sgw.Element('Refine').Update(disabled = False)
                 self.sgw.Element('Auto Refine').Update(disabled = False)
                 self.sgw.Element('Auto Smoothen').Update(disabled = False)
+                self.sgw.Element('Trace Boundaries').Update(disabled = False)
                 self.sgw.Element('Add Label').Update(disabled = False)
                 self.sgw.Element('Auto Label').Update(disabled = False)
                 self.sgw.Element('Plot').Update(disabled = False)
@@ -130,6 +130,13 @@ class CalculationWindow:
             self.calculation.makePlot()
             self.macro.append('macroPD.makeBackup()')
             self.macro.append('macroPD.autoSmooth()')
+        elif event =='Trace Boundaries':
+            self.calculation.makeBackup()
+            self.sgw.Element('Undo').Update(disabled = False)
+            self.calculation.traceBoundaries()
+            self.calculation.makePlot()
+            self.macro.append('macroPD.makeBackup()')
+            self.macro.append('macroPD.traceBoundaries()')
         elif event =='Add Label':
             labelWindow = LabelWindow(self)
             self.children.append(labelWindow)
@@ -174,6 +181,7 @@ class CalculationWindow:
             self.sgw.Element('Refine').Update(disabled = False)
             self.sgw.Element('Auto Refine').Update(disabled = False)
             self.sgw.Element('Auto Smoothen').Update(disabled = False)
+            self.sgw.Element('Trace Boundaries').Update(disabled = False)
             self.sgw.Element('Add Label').Update(disabled = False)
             self.sgw.Element('Auto Label').Update(disabled = False)
             self.sgw.Element('Plot').Update(disabled = False)
@@ -237,6 +245,7 @@ class CalculationWindow:
                             sg.Column([[sg.Button('Refine', disabled = True, size = thermoToolsGUI.buttonSize)],
                                     [sg.Button('Auto Refine', disabled = True, size = thermoToolsGUI.buttonSize)],
                                     [sg.Button('Auto Smoothen', disabled = True, size = thermoToolsGUI.buttonSize)],
+                                    [sg.Button('Trace Boundaries', disabled = True, size = thermoToolsGUI.buttonSize)],
                                     [sg.Button('Inspect', disabled = True, size = thermoToolsGUI.buttonSize)],
                                     [sg.Button('Run Macro', size = thermoToolsGUI.buttonSize)]],vertical_alignment='t'),
                             sg.Column([[sg.Button('Add Label', disabled = True, size = thermoToolsGUI.buttonSize)],
@@ -551,7 +560,11 @@ class InspectWindow:
             [sg.Combo(['']+self.parent.calculation.phases, key = '-pfilter1-'),sg.Combo(['']+self.parent.calculation.phases, key = '-pfilter2-')],
             [sg.Text('Active/Suppressed Status:')],
             [sg.Combo(['','Active','Suppressed'], key = '-activefilter-')],
-            [sg.Button('Apply Filter')]
+            [sg.Button('Apply Filter')],
+            [sg.Text('Nearest point to:', font='underline')],
+            [sg.Text(f'{self.parent.calculation.el2} Concentration'),sg.Input(key='-xnear-',size=(thermoToolsGUI.inputSize,1))],
+            [sg.Text('Temperature'),sg.Input(key='-tnear-',size=(thermoToolsGUI.inputSize,1))],
+            [sg.Button('Find Nearest')]
         ]
         self.data = [[i, f'{self.parent.calculation.ts[i]:6.2f} K {self.parent.calculation.x1[i]:4.3f} {self.parent.calculation.x2[i]:4.3f}'] for i in range(len(self.parent.calculation.ts))]
         self.sgw = sg.Window('Data inspection',
@@ -584,10 +597,10 @@ class InspectWindow:
                 self.parent.macro.append(f'macroPD.suppressed[{self.index}] = not(macroPD.suppressed[{self.index}])')
                 self.sgw['-status-'].update(f'{"Suppressed" if self.parent.calculation.suppressed[self.index] else "Active"}')
         elif event == 'Apply Filter':
-            tlo = -np.Inf
-            thi  = np.Inf
-            xlo = -np.Inf
-            xhi  = np.Inf
+            tlo = -np.inf
+            thi  = np.inf
+            xlo = -np.inf
+            xhi  = np.inf
             try:
                 tlo = float(values['-tfilterlow-'])
             except:
@@ -605,39 +618,44 @@ class InspectWindow:
             except:
                 pass
             self.data = []
-            for i in range(len(self.parent.calculation.ts)):
-                # Check temperature
-                tfilt = tlo <= self.parent.calculation.ts[i] and thi >= self.parent.calculation.ts[i]
-                # Check concentration
-                xfilt = (xlo <= self.parent.calculation.x1[i] and xhi >= self.parent.calculation.x1[i]) or (xlo <= self.parent.calculation.x2[i] and xhi >= self.parent.calculation.x2[i])
+            # Phase names of each point (looked up once rather than per point)
+            p1 = self.parent.calculation.p1
+            p2 = self.parent.calculation.p2
+            # Temperature and concentration filters from the spatial index
+            for i in self.parent.calculation.pointsInBox(xlo,xhi,tlo,thi):
                 # Check phases present
-                pfilt = (values['-pfilter1-'] == '' or values['-pfilter1-'] == self.parent.calculation.p1[i] or values['-pfilter1-'] == self.parent.calculation.p2[i]) and (values['-pfilter2-'] == '' or values['-pfilter2-'] == self.parent.calculation.p1[i] or values['-pfilter2-'] == self.parent.calculation.p2[i])
+                pfilt = (values['-pfilter1-'] == '' or values['-pfilter1-'] == p1[i] or values['-pfilter1-'] == p2[i]) and (values['-pfilter2-'] == '' or values['-pfilter2-'] == p1[i] or values['-pfilter2-'] == p2[i])
                 # Check active/suppressed status
                 afilt = (values['-activefilter-'] == '') or ((values['-activefilter-'] == 'Suppressed') == self.parent.calculation.suppressed[self.parent.calculation.pointIndex[i]])
                 # If all filters pass, add to display list
-                if tfilt and xfilt and pfilt and afilt:
+                if pfilt and afilt:
                     self.data.append([i, f'{self.parent.calculation.ts[i]:6.2f} K {self.parent.calculation.x1[i]:4.3f} {self.parent.calculation.x2[i]:4.3f}'])
             self.sgw['-dataList-'].update(self.data)
+        elif event == 'Find Nearest':
+            try:
+                xnear = float(values['-xnear-'])
+                tnear = float(values['-tnear-'])
+            except:
+                return
+            i = self.parent.calculation.nearestPoint(xnear,tnear)
+            if i < 0:
+                return
+            self.data = [[i, f'{self.parent.calculation.ts[i]:6.2f} K {self.parent.calculation.x1[i]:4.3f} {self.parent.calculation.x2[i]:4.3f}']]
+            self.sgw['-dataList-'].update(self.data)
+            self.index = self.parent.calculation.pointIndex[i]
+            self.sgw['-details-'].update(self.parent.calculation.pointDetails[self.index])
+            self.sgw['Toggle Active/Suppressed Status'].update(disabled = False)
+            self.sgw['-status-'].update(f'{"Suppressed" if self.parent.calculation.suppressed[self.index] else "Active"}')
 
-class SaveData(object):
-    def __init__(self,ts,x1,x2,boundaries,phases,b,x0data,x1data,mint,maxt):
-        self.ts = ts
-        self.x1 = x1
-        self.x2 = x2
-        self.boundaries = boundaries
-        self.phases = phases
-        self.b = b
-        self.x0data = x0data
-        self.x1data = x1data
-        self.mint = mint
-        self.maxt = maxt
+# Diagram data pickles saved by earlier versions refer to SaveData here
+SaveData = binaryPhaseDiagramFunctions.SaveData
 
 class SaveDataWindow:
     def __init__(self, parent):
         self.parent = parent
         windowList.append(self)
         self.children = []
-        layout = [[sg.Input(key='-saveName-',size=(thermoToolsGUI.inputSize,1)), sg.Text('.pkl')],
+        layout = [[sg.Input(key='-saveName-',size=(thermoToolsGUI.inputSize,1)), sg.Text('.npz')],
                   [sg.Button('Save'), sg.Button('Cancel')]]
         self.sgw = sg.Window('Save Diagram Data', layout, location = [400,0], finalize=True)
     def close(self):
@@ -657,18 +675,7 @@ class SaveDataWindow:
                     self.parent.calculation.saveDataName = tempName
             except:
                 pass
-            saveData = SaveData(self.parent.calculation.ts,
-                                self.parent.calculation.x1,
-                                self.parent.calculation.x2,
-                                self.parent.calculation.boundaries,
-                                self.parent.calculation.phases,
-                                self.parent.calculation.b,
-                                self.parent.calculation.x0data,
-                                self.parent.calculation.x1data,
-                                self.parent.calculation.mint,
-                                self.parent.calculation.maxt)
-            with open('outputs/'+self.parent.calculation.saveDataName+'.pkl','wb') as outp:
-                pickle.dump(saveData, outp, pickle.HIGHEST_PROTOCOL)
+            self.parent.calculation.saveData()
             self.close()
 
 class LoadDataWindow:
@@ -696,7 +703,7 @@ class LoadDataWindow:
             f
             for f in file_list
             if os.path.isfile(os.path.join(self.folder, f))
-            and f.lower().endswith((".pkl"))
+            and f.lower().endswith((".npz", ".pkl"))
         ]
         fnames = sorted(fnames, key=str.lower)
         self.sgw = sg.Window('Phase diagram data selection', file_list_column, location = [0,0], finalize=True)
@@ -722,16 +729,15 @@ class LoadDataWindow:
                 f
                 for f in file_list
                 if os.path.isfile(os.path.join(self.folder, f))
-                and f.lower().endswith((".pkl"))
+                and f.lower().endswith((".npz", ".pkl"))
             ]
             fnames = sorted(fnames, key=str.lower)
             self.sgw["-FILE LIST-"].update(fnames)
         elif event == "-FILE LIST-":  # A file was chosen from the listbox
             filename = values["-FILE LIST-"][0]
             datafile = os.path.join(self.folder, filename)
-            with open(datafile, 'rb') as inp:
-                self.parent.calculation.loadedDiagram = pickle.load(inp)
-                self.parent.calculation.loaded = True
+            self.parent.calculation.loadedDiagram = binaryPhaseDiagramFunctions.loadDiagramData(datafile)
+            self.parent.calculation.loaded = True
             self.close()
 
 if not(os.path.isfile('bin/InputScriptMode')):
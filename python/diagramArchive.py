@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import zipfile
+import numpy as np
+import thermoResults
+
+# Versioned archive of binary phase diagram data, replacing pickled SaveData objects. An archive is an
+# uncompressed .npz file (so it can also be read with np.load, without pickle) holding one array per field:
+#   version                 archive format version
+#   metadata                JSON object (elements, units, temperature range, data-file, ...)
+#   ts, x1, x2, b           2-phase points: temperature, phase compositions and boundary ID (float64/int64)
+#   phaseNames              all phase names, referred to by the integer codes below
+#   boundaries              (boundaries x 2) phase codes of each boundary
+#   phases                  phase codes of the phases on boundaries
+#   x0phases, x0tmin, x0tmax    single phases along x = 0 and their temperature ranges (same for x1)
+# Since members are stored uncompressed, the point arrays are memory-mapped in place when an archive is
+# opened, and only read from disk when they are used. Archives are written to a temporary file and renamed,
+# so a reader never sees a partially written archive.
+
+archiveVersion = 1
+
+def writeDiagramArchive(filename,ts,x1,x2,boundaries,phases,b,x0data,x1data,mint,maxt,metadata=None):
+    phaseNames = []
+    def code(name):
+        if name not in phaseNames:
+            phaseNames.append(name)
+        return phaseNames.index(name)
+    arrays = {
+        'version': np.array(archiveVersion, dtype='<i8'),
+        'ts': np.asarray(ts, dtype='<f8'),
+        'x1': np.asarray(x1, dtype='<f8'),
+        'x2': np.asarray(x2, dtype='<f8'),
+        'b': np.asarray(b, dtype='<i8'),
+        'boundaries': np.array([[code(boundary[0]), code(boundary[1])] for boundary in boundaries], dtype='<i8').reshape(-1,2),
+        'phases': np.array([code(phase) for phase in phases], dtype='<i8')
+    }
+    for edge, edgeData in [('x0', x0data), ('x1', x1data)]:
+        arrays[f'{edge}phases'] = np.array([code(phase) for phase in edgeData[0]], dtype='<i8')
+        arrays[f'{edge}tmin'] = np.asarray(edgeData[1], dtype='<f8')
+        arrays[f'{edge}tmax'] = np.asarray(edgeData[2], dtype='<f8')
+    arrays['phaseNames'] = np.array(phaseNames, dtype=str)
+    metadata = dict(metadata) if metadata else {}
+    metadata.update({'mint': float(mint), 'maxt': float(maxt)})
+    arrays['metadata'] = np.array(json.dumps(metadata))
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    descriptor, temporary = tempfile.mkstemp(prefix='.diagram-', suffix='.npz', dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            np.savez(f, **arrays)
+        # mkstemp creates the file readable by its owner only; give it the permissions open() would have
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temporary, 0o666 & ~umask)
+        os.replace(temporary, filename)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+class DiagramArchive:
+    # Read access to a diagram archive with the attributes of SaveData (ts, x1, x2, boundaries, phases, b,
+    # x0data, x1data, mint, maxt) plus metadata, so it can be used wherever a loaded SaveData was.
+    # The point arrays are memory-mapped (unless mmap is False) on first use.
+    pointFields = ['ts', 'x1', 'x2', 'b']
+    def __init__(self, filename, mmap=True):
+        self.filename = filename
+        self.mmap = mmap
+        self.arrays = {}
+        with zipfile.ZipFile(filename) as archive:
+            self.members = {info.filename[:-4]: info for info in archive.infolist() if info.filename.endswith('.npy')}
+            for field in ['version', 'metadata']:
+                if field not in self.members:
+                    raise ValueError(f'{filename} is not a diagram archive')
+        version = int(self.read('version'))
+        if version > archiveVersion:
+            raise ValueError(f'{filename} was written by a newer diagram archive version ({version})')
+        self.version = version
+        self.metadata = json.loads(str(self.read('metadata')))
+        self.mint = self.metadata['mint']
+        self.maxt = self.metadata['maxt']
+        phaseNames = [str(name) for name in self.read('phaseNames')]
+        self.boundaries = [[phaseNames[i] for i in boundary] for boundary in self.read('boundaries')]
+        self.phases = [phaseNames[i] for i in self.read('phases')]
+        self.x0data = [[phaseNames[i] for i in self.read('x0phases')], self.read('x0tmin').tolist(), self.read('x0tmax').tolist()]
+        self.x1data = [[phaseNames[i] for i in self.read('x1phases')], self.read('x1tmin').tolist(), self.read('x1tmax').tolist()]
+    def read(self, field):
+        # Array of a member, memory-mapped where possible
+        if field not in self.arrays:
+            info = self.members[field]
+            if self.mmap and info.compress_type == zipfile.ZIP_STORED and field in self.pointFields:
+                self.arrays[field] = thermoResults.memmapNpz(self.filename, field)
+            else:
+                with zipfile.ZipFile(self.filename) as archive:
+                    with archive.open(info) as f:
+                        self.arrays[field] = np.lib.format.read_array(f, allow_pickle=False)
+        return self.arrays[field]
+    def __getattr__(self, name):
+        # Point arrays are only opened when first used
+        if name in DiagramArchive.pointFields:
+            return self.read(name)
+        raise AttributeError(name)
@@ -0,0 +1,109 @@
+import contextlib
+import csv
+import functools
+import json
+import time
+
+# Per-pass instrumentation of phase diagram construction. Each pass (a refinement method, an initial run,
+# ...) is recorded with its counters (calculations submitted, calculations answered from the result cache,
+# results read, 2-phase points found) and timings (running Thermochimica, reading its output, and the rest,
+# i.e. the diagram geometry). Passes can be nested, e.g. refinery runs refineLimit and autoRefine: counters
+# and timings then count towards every pass in progress, and each pass records its depth.
+# Diagram methods are instrumented by decorating them with @measured (a pass) or @timed (a timer); both
+# expect the diagram to have a metrics attribute.
+
+counterNames = ['calculations', 'cached', 'results', 'twoPhase']
+timerNames = ['solver', 'parsing']
+
+class DiagramMetrics:
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.passes = []
+        self.active = []
+    @contextlib.contextmanager
+    def measure(self, name):
+        record = {'pass': name, 'depth': len(self.active), 'start': time.time()}
+        record.update({counter: 0 for counter in counterNames})
+        record.update({timer: 0.0 for timer in timerNames})
+        self.active.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['geometry'] = max(record['seconds'] - sum(record[timer] for timer in timerNames), 0.0)
+            self.active.remove(record)
+            self.passes.append(record)
+            if self.verbose:
+                print(self.summary(record))
+    def count(self, counter, n=1):
+        for record in self.active:
+            record[counter] += n
+    @contextlib.contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            for record in self.active:
+                record[name] += elapsed
+    def summary(self, record):
+        rate = record['calculations'] / record['seconds'] if record['seconds'] > 0 else 0
+        return (f'{"  "*record["depth"]}{record["pass"]}: {record["calculations"]} calculations ({record["cached"]} cached), '
+                f'{record["twoPhase"]} of {record["results"]} results 2-phase, {record["seconds"]:.2f} s '
+                f'(solver {record["solver"]:.2f} s, parsing {record["parsing"]:.2f} s, geometry {record["geometry"]:.2f} s), '
+                f'{rate:.1f} calculations/s')
+    def totals(self):
+        # Totals over the outermost passes, per pass name
+        totals = {}
+        for record in self.passes:
+            if record['depth'] > 0:
+                continue
+            total = totals.setdefault(record['pass'], {'passes': 0, 'seconds': 0.0, 'geometry': 0.0})
+            total['passes'] += 1
+            total['seconds'] += record['seconds']
+            total['geometry'] += record['geometry']
+            for key in counterNames + timerNames:
+                total[key] = total.get(key, 0) + record[key]
+        return totals
+    def report(self):
+        # Table of all passes (in order of completion) followed by the totals
+        columns = ['pass', 'calculations', 'cached', 'results', 'twoPhase', 'seconds', 'solver', 'parsing', 'geometry']
+        rows = [[('  '*record['depth'] + record['pass']) if column == 'pass' else record[column] for column in columns] for record in self.passes]
+        rows.extend([[f'total {name} ({total["passes"]})'] + [total[column] for column in columns[1:]] for name, total in self.totals().items()])
+        text = [f'{columns[0]:<32}' + ''.join(f'{column:>14}' for column in columns[1:])]
+        for row in rows:
+            text.append(f'{row[0]:<32}' + ''.join(f'{value:>14.3f}' if isinstance(value, float) else f'{value:>14}' for value in row[1:]))
+        return '\n'.join(text)
+    def export(self, filename):
+        # Write the pass records to a .csv or .json file
+        if filename.lower().endswith('.csv'):
+            fields = ['pass', 'depth', 'start', 'seconds'] + counterNames + timerNames + ['geometry']
+            with open(filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(self.passes)
+        else:
+            with open(filename, 'w') as f:
+                json.dump({'passes': self.passes, 'totals': self.totals()}, f, indent=4)
+    def clear(self):
+        self.passes = []
+
+def timed(name):
+    # Count the time spent in a diagram method towards the timer name (e.g. 'parsing')
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def measured(method):
+    # Record each call of a diagram method as a pass named after the method
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.metrics.measure(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
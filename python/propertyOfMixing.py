@@ -1,7 +1,6 @@
 import thermoTools
 import subprocess
 import json
-import shutil
 
 def propertyOfMixing(property, phase, temperature, endpoints, mixtures, database,
                      thermochimica_path = '.',
@@ -34,13 +33,14 @@ def propertyOfMixing(property, phase, temperature, endpoints, mixtures, database
         calc = [temperature, pressure]
         calc.extend([endpoint[element] for element in elements])
         calcList.append(calc)
-    thermoTools.WriteRunCalculationList(inputFileName,database,elements,calcList,tunit=tunit,punit=punit,munit=munit,printMode=0,heatCapacity=heatCapacity,excludePhasesExcept=[phase])
+    outputFileName = f'{thermochimica_path}/outputs/{property.replace(" ","_")}OfMixing-{phase}-{temperature}{tunit}-endpoints.json'
+    thermoTools.WriteRunCalculationList(inputFileName,database,elements,calcList,tunit=tunit,punit=punit,munit=munit,printMode=0,heatCapacity=heatCapacity,excludePhasesExcept=[phase],outputFile=outputFileName)
 
     # Run calculation
     thermoTools.RunRunCalculationList(inputFileName,thermochimica_path = thermochimica_path)
 
     # Process output
-    f = open(f'{thermochimica_path}/outputs/thermoout.json',)
+    f = open(outputFileName,)
     try:
         data = json.load(f)
         f.close()
@@ -63,13 +63,14 @@ def propertyOfMixing(property, phase, temperature, endpoints, mixtures, database
         calc = [temperature, pressure]
         calc.extend([(1-mixture)*endpoints[0][element] + (mixture)*endpoints[1][element] for element in elements])
         calcList.append(calc)
-    thermoTools.WriteRunCalculationList(inputFileName,database,elements,calcList,tunit=tunit,punit=punit,munit=munit,printMode=0,heatCapacity=heatCapacity,excludePhasesExcept=[phase])
+    outputFileName = f'{thermochimica_path}/outputs/{property.replace(" ","_")}OfMixing-{phase}-{temperature}{tunit}.json'
+    thermoTools.WriteRunCalculationList(inputFileName,database,elements,calcList,tunit=tunit,punit=punit,munit=munit,printMode=0,heatCapacity=heatCapacity,excludePhasesExcept=[phase],outputFile=outputFileName)
 
     # Run calculation
     thermoTools.RunRunCalculationList(inputFileName,thermochimica_path = thermochimica_path)
 
     # Process output
-    f = open(f'{thermochimica_path}/outputs/thermoout.json',)
+    f = open(outputFileName,)
     try:
         data = json.load(f)
         f.close()
@@ -87,8 +88,7 @@ def propertyOfMixing(property, phase, temperature, endpoints, mixtures, database
         data[str(i)][f'{property} of mixing'] = prop
 
     # Save data
-    with open(f'{thermochimica_path}/outputs/thermoout.json', 'w') as outfile:
+    with open(outputFileName, 'w') as outfile:
         json.dump(data, outfile, indent=4)
-    shutil.copy2(f'{thermochimica_path}/outputs/thermoout.json',f'{thermochimica_path}/outputs/{property.replace(" ","_")}OfMixing-{phase}-{temperature}{tunit}.json')
 
     return mixtureProp
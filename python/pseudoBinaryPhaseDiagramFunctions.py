@@ -1,16 +1,24 @@
 import json
+import os
+import shutil
+import tempfile
+import concurrent.futures
 import matplotlib.pyplot as plt
 import numpy as np
 import copy
-import scipy.optimize
+import scipy.spatial
 from itertools import cycle
 import csv
 import thermoTools
+import diagramMetrics
+from diagramMetrics import measured, timed
 
 # For boundaries of phase regions where both sides have (# phases) < (# elements), only plot points within phaseFractionTol of the boundary
 phaseFractionTol = 1e-2
 # Below this tolerance, set phase fraction = 0
 phaseIncludeTol = 1e-8
+# Faces whose intersection system has a relative singular value below this are treated as not intersecting
+intersectionTol = 1e-10
 
 class diagram:
     def __init__(self, datafile, active, interactivePlot, inputFileName = 'inputs/pythonPhaseDiagramInput.ti', \
@@ -36,6 +44,8 @@ class diagram:
         self.maxt = 0
         self.pressure = 1
         self.points = []
+        # Every calculated point as [x, temperature, phases present], used for refinement
+        self.samples = []
         self.labels = []
         self.elementsUsed = []
         self.nElementsUsed = 0
@@ -56,11 +66,14 @@ class diagram:
         self.showExperiment = True
         self.showExperimentLegend = True
         self.fuzzy = False
+        # Counters and timings of each calculation and processing pass
+        self.metrics = diagramMetrics.DiagramMetrics()
     def initRun(self,pressure,tunit,punit,plane,sum1,sum2,mint,maxt,elementsUsed,massLabels,munit,tshift,fuzzy=False):
         self.mint = mint
         self.maxt = maxt
         self.pressure = pressure
         self.points = []
+        self.samples = []
         self.labels = []
         self.elementsUsed = elementsUsed
         self.nElementsUsed = len(elementsUsed)
@@ -75,7 +88,12 @@ class diagram:
         # Get fuzzy stoichiometry setting
         self.fuzzy = fuzzy
         self.gibbsMinCheck = fuzzy
+    @measured
     def runCalc(self,xlo,xhi,nxstep,tlo,thi,ntstep):
+        self.runCalcList(self.gridCalcList(xlo,xhi,nxstep,tlo,thi,ntstep))
+    def gridCalcList(self,xlo,xhi,nxstep,tlo,thi,ntstep):
+        # Calculations of an (ntstep x nxstep) grid, in order of temperature (with a small stagger between
+        # compositions to avoid repeating the same temperatures)
         xs = np.array([np.linspace((1-xlo)*self.plane[0,i] + xlo*self.plane[1,i],(1-xhi)*self.plane[0,i] + xhi*self.plane[1,i],nxstep) for i in range(self.nElementsUsed)]).T
         temps = np.linspace(tlo,thi,ntstep)
         calcList = []
@@ -90,111 +108,210 @@ class diagram:
                 calc = [t+toff,self.pressure]
                 calc.extend([x[i] for i in range(self.nElementsUsed)])
                 calcList.append(calc)
-        thermoTools.WriteRunCalculationList(self.inputFileName,self.datafile,self.elementsUsed,calcList,tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,fuzzyStoichiometry=self.fuzzy,gibbsMinCheck=self.gibbsMinCheck)
+        return calcList
+    @measured
+    def runCalcParallel(self,xlo,xhi,nxstep,tlo,thi,ntstep,nWorkers=None,nBands=None,update=None):
+        # Run the same grid as runCalc, split into nBands temperature bands (default: two per worker) that are
+        # solved by up to nWorkers (default: number of CPUs) RunCalculationList processes at a time, each with
+        # its own input and output files in a scratch directory. Bands are added to the diagram (as by
+        # processPhaseDiagramData) as they finish, calling update() after each one, e.g. to redraw the plot.
+        # Once all are done, their points and samples are put in band order, so the diagram (and any refinement
+        # of it) does not depend on timing.
+        if nWorkers is None:
+            nWorkers = os.cpu_count() or 1
+        if nBands is None:
+            nBands = 2*nWorkers
+        calcList = self.gridCalcList(xlo,xhi,nxstep,tlo,thi,ntstep)
+        bands = [band for band in np.array_split(np.arange(ntstep), min(max(nBands,1), ntstep)) if len(band) > 0]
+        self.metrics.count('calculations', len(calcList))
+
+        def runBand(directory):
+            thermoTools.RunRunCalculationList(os.path.join(directory, 'input.ti'), jsonName=os.path.join(directory, 'thermoout.json'), thermochimica_path=self.thermochimicaPath, noOutput=True)
+            return directory
+
         print('Thermochimica calculation initiated.')
-        thermoTools.RunRunCalculationList(self.inputFileName, jsonName=self.outputFileName, thermochimica_path=self.thermochimicaPath)
+        bandPoints = [[] for band in bands]
+        bandSamples = [[] for band in bands]
+        directories = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(nWorkers,1)) as executor:
+            pending = {}
+            for b, band in enumerate(bands):
+                directory = tempfile.mkdtemp(prefix='thermochimica-band-')
+                directories.append(directory)
+                outputFile = os.path.join(directory, 'thermoout.json')
+                thermoTools.WriteRunCalculationList(os.path.join(directory, 'input.ti'),self.datafile,self.elementsUsed,calcList[band[0]*nxstep:(band[-1]+1)*nxstep],tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,fuzzyStoichiometry=self.fuzzy,gibbsMinCheck=self.gibbsMinCheck,outputFile=outputFile,parseCache=True)
+                pending[executor.submit(runBand, directory)] = b
+            try:
+                while pending:
+                    with self.metrics.timer('solver'):
+                        done, running = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        b = pending.pop(future)
+                        outputFile = os.path.join(future.result(), 'thermoout.json')
+                        nPoints = len(self.points)
+                        nSamples = len(self.samples)
+                        try:
+                            self.processPhaseDiagramData(outputFile)
+                        except (OSError, ValueError):
+                            print(f'Data load failed for temperature band {b+1} of {len(bands)}')
+                        bandPoints[b] = self.points[nPoints:]
+                        bandSamples[b] = self.samples[nSamples:]
+                        if update is not None:
+                            update()
+            finally:
+                for future in pending:
+                    future.cancel()
+                for directory in directories:
+                    shutil.rmtree(directory, ignore_errors=True)
+        # Put the new points and samples in band order
+        del self.points[len(self.points) - sum(len(points) for points in bandPoints):]
+        for points in bandPoints:
+            self.points.extend(points)
+        del self.samples[len(self.samples) - sum(len(samples) for samples in bandSamples):]
+        for samples in bandSamples:
+            self.samples.extend(samples)
         print('Thermochimica calculation finished.')
-    def processPhaseDiagramData(self):
-        f = open(self.outputFileName,)
-        data = json.load(f)
-        f.close()
-        if list(data.keys())[0] != '1':
-            print('Output does not contain data series')
-            return
-        for i in list(data.keys()):
+    def runCalcList(self,calcList):
+        thermoTools.WriteRunCalculationList(self.inputFileName,self.datafile,self.elementsUsed,calcList,tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,fuzzyStoichiometry=self.fuzzy,gibbsMinCheck=self.gibbsMinCheck,outputFile=self.outputFileName,parseCache=True)
+        print('Thermochimica calculation initiated.')
+        self.metrics.count('calculations', len(calcList))
+        with self.metrics.timer('solver'):
+            thermoTools.RunRunCalculationList(self.inputFileName, thermochimica_path=self.thermochimicaPath)
+        print('Thermochimica calculation finished.')
+    @measured
+    @timed('parsing')
+    def processPhaseDiagramData(self,outputFileName=None):
+        # The output (by default in outputFileName) is read first, collecting the compositions of the phases present at each point, grouped
+        # by number of phases. The plane projections and face intersections are then done for each group at once.
+        groups = {}
+        nRead = 0
+        sampleTemperatures = []
+        samplePhases = []
+        sampleCompositions = []
+        if outputFileName is None:
+            outputFileName = self.outputFileName
+        # Stream the output one calculation at a time rather than loading it all at once
+        for i, record in thermoTools.iterDatabase(outputFileName):
+            if not isinstance(i, int):
+                print('Output does not contain data series')
+                break
             try:
-                self.mint = min(self.mint,data[i]['temperature'])
-                self.maxt = max(self.maxt,data[i]['temperature'])
+                self.mint = min(self.mint,record['temperature'])
+                self.maxt = max(self.maxt,record['temperature'])
             except:
                 continue
-            nPhases = 0
+            self.metrics.count('results')
+            boundPhases = []
+            phaseCompositions = []
             for phaseType in ['solution phases','pure condensed phases']:
-                for phaseName in list(data[i][phaseType].keys()):
-                    if (data[i][phaseType][phaseName]['moles'] > phaseIncludeTol):
-                        nPhases += 1
+                for phaseName, phase in record[phaseType].items():
+                    if (phase['moles'] > phaseIncludeTol):
+                        boundPhases.append(phaseName)
+                        phaseCompositions.append([phase['elements'][element]['mole fraction of phase by element'] if element in phase['elements'] else 0 for element in self.elementsUsed])
+            sampleTemperatures.append(record['temperature'])
+            samplePhases.append(tuple(sorted(boundPhases)))
+            sampleCompositions.append([record['elements'][element]['moles'] if element in record['elements'] else 0 for element in self.elementsUsed])
+            nPhases = len(boundPhases)
             if nPhases == 2:
-                boundPhases = []
-                phaseCompositions = np.zeros([nPhases,self.nElementsUsed])
-                iPhase = 0
-                for phaseType in ['solution phases','pure condensed phases']:
-                    for phaseName in list(data[i][phaseType].keys()):
-                        if (data[i][phaseType][phaseName]['moles'] > phaseIncludeTol):
-                            boundPhases.append(phaseName)
-                            for k in range(self.nElementsUsed):
-                                if self.elementsUsed[k] in data[i][phaseType][phaseName]['elements'].keys():
-                                    phaseCompositions[iPhase,k] = data[i][phaseType][phaseName]['elements'][self.elementsUsed[k]]["mole fraction of phase by element"]
-                            iPhase += 1
-                crossNorms = [np.linalg.norm(np.cross(phaseCompositions[k] - self.plane[0],self.plane[1] - phaseCompositions[k])) for k in range(nPhases)]
-                if max(crossNorms) < phaseIncludeTol:
-                    boundComps = [np.linalg.norm(phaseCompositions[k] - self.plane[0])/np.linalg.norm(self.plane[1] - self.plane[0]) for k in range(nPhases)]
-                    self.points.append([[data[i]['temperature'],boundComps[0],boundPhases],[data[i]['temperature'],boundComps[1],boundPhases]])
-                    continue
-            if nPhases == self.nElementsUsed:
-                allPhases = []
-                phaseComps = []
-                for phaseType in ['solution phases','pure condensed phases']:
-                    for phaseName in list(data[i][phaseType].keys()):
-                        if (data[i][phaseType][phaseName]['moles'] > phaseIncludeTol):
-                            allPhases.append(phaseName)
-                            tempComp = []
-                            for element in self.elementsUsed:
-                                tempComp.append(data[i][phaseType][phaseName]['elements'][element]['mole fraction of phase by element'])
-                            phaseComps.append(tempComp)
-                # Loop over possible phase zone intersections with plane of interest
-                temppoints = []
-                for j in range(self.nElementsUsed):
-                    # Make list of phases on a (nElements-1) dimensional face through omission
-                    omitComps = phaseComps.copy()
-                    omitComps.remove(phaseComps[j])
-                    omitPhase = allPhases.copy()
-                    omitPhase.remove(allPhases[j])
-                    lineComps = []
-                    for k in range(self.nElementsUsed - 2):
-                        lineComps.append([omitComps[0],omitComps[k+1]])
-                    # Calculate intersection of this face with our plane of interest
-                    intersect = self.line_intersection(lineComps)
-                    # Check that the intersection is within the valid bounds
-                    intSum = sum(intersect[1:])
-                    intTest = intSum <= 1
-                    for test in range(self.nElementsUsed - 1):
-                        intTest = intTest and (0 <= intersect[test]) and (intersect[test] <= 1)
-                    if intTest:
-                        # if intSum == 1:
-                        #     # If we are on the far boundary, the first phase is not included
-                        #     omitPhase.remove(omitPhase[0])
-                        # for k in range(self.nElementsUsed - 2):
-                        #     # Check all the other boundaries
-                        #     if intersect[k+1] == 0:
-                        #         # If none of this is used, it is not included
-                        #         omitPhase.remove(omitPhase[k+1])
-                        # self.points.append([data[i]['temperature'],intersect[0],omitPhase])
-                        temppoints.append([data[i]['temperature'],intersect[0],allPhases])
-                self.points.append(temppoints)
-            elif nPhases > 1 and False:
-                boundPhases = []
-                skipPoint = False
-                phaseMoleSum = 0
-                for phaseType in ['solution phases','pure condensed phases']:
-                    for phaseName in list(data[i][phaseType].keys()):
-                        phaseMoleSum += data[i][phaseType][phaseName]['moles']
-                for phaseType in ['solution phases','pure condensed phases']:
-                    for phaseName in list(data[i][phaseType].keys()):
-                        if data[i][phaseType][phaseName]['moles'] > phaseIncludeTol:
-                            boundPhases.append(phaseName)
-                            if phaseFractionTol < data[i][phaseType][phaseName]['moles']/phaseMoleSum < (1-phaseFractionTol):
-                                skipPoint = True
-                                break
-                    if skipPoint:
-                        break
-                if skipPoint:
-                    boundPhases = []
-                    continue
-                tempComp = np.zeros(self.nElementsUsed)
-                for e in range(len(self.elementsUsed)):
-                    if self.elementsUsed[e] in data[i]['elements'].keys():
-                        tempComp[e] = data[i]['elements'][self.elementsUsed[e]]['moles']
-                boundComps = np.linalg.norm(tempComp-self.plane[0])/np.linalg.norm(self.plane[1]-self.plane[0])
-                self.points.append([data[i]['temperature'],boundComps,boundPhases])
+                self.metrics.count('twoPhase')
+            if nPhases == 2 or nPhases == self.nElementsUsed:
+                group = groups.setdefault(nPhases, [[],[],[],[]])
+                group[0].append(nRead)
+                group[1].append(record['temperature'])
+                group[2].append(boundPhases)
+                group[3].append(phaseCompositions)
+            nRead += 1
+
+        # Position of each calculation along the plane
+        if len(sampleTemperatures) > 0:
+            direction = self.plane[1] - self.plane[0]
+            sampleCompositions = np.array(sampleCompositions, dtype=float)
+            sampleCompositions = sampleCompositions / np.sum(sampleCompositions, axis=1)[:,np.newaxis]
+            sampleXs = (sampleCompositions - self.plane[0]) @ direction / (direction @ direction)
+            self.samples.extend([[sampleXs[k],sampleTemperatures[k],samplePhases[k]] for k in range(len(sampleTemperatures))])
+
+        # New points are tagged with their position in the output, so they can be added in order
+        newPoints = []
+        if 2 in groups:
+            order, temperatures, phases, phaseCompositions = groups.pop(2)
+            # (points x phases x elements)
+            phaseCompositions = np.array(phaseCompositions, dtype=float)
+            direction = self.plane[1] - self.plane[0]
+            offsets = phaseCompositions - self.plane[0]
+            # Distance of each phase from the line through the plane end points (times the length of that line)
+            along = offsets @ direction / (direction @ direction)
+            distances = np.linalg.norm(offsets - along[:,:,np.newaxis]*direction, axis=2) * np.linalg.norm(direction)
+            onPlane = np.max(distances, axis=1) < phaseIncludeTol
+            boundComps = np.linalg.norm(offsets, axis=2) / np.linalg.norm(direction)
+            for k in np.flatnonzero(onPlane):
+                newPoints.append((order[k], [[temperatures[k],boundComps[k,0],phases[k]],[temperatures[k],boundComps[k,1],phases[k]]]))
+            if self.nElementsUsed == 2:
+                # With two elements, 2-phase points off the plane are treated as (nElements)-phase points
+                groups[2] = [[group[k] for k in np.flatnonzero(~onPlane)] for group in [order, temperatures, phases, phaseCompositions]]
+        if self.nElementsUsed in groups and len(groups[self.nElementsUsed][0]) > 0:
+            order, temperatures, phases, phaseCompositions = groups[self.nElementsUsed]
+            nElements = self.nElementsUsed
+            phaseCompositions = np.array(phaseCompositions, dtype=float)
+            # Faces of the phase region, each omitting one phase: (points x faces x phases on face x elements)
+            facePhases = np.array([[k for k in range(nElements) if k != j] for j in range(nElements)], dtype=int).reshape(nElements, nElements - 1)
+            faces = phaseCompositions[:,facePhases]
+            intersects = self.line_intersection(faces)
+            # Keep intersections that are within the valid bounds
+            valid = (np.sum(intersects[:,:,1:], axis=2) <= 1) & np.all((0 <= intersects) & (intersects <= 1), axis=2)
+            for k in range(len(order)):
+                temppoints = [[temperatures[k],intersects[k,j,0],phases[k]] for j in np.flatnonzero(valid[k])]
+                # A boundary point needs both sides of the region
+                if len(temppoints) > 1:
+                    newPoints.append((order[k], temppoints))
+        newPoints.sort(key=lambda point: point[0])
+        self.points.extend([point for k, point in newPoints])
+    @measured
+    def autoRefine(self,budget=1000,res=0.005,maxit=20):
+        # Adaptive refinement over the plane: the calculated points are triangulated in (x, normalized
+        # temperature), and in every triangle whose corners do not all have the same phases, the longest edge
+        # with different phases at its ends is split at its midpoint, as long as it is longer than res. Each
+        # round solves all new midpoints (longest edges first) in one calculation list, until budget
+        # calculations have been used, no edge is left to split, or after maxit rounds.
+        # Returns the number of calculations run.
+        nCalc = 0
+        tried = set()
+        for nit in range(maxit):
+            if len(self.samples) < 3 or nCalc >= budget:
+                break
+            trange = max(self.maxt - self.mint, 1)
+            xs = np.array([sample[0] for sample in self.samples])
+            ts = (np.array([sample[1] for sample in self.samples]) - self.mint) / trange
+            assemblages = {}
+            codes = np.array([assemblages.setdefault(sample[2], len(assemblages)) for sample in self.samples])
+            try:
+                triangles = scipy.spatial.Delaunay(np.column_stack([xs, ts])).simplices
+            except scipy.spatial.QhullError:
+                break
+            # Edges (0,1), (1,2) and (2,0) of each triangle
+            first = triangles
+            second = np.roll(triangles, -1, axis=1)
+            lengths = np.hypot(xs[first] - xs[second], ts[first] - ts[second])
+            lengths[(codes[first] == codes[second]) | (lengths <= res)] = 0
+            longest = np.argmax(lengths, axis=1)
+            split = np.flatnonzero(lengths[np.arange(len(triangles)), longest] > 0)
+            edges = np.sort(np.column_stack([first[split, longest[split]], second[split, longest[split]]]), axis=1)
+            edges = [edge for edge in np.unique(edges, axis=0).tolist() if tuple(edge) not in tried]
+            if len(edges) == 0:
+                break
+            edges.sort(key=lambda edge: -np.hypot(xs[edge[0]] - xs[edge[1]], ts[edge[0]] - ts[edge[1]]))
+            edges = edges[:budget - nCalc]
+            calcList = []
+            for i, j in edges:
+                tried.add((i, j))
+                x = (xs[i] + xs[j]) / 2
+                t = self.mint + (ts[i] + ts[j]) / 2 * trange
+                calc = [t - self.tshift, self.pressure]
+                calc.extend([(1-x)*self.plane[0,k] + x*self.plane[1,k] for k in range(self.nElementsUsed)])
+                calcList.append(calc)
+            self.runCalcList(calcList)
+            self.processPhaseDiagramData()
+            nCalc += len(calcList)
+        return nCalc
     def makePlot(self):
         boundaries = []
         b = []
@@ -315,15 +432,21 @@ class diagram:
             if (data['1']['pure condensed phases'][phaseName]['moles'] > phaseIncludeTol):
                 labelName.append(phaseName)
         self.labels.append([[xlab,tlab],'+'.join(labelName)])
-    def line_intersection(self, lines):
-        l1 = np.array(self.plane)
-        ls = np.array(lines)
-        def diff(mu):
-            sum = l1[0] + mu[0]*(l1[1] - l1[0])
-            for i in range(self.nElementsUsed - 2):
-                sum -= ls[i][0] + mu[i+1]*(ls[i][1] - ls[i][0])
-            return sum
-        return scipy.optimize.least_squares(diff, [0.5 for i in range(self.nElementsUsed-1)]).x
+    def line_intersection(self, faces):
+        # Intersections of the plane line p[0] + mu[0]*(p[1] - p[0]) with faces c[0] + sum_k mu[k+1]*(c[k+1] - c[0]),
+        # given by their (nElements-1) vertices c along the last two axes of faces (any leading dimensions).
+        # All the (nElements x nElements-1) systems for mu are solved at once in the least-squares sense using
+        # their SVDs. Degenerate faces and faces parallel to the plane line get mu = NaN.
+        faces = np.asarray(faces, dtype=float)
+        plane = np.asarray(self.plane, dtype=float)
+        direction = np.broadcast_to(plane[1] - plane[0], faces.shape[:-2] + (1, faces.shape[-1]))
+        system = np.swapaxes(np.concatenate([direction, faces[...,:1,:] - faces[...,1:,:]], axis=-2), -1, -2)
+        u, singular, vt = np.linalg.svd(system, full_matrices=False)
+        degenerate = singular[...,-1] <= intersectionTol * singular[...,0]
+        singular = np.where(degenerate[...,np.newaxis], 1, singular)
+        mu = np.einsum('...ji,...j->...i', vt, np.einsum('...ji,...j->...i', u, faces[...,0,:] - plane[0]) / singular)
+        mu[degenerate] = np.nan
+        return mu
     def makeBackup(self):
         self.backup = diagram(self.datafile, False, self.interactivePlot)
         self.backup.mint = self.mint
@@ -342,6 +465,7 @@ class diagram:
         self.backup.exportFileName = self.exportFileName
         self.backup.exportDPI = self.exportDPI
         self.backup.points = copy.deepcopy(self.points)
+        self.backup.samples = copy.deepcopy(self.samples)
         self.backup.elementsUsed = copy.deepcopy(self.elementsUsed)
         self.backup.nElementsUsed = self.nElementsUsed
         self.backup.massLabels = copy.deepcopy(self.massLabels)
@@ -353,6 +477,8 @@ class diagram:
         self.backup.experimentNames = copy.deepcopy(self.experimentNames)
         self.backup.experimentColor = self.experimentColor 
         self.backup.showExperiment = self.showExperiment 
+        # Undo does not discard the record of passes already run
+        self.backup.metrics = self.metrics
     def exportPlot(self):
         # Make sure there is an open plot to save
         if not plt.fignum_exists(self.currentPlot.number):
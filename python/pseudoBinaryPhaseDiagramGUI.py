@@ -145,12 +145,11 @@ class CalculationWindow:
                 munit = values['-munit-']
                 self.calculation.initRun(pressure,tunit,punit,plane,sum1,sum2,mint,maxt,elementsUsed,massLabels,munit,tshift,fuzzy=values["-fuzzy-"])
                 self.macro.append(f'macroPD.initRun({pressure},\'{tunit}\',\'{punit}\',{plane},{sum1},{sum2},{mint},{maxt},{elementsUsed},{massLabels},\'{munit}\',{tshift},fuzzy={values["-fuzzy-"]})')
-                self.calculation.runCalc(0,1,nxstep,tlo,thi,ntstep)
-                self.macro.append(f'macroPD.runCalc(0,1,{nxstep},{tlo},{thi},{ntstep})')
-                self.calculation.processPhaseDiagramData()
-                self.macro.append(f'macroPD.processPhaseDiagramData()')
-                self.calculation.makePlot()
+                self.calculation.runCalcParallel(0,1,nxstep,tlo,thi,ntstep,update=self.updatePlot)
+                self.macro.append(f'macroPD.runCalcParallel(0,1,{nxstep},{tlo},{thi},{ntstep})')
+                self.updatePlot()
                 self.sgw.Element('Refine').Update(disabled = False)
+                self.sgw.Element('Auto Refine').Update(disabled = False)
                 self.sgw.Element('Add Label').Update(disabled = False)
                 self.sgw.Element('Plot').Update(disabled = False)
                 self.sgw.Element('Export Plot').Update(disabled = False)
@@ -159,6 +158,13 @@ class CalculationWindow:
         elif event =='Refine':
             refineWindow = RefineWindow(self)
             self.children.append(refineWindow)
+        elif event =='Auto Refine':
+            self.calculation.makeBackup()
+            self.macro.append('macroPD.makeBackup()')
+            self.sgw.Element('Undo').Update(disabled = False)
+            self.calculation.autoRefine()
+            self.macro.append('macroPD.autoRefine()')
+            self.calculation.makePlot()
         elif event =='Add Label':
             labelWindow = LabelWindow(self)
             self.children.append(labelWindow)
@@ -195,6 +201,7 @@ class CalculationWindow:
             self.macro.append('macroPD.backup = backup')
             self.calculation.makePlot()
             self.sgw.Element('Refine').Update(disabled = False)
+            self.sgw.Element('Auto Refine').Update(disabled = False)
             self.sgw.Element('Add Label').Update(disabled = False)
             self.sgw.Element('Plot').Update(disabled = False)
             self.sgw.Element('Export Plot').Update(disabled = False)
@@ -219,6 +226,7 @@ class CalculationWindow:
             self.calculation.active = True
             self.calculation.interactivePlot = True
             self.sgw.Element('Refine').Update(disabled = False)
+            self.sgw.Element('Auto Refine').Update(disabled = False)
             self.sgw.Element('Add Label').Update(disabled = False)
             self.sgw.Element('Plot').Update(disabled = False)
             self.sgw.Element('Export Plot').Update(disabled = False)
@@ -231,6 +239,11 @@ class CalculationWindow:
         elif event =='Macro Settings':
             macroSettingsWindow = thermoToolsGUI.PhaseDiagramMacroSettingsWindow(self,windowList)
             self.children.append(macroSettingsWindow)
+    def updatePlot(self):
+        # Replace the current plot rather than opening another one (called as calculations finish)
+        if self.calculation.currentPlot:
+            plt.close(fig=self.calculation.currentPlot)
+        self.calculation.makePlot()
     def makeLayout(self):
         tempLayout = [sg.Column([[sg.Text('Temperature')],[sg.Input(key='-temperature-',size=(thermoToolsGUI.inputSize,1))],
                       [sg.Text('Temperature unit')],[sg.Combo(['K', 'C', 'F'],default_value='K',key='-tunit-')]],
@@ -379,11 +392,9 @@ class RefineWindow:
                 self.parent.calculation.makeBackup()
                 self.parent.macro.append(f'macroPD.makeBackup()')
                 self.parent.sgw.Element('Undo').Update(disabled = False)
-                self.parent.calculation.runCalc(xlo,xhi,nxstep,tlo,thi,ntstep)
-                self.parent.macro.append(f'macroPD.runCalc({xlo},{xhi},{nxstep},{tlo},{thi},{ntstep})')
-                self.parent.calculation.processPhaseDiagramData()
-                self.parent.macro.append(f'macroPD.processPhaseDiagramData()')
-                self.parent.calculation.makePlot()
+                self.parent.calculation.runCalcParallel(xlo,xhi,nxstep,tlo,thi,ntstep,update=self.parent.updatePlot)
+                self.parent.macro.append(f'macroPD.runCalcParallel({xlo},{xhi},{nxstep},{tlo},{thi},{ntstep})')
+                self.parent.updatePlot()
 
 class LabelWindow:
     def __init__(self, parent):
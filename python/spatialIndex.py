@@ -0,0 +1,88 @@
+import numpy as np
+import scipy.spatial
+
+# KD-tree index over 2D points (e.g. composition and temperature of phase diagram points) for nearest-point,
+# radius and bounding-box queries. Coordinates are multiplied by scale before indexing, so that distances are
+# measured in normalized units. Points are added in batches: new points are kept in a buffer that is searched
+# directly, and the tree is rebuilt over all points once the buffer exceeds rebuildFraction of the tree size
+# (or minBuffer points), which keeps the cost of adding points low while queries stay logarithmic.
+# Every point carries an integer id, and queries return ids.
+
+class SpatialIndex:
+    def __init__(self, scale=(1,1), rebuildFraction=0.125, minBuffer=256):
+        self.scale = np.array(scale, dtype=float)
+        self.rebuildFraction = rebuildFraction
+        self.minBuffer = minBuffer
+        self.points = np.empty([0,2])
+        self.ids = np.empty([0], dtype=int)
+        self.tree = None
+        self.nTree = 0
+    def __len__(self):
+        return len(self.ids)
+    def add(self, points, ids):
+        points = np.asarray(points, dtype=float).reshape(-1,2)
+        self.points = np.concatenate([self.points, points])
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=int).reshape(-1)])
+        if len(self.ids) - self.nTree > max(self.minBuffer, self.rebuildFraction*self.nTree):
+            self.rebuild()
+    def rescale(self, scale):
+        # Changing the normalization invalidates the tree
+        scale = np.array(scale, dtype=float)
+        if not np.array_equal(scale, self.scale):
+            self.scale = scale
+            self.rebuild()
+    def rebuild(self):
+        self.nTree = len(self.ids)
+        self.tree = scipy.spatial.cKDTree(self.points * self.scale) if self.nTree > 0 else None
+    def buffer(self):
+        return self.points[self.nTree:] * self.scale, self.ids[self.nTree:]
+    def nearest(self, point, k=1):
+        # Ids and (scaled) distances of the k points nearest to point, nearest first
+        point = np.asarray(point, dtype=float) * self.scale
+        distances = []
+        ids = []
+        if self.tree is not None:
+            d, i = self.tree.query(point, k=min(k, self.nTree))
+            distances.append(np.atleast_1d(d))
+            ids.append(self.ids[np.atleast_1d(i)])
+        bufferPoints, bufferIds = self.buffer()
+        if len(bufferIds) > 0:
+            distances.append(np.sqrt(np.sum((bufferPoints - point)**2, axis=1)))
+            ids.append(bufferIds)
+        if len(ids) == 0:
+            return np.empty([0], dtype=int), np.empty([0])
+        distances = np.concatenate(distances)
+        ids = np.concatenate(ids)
+        order = np.argsort(distances, kind='stable')[:k]
+        return ids[order], distances[order]
+    def radius(self, point, r):
+        # Ids of the points within (scaled) distance r of point
+        point = np.asarray(point, dtype=float) * self.scale
+        ids = []
+        if self.tree is not None:
+            ids.append(self.ids[np.array(self.tree.query_ball_point(point, r), dtype=int)])
+        bufferPoints, bufferIds = self.buffer()
+        ids.append(bufferIds[np.sum((bufferPoints - point)**2, axis=1) <= r**2])
+        return np.concatenate(ids)
+    def box(self, lower, upper):
+        # Ids of the points with lower <= point <= upper in both coordinates (unscaled)
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+        ids = []
+        if self.tree is not None:
+            # Candidates from squares (infinity-norm balls) tiling the long side of the box, then the exact test
+            low = np.maximum(lower * self.scale, self.tree.mins)
+            high = np.minimum(upper * self.scale, self.tree.maxes)
+            if np.all(low <= high):
+                sides = high - low
+                nTiles = int(min(np.ceil(np.max(sides) / max(np.min(sides), 1e-12)), 64))
+                r = max(np.max(sides)/nTiles, np.min(sides))/2*(1 + 1e-9) + 1e-12
+                long = np.argmax(sides)
+                centers = np.tile((low + high)/2, (nTiles,1))
+                centers[:,long] = low[long] + (np.arange(nTiles) + 0.5)*sides[long]/nTiles
+                candidates = np.unique(np.concatenate([np.array(c, dtype=int) for c in self.tree.query_ball_point(centers, r, p=np.inf)]))
+                inside = np.all((self.points[candidates] >= lower) & (self.points[candidates] <= upper), axis=1)
+                ids.append(self.ids[candidates[inside]])
+        bufferPoints = self.points[self.nTree:]
+        ids.append(self.ids[self.nTree:][np.all((bufferPoints >= lower) & (bufferPoints <= upper), axis=1)])
+        return np.concatenate(ids)
@@ -0,0 +1,646 @@
+import json
+import math
+import operator
+import os
+import subprocess
+import tempfile
+import concurrent.futures
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+import numpy as np
+import copy
+from shapely.geometry import Polygon
+from shapely.geometry import MultiPolygon
+from shapely.geometry import LineString
+from shapely.geometry import GeometryCollection
+from shapely.ops import split
+import thermoTools
+import diagramMetrics
+from diagramMetrics import measured, timed
+
+# Isothermal sections of ternary phase diagrams, without a GUI (isothermalTernaryGui is the interactive front
+# end). A diagram holds one section: run computes the initial grid, and refine, autoRefine, autoRefine2Phase,
+# addLabel and autoLabel add to it as the corresponding GUI buttons do. Each diagram writes its Thermochimica
+# input and output to its own inputFileName and outputFileName (by default in a scratch directory of its own,
+# removed once no diagram uses it), so several can be worked on at once.
+# runSections computes a stack of sections at different temperatures in parallel, e.g.
+#
+#   sections = ternaryPhaseDiagramFunctions.runSections('data/Kaye_NobleMetals.dat', 'Pd', 'Ru', 'Mo', [1000, 1500, 2000],
+#                                                       nxstep=20, refine=1, smooth=1, label=True, outputDir='outputs/sections')
+
+# Below this tolerance, set phase fraction = 0
+phaseIncludeTol = 1e-8
+
+def fmt(x,pos=None):
+    return '{:.2f}'.format(1-x)
+
+class diagram:
+    def __init__(self, datafile, interactivePlot, inputFileName = None, outputFileName = None, thermochimicaPath = '.'):
+        self.datafile = datafile
+        self.interactivePlot = interactivePlot
+        self.scratch = None
+        if inputFileName is None or outputFileName is None:
+            self.scratch = tempfile.TemporaryDirectory(prefix='thermochimica-section-')
+        self.inputFileName = inputFileName if inputFileName is not None else os.path.join(self.scratch.name, 'input.ti')
+        self.outputFileName = outputFileName if outputFileName is not None else os.path.join(self.scratch.name, 'thermoout.json')
+        self.thermochimicaPath = thermochimicaPath
+        # Pass Thermochimica terminal output through (False) or discard it (True)
+        self.noOutput = False
+        self.x1 = np.empty([0])
+        self.x2 = np.empty([0])
+        self.p1 = []
+        self.p2 = []
+        self.points3 = []
+        self.points1 = []
+        self.el1 = ''
+        self.el2 = ''
+        self.el3 = ''
+        self.tunit = 'K'
+        self.punit = 'atm'
+        self.munit = 'moles'
+        self.labels = []
+        self.temperature = 300
+        self.pressure = 1
+        self.plotMarker = '-'
+        self.plotColor = 'colorful'
+        self.backup = []
+        self.currentPlot = []
+        self.exportFormat = 'png'
+        self.exportFileName = 'thermochimicaPhaseDiagram'
+        self.exportDPI = 300
+        self.resRef = 4
+        self.resSmooth = 4
+        self.figureList = []
+        self.tielines = True
+        self.tiegap = 1/27
+        self.boundaries = []
+        self.phases = []
+        self.b = []
+        self.label1phase = True
+        self.label2phase = True
+        self.label3phase = True
+        # Counters and timings of each run and refinement pass
+        self.metrics = diagramMetrics.DiagramMetrics()
+    def __getstate__(self):
+        # The scratch directory is not copied: copies (Undo, or sections returned by runSections) get their own
+        state = self.__dict__.copy()
+        if self.scratch is not None:
+            state['scratch'] = self.scratch.name
+        return state
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.scratch is not None:
+            directory = self.scratch
+            self.scratch = tempfile.TemporaryDirectory(prefix='thermochimica-section-')
+            for name in ['inputFileName', 'outputFileName']:
+                if os.path.dirname(getattr(self, name)) == directory:
+                    setattr(self, name, os.path.join(self.scratch.name, os.path.basename(getattr(self, name))))
+    @measured
+    def run(self,nxstep,temperature,pressure,tunit,punit,el1,el2,el3,munit='moles'):
+        # Start a new section with an (nxstep x nxstep) grid over the whole composition triangle
+        self.temperature = temperature
+        self.pressure = pressure
+        self.tunit = tunit
+        self.punit = punit
+        self.munit = munit
+        self.el1 = el1
+        self.el2 = el2
+        self.el3 = el3
+        self.x1 = np.empty([0])
+        self.x2 = np.empty([0])
+        self.p1 = []
+        self.p2 = []
+        self.points3 = []
+        self.points1 = []
+        self.labels = []
+        self.resRef = 7
+        self.resSmooth = 7
+        self.writeInputFile(0,1,0,1,nxstep)
+        self.runCalc()
+    @measured
+    def refine(self,xlo1,xhi1,xlo2,xhi2,nxstep):
+        self.writeInputFile(xlo1,xhi1,xlo2,xhi2,nxstep)
+        self.runCalc()
+    def refinery(self):
+        # One use of the Auto Refine button (the resolution increases with each use)
+        self.autoRefine(self.resRef**2)
+        self.resRef += 1
+    def autoSmooth(self):
+        self.autoRefine2Phase(self.resSmooth**2)
+        self.resSmooth += 1
+    @timed('parsing')
+    def processPhaseDiagramData(self):
+        x1 = self.x1.tolist()
+        x2 = self.x2.tolist()
+        nResults = 0
+        # Stream the output one calculation at a time rather than loading it all at once
+        for i, record in thermoTools.iterDatabase(self.outputFileName):
+            if not isinstance(i, int):
+                print('Output does not contain data series')
+                break
+            try:
+                nPhases = 0
+                for phaseType in ['solution phases','pure condensed phases']:
+                    for phaseName in list(record[phaseType].keys()):
+                        if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                            nPhases += 1
+            except:
+                continue
+            nResults += 1
+            # 1-phase data points (edges only)
+            if nPhases == 1:
+                for phaseType in ['solution phases','pure condensed phases']:
+                    for phaseName in list(record[phaseType].keys()):
+                        if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                            boundPhase = phaseName
+                            tempComps = [0,0,0]
+                            if self.el1 in list(record[phaseType][phaseName]['elements'].keys()):
+                                tempComps[0] = record[phaseType][phaseName]['elements'][self.el1]['mole fraction of phase by element']
+                            if self.el2 in list(record[phaseType][phaseName]['elements'].keys()):
+                                tempComps[1] = record[phaseType][phaseName]['elements'][self.el2]['mole fraction of phase by element']
+                            if self.el3 in list(record[phaseType][phaseName]['elements'].keys()):
+                                tempComps[2] = record[phaseType][phaseName]['elements'][self.el3]['mole fraction of phase by element']
+                # only record points on a diagram boundary
+                if min(tempComps) > 0:
+                    continue
+                self.points1.append([[tempComps[0],tempComps[1]],boundPhase])
+            # 2-phase data points
+            if nPhases == 2:
+                self.metrics.count('twoPhase')
+                boundPhases = []
+                boundComps = []
+                for phaseType in ['solution phases','pure condensed phases']:
+                    for phaseName in list(record[phaseType].keys()):
+                        if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                            boundPhases.append(phaseName)
+                            tempComps = [0,0]
+                            if self.el1 in list(record[phaseType][phaseName]['elements'].keys()):
+                                tempComps[0] = record[phaseType][phaseName]['elements'][self.el1]['mole fraction of phase by element']
+                            if self.el2 in list(record[phaseType][phaseName]['elements'].keys()):
+                                tempComps[1] = record[phaseType][phaseName]['elements'][self.el2]['mole fraction of phase by element']
+                            boundComps.append(tempComps)
+                x1.append(boundComps[0])
+                x2.append(boundComps[1])
+                self.p1.append(boundPhases[0])
+                self.p2.append(boundPhases[1])
+            # 3-phase data points
+            if nPhases == 3:
+                boundPhases = []
+                boundComps = []
+                for phaseType in ['solution phases','pure condensed phases']:
+                    for phaseName in list(record[phaseType].keys()):
+                        if (record[phaseType][phaseName]['moles'] > phaseIncludeTol):
+                            boundPhases.append(phaseName)
+                            tempComps = [0,0]
+                            if self.el1 in list(record[phaseType][phaseName]['elements'].keys()):
+                                tempComps[0] = record[phaseType][phaseName]['elements'][self.el1]['mole fraction of phase by element']
+                            if self.el2 in list(record[phaseType][phaseName]['elements'].keys()):
+                                tempComps[1] = record[phaseType][phaseName]['elements'][self.el2]['mole fraction of phase by element']
+                            boundComps.append(tempComps)
+                # Record triplet (check values to avoid duplicating)
+                if len(self.points3) > 0:
+                    mindist = np.sqrt(min([np.linalg.norm(np.array(boundComps)-np.array(p[0])) for p in self.points3]))
+                else:
+                    mindist = 100
+                if mindist > 1e-2:
+                    self.points3.append([boundComps,boundPhases])
+                    # Add first pair
+                    x1.append(boundComps[0])
+                    x2.append(boundComps[1])
+                    self.p1.append(boundPhases[0])
+                    self.p2.append(boundPhases[1])
+                    # Add second pair
+                    x1.append(boundComps[0])
+                    x2.append(boundComps[2])
+                    self.p1.append(boundPhases[0])
+                    self.p2.append(boundPhases[2])
+                    # Add third pair
+                    x1.append(boundComps[1])
+                    x2.append(boundComps[2])
+                    self.p1.append(boundPhases[1])
+                    self.p2.append(boundPhases[2])
+        self.x1 = np.array(x1)
+        self.x2 = np.array(x2)
+        self.metrics.count('results', nResults)
+        return nResults
+    def runCalc(self):
+        # Run the grid in inputFileName (see writeInputFile)
+        print('Thermochimica calculation initiated.')
+        with self.metrics.timer('solver'):
+            subprocess.run([f'{self.thermochimicaPath}/bin/Phase3DiagramDataGen',self.inputFileName], stdout=subprocess.DEVNULL if self.noOutput else None)
+        print('Thermochimica calculation finished.')
+        # Every calculation of the grid writes one result
+        self.metrics.count('calculations', self.processPhaseDiagramData())
+    def runCalcList(self,calcList):
+        # Run a list of [x1, x2] compositions at the section temperature
+        thermoTools.WriteRunCalculationList(self.inputFileName,self.datafile,[self.el1,self.el2,self.el3],[[self.temperature,self.pressure,x1,x2,1-x1-x2] for x1, x2 in calcList],tunit=self.tunit,punit=self.punit,munit=self.munit,printMode=0,outputFile=self.outputFileName)
+        print('Thermochimica calculation initiated.')
+        self.metrics.count('calculations', len(calcList))
+        with self.metrics.timer('solver'):
+            thermoTools.RunRunCalculationList(self.inputFileName, thermochimica_path=self.thermochimicaPath, noOutput=self.noOutput)
+        print('Thermochimica calculation finished.')
+    def phaseBoundaries(self):
+        self.boundaries = []
+        self.phases = []
+        self.b = []
+        for i in range(len(self.p1)):
+            # If a miscibility gap label has been used unnecessarily, remove it
+            if self.p1[i].find('#') > 0:
+                if not(self.p1[i][0:self.p1[i].find('#')] == self.p2[i]):
+                    self.p1[i] = self.p1[i][0:self.p1[i].find('#')]
+            if self.p2[i].find('#') > 0:
+                if not(self.p2[i][0:self.p2[i].find('#')] == self.p1[i]):
+                    self.p2[i] = self.p2[i][0:self.p2[i].find('#')]
+            repeat = False
+            for j in range(len(self.boundaries)):
+                if (self.boundaries[j][0] == self.p1[i]) and (self.boundaries[j][1] == self.p2[i]):
+                    self.b.append(j)
+                    repeat = True
+            if not(repeat):
+                self.boundaries.append([self.p1[i],self.p2[i]])
+                self.b.append(len(self.boundaries)-1)
+
+        for i in range(len(self.boundaries)):
+            repeat1 = False
+            repeat2 = False
+            for j in range(len(self.phases)):
+                if (self.boundaries[i][0] == self.phases[j]):
+                    repeat1 = True
+                if (self.boundaries[i][1] == self.phases[j]):
+                    repeat2 = True
+            if not(repeat1 or self.boundaries[i][0].find('#') > 0):
+                self.phases.append(self.boundaries[i][0])
+            if not(repeat2 or self.boundaries[i][1].find('#') > 0):
+                self.phases.append(self.boundaries[i][1])
+    def makePlot(self):
+        self.phaseBoundaries()
+        # Start figure (without pyplot when not interactive, so that plots can be made in worker processes)
+        if self.interactivePlot:
+            fig = plt.figure()
+            plt.ion()
+        else:
+            fig = Figure()
+        ax = fig.add_axes([0.125, 0.1, 0.75, 0.85])
+
+        # plot 2-phase region self.boundaries
+        color = iter(plt.cm.rainbow(np.linspace(0, 1, len(self.boundaries))))
+        for j in range(len(self.boundaries)):
+            if self.plotColor == 'colorful':
+                c = next(color)
+            else:
+                c = 'k'
+            inds = [i for i, k in enumerate(self.b) if k == j]
+            if len(inds) < 2:
+                continue
+            v1 = np.array([self.x1[inds[1],0],self.x1[inds[1],1],0])
+            v2 = np.array([self.x2[inds[1],0],self.x2[inds[1],1],0])
+            normal = np.cross(v1-v2,np.array([0,0,1]))
+            order = [inds[i] for i, k in sorted(enumerate(self.x1[inds].tolist()), key=lambda coord: coord[1][0]*normal[0]+coord[1][1]*normal[1])]
+            x1s = self.x1[order]
+            x2s = self.x2[order]
+            # Draw tie lines before adding points and flipping order
+            if self.tielines:
+                lastline1 = x1s[0] + (x1s[-1]-x1s[0]) * self.tiegap / 2
+                lastline2 = x2s[0] + (x2s[-1]-x2s[0]) * self.tiegap / 2
+                endline1 = x1s[-1] - (x1s[-1]-x1s[0]) * self.tiegap / 2
+                endline2 = x2s[-1] - (x2s[-1]-x2s[0]) * self.tiegap / 2
+                for i in range(len(x1s)-1):
+                    gap = min(max(np.linalg.norm(x1s[i]-lastline1),np.linalg.norm(x2s[i]-lastline2)),max(np.linalg.norm(x1s[i]-endline1),np.linalg.norm(x2s[i]-endline2)))
+                    if gap > self.tiegap:
+                        ax.plot([1-(x1s[i,0]+x1s[i,1]/2),1-(x2s[i,0]+x2s[i,1]/2)],[x1s[i,1],x2s[i,1]],'--k')
+                        lastline1 = x1s[i]
+                        lastline2 = x2s[i]
+            # Reverse second half and add end points from opposite side to form box
+            x2s = np.flip(x2s,axis=0)
+            x1s = np.append(x1s,[x2s[0]],axis=0)
+            x2s = np.append(x2s,[x1s[0]],axis=0)
+            ax.plot(1-(x1s[:,0]+x1s[:,1]/2),x1s[:,1],self.plotMarker,c=c)
+            ax.plot(1-(x2s[:,0]+x2s[:,1]/2),x2s[:,1],self.plotMarker,c=c)
+
+        ax.plot([0,0.5,1,0],[0,1,0,0],'k-')
+        ax.set_xlim(0,1)
+        ax.set_ylim(0,1)
+        ax.set_title(f'{self.el1} - {self.el2} - {self.el3} ternary phase diagram')
+        ax.set_xlabel(f'Mole fraction {self.el1}')
+        ax.set_ylabel(f'Mole fraction {self.el2}')
+        for lab in self.labels:
+            ax.text(1-(lab[0][0]+lab[0][1]/2),lab[0][1],lab[1], ha='center')
+        # reverse x tick labels for ternary plot
+        ax.xaxis.set_major_formatter(FuncFormatter(fmt))
+        ax2 = ax.twinx()
+        ax2.yaxis.set_major_formatter(FuncFormatter(fmt))
+        ax2.set_ylabel(f'Mole fraction {self.el3}')
+        if self.interactivePlot:
+            plt.sca(ax)
+            plt.show()
+            plt.pause(0.001)
+        self.currentPlot = fig
+        self.figureList.append(fig)
+    def writeInputFile(self,xlo1,xhi1,xlo2,xhi2,nxstep):
+        if xlo1 > xhi1:
+            temp = xlo1
+            xlo1 = xhi1
+            xhi1 = temp
+        if xlo2 > xhi2:
+            temp = xlo2
+            xlo2 = xhi2
+            xhi2 = temp
+        with open(self.inputFileName, 'w') as inputFile:
+            inputFile.write('! Python-generated input file for Thermochimica\n')
+            if float(nxstep) > 0:
+                xstep1 = (float(xhi1)-float(xlo1))/float(nxstep)
+            else:
+                xstep1 = 0
+            if float(nxstep) > 0:
+                xstep2 = (float(xhi2)-float(xlo2))/float(nxstep)
+            else:
+                xstep2 = 0
+            inputFile.write(f'x1               = {str(xlo1)}:{str(xhi1)}:{str(xstep1)}\n')
+            inputFile.write(f'x2               = {str(xlo2)}:{str(xhi2)}:{str(xstep2)}\n')
+            inputFile.write(f'temperature      = {str(self.temperature)}\n')
+            inputFile.write(f'pressure         = {str(self.pressure)}\n')
+            inputFile.write(f'temperature unit = {self.tunit}\n')
+            inputFile.write(f'pressure unit    = {self.punit}\n')
+            inputFile.write(f'mass unit        = \'{self.munit}\'\n')
+            inputFile.write(f'iEl              = {str(thermoTools.atomic_number_map.index(self.el1)+1)} {str(thermoTools.atomic_number_map.index(self.el2)+1)} {str(thermoTools.atomic_number_map.index(self.el3)+1)}\n')
+            inputFile.write(f'data file        = {self.datafile}\n')
+            inputFile.write(f'output file      = {self.outputFileName}\n')
+    @measured
+    def addLabel(self,x1lab,x2lab):
+        self.runCalcList([[x1lab,x2lab]])
+        f = open(self.outputFileName,)
+        data = json.load(f)
+        f.close()
+        if list(data.keys())[0] != '1':
+            print('Output does not contain data series')
+            return
+        labelName = []
+        for phaseName in list(data['1']['solution phases'].keys()):
+            if (data['1']['solution phases'][phaseName]['moles'] > 0):
+                labelName.append(phaseName)
+        for phaseName in list(data['1']['pure condensed phases'].keys()):
+            if (data['1']['pure condensed phases'][phaseName]['moles'] > 0):
+                labelName.append(phaseName)
+        self.labels.append([[x1lab,x2lab],'+'.join(labelName)])
+        self.processPhaseDiagramData()
+    @measured
+    def autoRefine(self,res):
+        outline = Polygon([[0,0],[0,1],[1,0],[0,0]])
+        maxArea = 0
+        self.phaseBoundaries()
+
+        # find and subtract 1-phase regions
+        for phase in self.phases:
+            inds1 = [i for i, k in enumerate(self.p1) if k == phase]
+            inds2 = [i for i, k in enumerate(self.p2) if k == phase]
+            points = []
+            if len(inds1) > 0:
+                points.extend(self.x1[inds1].tolist())
+            if len(inds2) > 0:
+                points.extend(self.x2[inds2].tolist())
+            for point in self.points1:
+                if point[1] == phase:
+                    points.append(point[0])
+            if len(points) < 3:
+                continue
+            average = np.average(np.array(points),axis=0)
+            sortpoints = sorted(points, key=lambda coord: (-135 - math.degrees(math.atan2(*tuple(map(operator.sub, coord, average))[::-1]))) % 360)
+            phaseOutline = Polygon(sortpoints).buffer(0)
+            try:
+                outline = outline - phaseOutline
+            except:
+                continue
+
+        # find and subtract 2-phase regions
+        for j in range(len(self.boundaries)):
+            inds = [i for i, k in enumerate(self.b) if k == j]
+            if len(inds) < 2:
+                continue
+            v1 = np.array([self.x1[inds[1],0],self.x1[inds[1],1],0])
+            v2 = np.array([self.x2[inds[1],0],self.x2[inds[1],1],0])
+            normal = np.cross(v1-v2,np.array([0,0,1]))
+            order = [inds[i] for i, k in sorted(enumerate(self.x1[inds].tolist()), key=lambda coord: coord[1][0]*normal[0]+coord[1][1]*normal[1])]
+            x1s = self.x1[order]
+            x2s = self.x2[order]
+            # Reverse second half and add end points from opposite side to form box
+            x2s = np.flip(x2s,axis=0)
+            x1s = np.append(x1s,x2s,axis=0)
+            x1s = np.append(x1s,[x1s[0]],axis=0)
+            phaseOutline = Polygon(x1s).buffer(0)
+            try:
+                outline = outline - phaseOutline
+            except:
+                continue
+
+        # find and subtract 3-phase regions
+        for point in self.points3:
+            phaseOutline = Polygon(point[0])
+            try:
+                outline = outline - phaseOutline
+            except:
+                continue
+
+        xs = []
+        ys = []
+        subres = int(np.ceil(np.sqrt(res)))
+        try:
+            oxlo, otlo, oxhi, othi = outline.bounds
+        except:
+            return
+        xindices = np.linspace(oxlo, oxhi, subres)
+        yindices = np.linspace(otlo, othi, subres)
+        horizontal_splitters = [LineString([(x, yindices[0]), (x, yindices[-1])]) for x in xindices]
+        vertical_splitters = [LineString([(xindices[0], y), (xindices[-1], y)]) for y in yindices]
+        # If the outline contains non-polygon shapes (like lines) it will be a GeometryCollection instead
+        # and we need to remove those non-polygon shapes so it can be a MultiPolygon again
+        if isinstance(outline,GeometryCollection):
+            outline = MultiPolygon([shape for shape in list(outline.geoms) if isinstance(shape,Polygon)])
+        # A single remaining region is a Polygon
+        if isinstance(outline,Polygon):
+            outline = MultiPolygon([outline])
+        for splitter in vertical_splitters:
+            try:
+                outline = MultiPolygon(list(split(outline, splitter).geoms))
+            except:
+                continue
+        for splitter in horizontal_splitters:
+            try:
+                outline = MultiPolygon(list(split(outline, splitter).geoms))
+            except:
+                continue
+        for tempOutline in list(outline.geoms):
+            if tempOutline.area < (1 / (10*res**2)):
+                continue
+            maxArea = max(tempOutline.area,maxArea)
+            pxlo, ptlo, pxhi, pthi = tempOutline.bounds
+            xstep = (pxhi - pxlo) / subres / 10
+            ystep = (pthi - ptlo) / subres / 10
+            xs.extend(np.linspace(pxlo + xstep, pxhi - xstep, subres))
+            xs.extend(np.linspace(pxhi - xstep, pxlo + xstep, subres))
+            ys.extend(np.linspace(pthi - ystep, ptlo + ystep, subres))
+            ys.extend(np.linspace(pthi - ystep, ptlo + ystep, subres))
+
+        if len(xs) > 0:
+            self.runCalcList([[xs[i],ys[i]] for i in range(len(xs))])
+            self.processPhaseDiagramData()
+    @measured
+    def autoRefine2Phase(self,res):
+        # Run iteratively
+        nIt = 0
+        while nIt < 3:
+            nIt = nIt + 1
+            maxGap = 0
+            # Create arrays again with new data
+            self.phaseBoundaries()
+
+            # Refine two-phase region density
+            xs = []
+            ys = []
+            for j in range(len(self.boundaries)):
+                inds = [i for i, k in enumerate(self.b) if k == j]
+                if len(inds) < 2:
+                    continue
+                v1 = np.array([self.x1[inds[1],0],self.x1[inds[1],1],0])
+                v2 = np.array([self.x2[inds[1],0],self.x2[inds[1],1],0])
+                normal = np.cross(v1-v2,np.array([0,0,1]))
+                order = [inds[i] for i, k in sorted(enumerate(self.x1[inds].tolist()), key=lambda coord: coord[1][0]*normal[0]+coord[1][1]*normal[1])]
+                x1s = self.x1[order]
+                x2s = self.x2[order]
+                for i in range(len(x1s)-1):
+                    gap = np.linalg.norm(x1s[i]-x1s[i+1])+np.linalg.norm(x2s[i]-x2s[i+1])
+                    maxGap = max(gap,maxGap)
+                    if gap > 1/res:
+                        start = np.average([x1s[i],  x2s[i]],axis=0)
+                        end   = np.average([x1s[i+1],x2s[i+1]],axis=0)
+                        self.writeInputFile(start[0],end[0],start[1],end[1],np.ceil(gap * res))
+                        self.runCalc()
+
+            # Test the minimum difference between points to see if converged
+            if maxGap <= 1/res:
+                break
+    def autoLabel(self):
+        # Make list of self.boundaries and points belonging to them
+        self.phaseBoundaries()
+
+        # label 1-phase regions
+        if self.label1phase:
+            for phase in self.phases:
+                inds1 = [i for i, k in enumerate(self.p1) if k == phase]
+                inds2 = [i for i, k in enumerate(self.p2) if k == phase]
+                points = []
+                if len(inds1) > 0:
+                    points.extend(self.x1[inds1].tolist())
+                if len(inds2) > 0:
+                    points.extend(self.x2[inds2].tolist())
+                for point in self.points1:
+                    if point[1] == phase:
+                        points.append(point[0])
+                points = np.array(points)
+                average = np.average(points,axis=0)
+                self.labels.append([[average[0],average[1]],phase])
+
+        # label 2-phase regions
+        if self.label2phase:
+            for j in range(len(self.boundaries)):
+                inds = [i for i, k in enumerate(self.b) if k == j]
+                if len(inds) < 2:
+                    continue
+                average = (np.average(self.x1[inds],axis=0) + np.average(self.x2[inds],axis=0)) / 2
+                self.labels.append([[average[0],average[1]],'+'.join(self.boundaries[j])])
+
+        # label 3-phase regions
+        if self.label3phase:
+            for point in self.points3:
+                average = np.average(point[0],axis=0)
+                self.labels.append([[average[0],average[1]],'+'.join(point[1])])
+    def makeBackup(self):
+        self.backup = diagram(self.datafile, self.interactivePlot, self.inputFileName, self.outputFileName, self.thermochimicaPath)
+        # Share the scratch directory, so it is kept for as long as either diagram uses it
+        self.backup.scratch = self.scratch
+        self.backup.noOutput = self.noOutput
+        self.backup.x1 = copy.deepcopy(self.x1)
+        self.backup.x2 = copy.deepcopy(self.x2)
+        self.backup.p1 = copy.deepcopy(self.p1)
+        self.backup.p2 = copy.deepcopy(self.p2)
+        self.backup.points3 = copy.deepcopy(self.points3)
+        self.backup.points1 = copy.deepcopy(self.points1)
+        self.backup.labels = copy.deepcopy(self.labels)
+        self.backup.temperature = self.temperature
+        self.backup.pressure = self.pressure
+        self.backup.plotMarker = self.plotMarker
+        self.backup.plotColor = self.plotColor
+        self.backup.el1 = self.el1
+        self.backup.el2 = self.el2
+        self.backup.el3 = self.el3
+        self.backup.tunit = self.tunit
+        self.backup.punit = self.punit
+        self.backup.munit = self.munit
+        self.backup.exportFormat = self.exportFormat
+        self.backup.exportFileName = self.exportFileName
+        self.backup.exportDPI = self.exportDPI
+        self.backup.resRef = self.resRef
+        self.backup.resSmooth = self.resSmooth
+        self.backup.tielines = self.tielines
+        self.backup.tiegap = self.tiegap
+        self.backup.label1phase = self.label1phase
+        self.backup.label2phase = self.label2phase
+        self.backup.label3phase = self.label3phase
+        # Undo does not discard the record of passes already run
+        self.backup.metrics = self.metrics
+    def exportPlot(self):
+        # Save the current plot as exportFileName.exportFormat, making it first if needed; returns 0 on success
+        if not self.currentPlot:
+            self.makePlot()
+        try:
+            self.currentPlot.savefig(f'{self.exportFileName}.{self.exportFormat}', format=self.exportFormat, dpi=self.exportDPI)
+            return 0
+        except:
+            return 1
+
+def runSection(datafile, el1, el2, el3, temperature, nxstep=10, pressure=1, tunit='K', punit='atm', munit='moles', \
+               refine=0, smooth=0, label=False, outputDir=None, exportFormat='png', thermochimicaPath='.'):
+    # Compute one isothermal section headlessly (with its Thermochimica input and output in the scratch directory
+    # of the diagram). If outputDir is given, the plot is saved there as <el1>-<el2>-<el3>_<temperature>.<exportFormat>.
+    # Returns the diagram.
+    section = diagram(datafile, False)
+    section.thermochimicaPath = thermochimicaPath
+    section.noOutput = True
+    section.metrics.verbose = False
+    section.run(nxstep,temperature,pressure,tunit,punit,el1,el2,el3,munit)
+    for i in range(refine):
+        section.refinery()
+    for i in range(smooth):
+        section.autoSmooth()
+    if label:
+        section.autoLabel()
+    if outputDir is not None:
+        section.exportFormat = exportFormat
+        section.exportFileName = os.path.join(outputDir, f'{el1}-{el2}-{el3}_{temperature:g}')
+        section.makePlot()
+        section.exportPlot()
+    # Figures are not kept, so the diagram can be returned from a worker process
+    section.currentPlot = []
+    section.figureList = []
+    return section
+
+def runSections(datafile, el1, el2, el3, temperatures, processes=None, outputDir=None, **kwargs):
+    # Compute a stack of isothermal sections, one per temperature, in a pool of up to processes (default: number
+    # of CPUs) worker processes; keyword arguments are passed on to runSection. Returns the diagrams in the order
+    # of temperatures (None where a section failed, after printing the error).
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if outputDir is not None:
+        os.makedirs(outputDir, exist_ok=True)
+    datafile = os.path.abspath(datafile)
+    sections = [None for temperature in temperatures]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(min(processes, len(temperatures)), 1)) as executor:
+        futures = {executor.submit(runSection, datafile, el1, el2, el3, temperature, outputDir=outputDir, **kwargs): i for i, temperature in enumerate(temperatures)}
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                sections[i] = future.result()
+                print(f'Section at {temperatures[i]:g} {kwargs.get("tunit", "K")} finished.')
+            except Exception as error:
+                print(f'Section at {temperatures[i]:g} {kwargs.get("tunit", "K")} failed: {error}')
+    return sections
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import tempfile
+import thermoTools
+
+# asyncio counterparts of thermoTools.RunInputScript and thermoTools.RunRunCalculationList, so that
+# Thermochimica runs can be awaited from an event loop instead of blocking it. Each run writes its
+# JSON output to its own file (a temporary one unless jsonName is given) and returns the parsed data,
+# so many independent runs can be awaited at once, e.g. with gatherRuns.
+# Concurrency is bounded by sharing an asyncio.Semaphore between runs. Progress callbacks are called
+# as progress(filename, status) with status one of 'started', 'finished', 'failed' or 'timed out'.
+
+async def RunRunCalculationListAsync(filename,jsonName=None,thermochimica_path='.',timeout=None,semaphore=None,progress=None,noOutput=True):
+    return await runExecutable('RunCalculationList',filename,jsonName,thermochimica_path,timeout,semaphore,progress,noOutput)
+
+async def RunInputScriptAsync(filename,jsonName=None,thermochimica_path='.',timeout=None,semaphore=None,progress=None,noOutput=True):
+    try:
+        return await runExecutable('InputScriptMode',filename,jsonName,thermochimica_path,timeout,semaphore,progress,noOutput)
+    finally:
+        # Delete input file (as RunInputScript does)
+        os.remove(filename)
+
+async def gatherRuns(filenames,runner=RunRunCalculationListAsync,maxConcurrent=None,timeout=None,progress=None,**kwargs):
+    # Run one input file per entry of filenames with at most maxConcurrent (default: number of CPUs)
+    # Thermochimica processes at a time; returns the parsed outputs in the order of filenames
+    if maxConcurrent is None:
+        maxConcurrent = os.cpu_count() or 1
+    semaphore = asyncio.Semaphore(maxConcurrent)
+    return await asyncio.gather(*[runner(filename,timeout=timeout,semaphore=semaphore,progress=progress,**kwargs) for filename in filenames])
+
+async def runExecutable(executable,filename,jsonName,thermochimica_path,timeout,semaphore,progress,noOutput):
+    # Run a Thermochimica executable on filename and return its parsed JSON output, or None if the
+    # run failed or did not finish within timeout seconds (in which case it is killed)
+    temporary = jsonName is None
+    if temporary:
+        descriptor, outputFile = tempfile.mkstemp(prefix='thermoout-', suffix='.json')
+        os.close(descriptor)
+    else:
+        outputFile = thermoTools.GetOutputPath(jsonName,thermochimica_path)
+    command = [f'{thermochimica_path}/bin/{executable}',filename,outputFile]
+    stream = asyncio.subprocess.DEVNULL if noOutput else None
+
+    async def run():
+        if progress:
+            progress(filename,'started')
+        process = await asyncio.create_subprocess_exec(*command,stdout=stream,stderr=stream)
+        try:
+            await asyncio.wait_for(process.wait(),timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            print(f'Thermochimica run of {filename} timed out and was cancelled')
+            if progress:
+                progress(filename,'timed out')
+            return None
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        try:
+            # Parse off the event loop, since large outputs take a while
+            data = await asyncio.get_running_loop().run_in_executor(None,thermoTools.readDatabase,outputFile)
+        except (OSError, json.JSONDecodeError):
+            print(f'Data load failed for Thermochimica run of {filename}')
+            if progress:
+                progress(filename,'failed')
+            return None
+        if progress:
+            progress(filename,'finished')
+        return data
+
+    try:
+        if semaphore is None:
+            return await run()
+        async with semaphore:
+            return await run()
+    finally:
+        if temporary and os.path.exists(outputFile):
+            os.remove(outputFile)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import thermoTools
+
+# Persistent memo cache of Thermochimica results. Each successful calculation of a calculation list is
+# stored under a hash of everything that determines its result: the contents of the data-file, the
+# elements, the units, the phase exclusion / minimum species / fuzzy stoichiometry / heat capacity /
+# reinitialization options and the state point (temperature, pressure and masses rounded to a number of
+# significant digits).
+# Calculations found in the cache are returned without running Thermochimica.
+# Entries live in a SQLite file (resultCache.sqlite in $THERMOCHIMICA_CACHE_DIR, or outputs/ by default)
+# and the least recently used ones are evicted once the stored records exceed maxBytes.
+
+cacheVersion = 1
+
+class ResultCache:
+    def __init__(self, directory=None, maxBytes=256*1024**2, digits=10, thermochimica_path='.'):
+        if directory is None:
+            directory = os.environ.get('THERMOCHIMICA_CACHE_DIR', f'{thermochimica_path}/outputs')
+        os.makedirs(directory, exist_ok=True)
+        self.filename = os.path.join(directory, 'resultCache.sqlite')
+        self.maxBytes = maxBytes
+        self.digits = digits
+        self.hits = 0
+        self.misses = 0
+        self.databaseHashes = {}
+        self.connection = sqlite3.connect(self.filename, timeout=30)
+        self.connection.execute('create table if not exists results (key text primary key, record text not null, size integer not null, used real not null)')
+        self.connection.execute('create index if not exists resultsUsed on results (used)')
+        self.connection.commit()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def close(self):
+        self.connection.close()
+    def databaseHash(self, datafile):
+        # Hash of the data-file contents, recomputed only when its modification time or size change
+        status = os.stat(datafile)
+        stamp = (status.st_mtime_ns, status.st_size)
+        path = os.path.abspath(datafile)
+        if self.databaseHashes.get(path, (None,))[0] != stamp:
+            digest = hashlib.sha256()
+            with open(datafile, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self.databaseHashes[path] = (stamp, digest.hexdigest())
+        return self.databaseHashes[path][1]
+    def round(self, value):
+        return f'{float(value):.{self.digits}g}'
+    def keys(self, datafile, elements, calcList, tunit='K', punit='atm', munit='moles', heatCapacity=False, minSpecies=None, excludePhases=None, excludePhasesExcept=None, fuzzyStoichiometry=False, fuzzyMagnitude=-1, gibbsMinCheck=False, reinitialization=False):
+        # Canonical cache keys for the calculations of calcList (one list of [T, P, mass 1, mass 2, ...] per calculation)
+        options = json.dumps({
+            'version': cacheVersion,
+            'database': self.databaseHash(datafile),
+            'elements': list(elements),
+            'units': [tunit, punit, munit],
+            'heatCapacity': bool(heatCapacity),
+            'minSpecies': minSpecies,
+            'excludePhases': sorted(excludePhases) if excludePhases else [],
+            'excludePhasesExcept': sorted(excludePhasesExcept) if excludePhasesExcept else [],
+            'fuzzy': [bool(fuzzyStoichiometry), fuzzyMagnitude if fuzzyStoichiometry else None],
+            'gibbsMinCheck': bool(gibbsMinCheck),
+            # Warm-started results can settle differently and record how they were started
+            'reinitialization': bool(reinitialization)
+        }, sort_keys=True)
+        prefix = hashlib.sha256(options.encode()).hexdigest()
+        return [hashlib.sha256(f'{prefix}:{",".join(self.round(value) for value in calc)}'.encode()).hexdigest() for calc in calcList]
+    def get(self, keys):
+        # Return {key: record} for the keys present in the cache, marking them as recently used
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start+500]
+            rows = self.connection.execute(f'select key, record from results where key in ({",".join("?"*len(chunk))})', chunk).fetchall()
+            for key, record in rows:
+                found[key] = json.loads(record)
+        if found:
+            now = time.time()
+            self.connection.executemany('update results set used = ? where key = ?', [(now, key) for key in found])
+            self.connection.commit()
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+    def put(self, entries):
+        # Store {key: record}; failed calculations (empty records) are not cached
+        now = time.time()
+        rows = []
+        for key, record in entries.items():
+            if not record:
+                continue
+            text = json.dumps(record)
+            rows.append((key, text, len(text), now))
+        if not rows:
+            return
+        self.connection.executemany('insert or replace into results (key, record, size, used) values (?, ?, ?, ?)', rows)
+        self.connection.commit()
+        self.evict()
+    def evict(self):
+        # Drop least recently used records until the cache fits in maxBytes
+        total = self.connection.execute('select coalesce(sum(size), 0) from results').fetchone()[0]
+        if total <= self.maxBytes:
+            return
+        excess = total - self.maxBytes
+        removed = []
+        for key, size in self.connection.execute('select key, size from results order by used'):
+            removed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany('delete from results where key = ?', removed)
+        self.connection.commit()
+    def clear(self):
+        self.connection.execute('delete from results')
+        self.connection.commit()
+
+def RunCalculationListCached(cache,filename,datafile,elements,calcList,outputFile=None,thermochimica_path='.',noOutput=False,**kwargs):
+    # Equivalent of thermoTools.WriteRunCalculationList followed by thermoTools.RunRunCalculationList, except that
+    # only the calculations missing from cache are run. The complete JSON output, numbered in calcList order, is
+    # written to outputFile (default outputs/thermoout.json) and also returned.
+    keyOptions = {option: kwargs[option] for option in ['tunit','punit','munit','heatCapacity','minSpecies','excludePhases',
+                                                        'excludePhasesExcept','fuzzyStoichiometry','fuzzyMagnitude','gibbsMinCheck',
+                                                        'reinitialization'] if option in kwargs}
+    keys = cache.keys(datafile, elements, calcList, **keyOptions)
+    found = cache.get(keys)
+    missing = [i for i, key in enumerate(keys) if key not in found]
+    outputPath = outputFile if outputFile else thermoTools.GetOutputPath(None, thermochimica_path)
+
+    computed = {}
+    if missing:
+        thermoTools.WriteRunCalculationList(filename, datafile, elements, [calcList[i] for i in missing], outputFile=outputPath, **kwargs)
+        thermoTools.RunRunCalculationList(filename, thermochimica_path=thermochimica_path, noOutput=noOutput)
+        for n, record in thermoTools.iterDatabase(outputPath):
+            computed[missing[n-1]] = record
+        cache.put({keys[i]: record for i, record in computed.items()})
+
+    data = {}
+    for i, key in enumerate(keys):
+        data[str(i+1)] = found[key] if key in found else computed.get(i, {})
+    with open(outputPath, 'w') as outfile:
+        json.dump(data, outfile, indent=4)
+    return data
@@ -0,0 +1,178 @@
+import json
+import zipfile
+import numpy as np
+import thermoTools
+
+# Columnar storage for Thermochimica output series. Every numeric leaf of the JSON output
+# (e.g. ['solution phases','gas_ideal','species','CO','mole fraction']) becomes one column of
+# a (columns x points) float array, so selecting curves is array slicing rather than dict lookups.
+# Calculations that did not produce a value for a column (absent phase, failed calculation) hold NaN.
+
+phaseTypes = ['solution phases','pure condensed phases']
+storeVersion = 1
+
+class ResultStore:
+    def __init__(self, index, paths, values, phaseNames=None, phaseModels=None, fixedLayout=False):
+        self.index = np.asarray(index)
+        self.paths = [tuple(path) for path in paths]
+        self.values = values
+        self.columnIndex = {path: i for i, path in enumerate(self.paths)}
+        # Phase name dictionary: phase type -> list of phase names, and phase name -> model
+        self.phaseNames = phaseNames if phaseNames is not None else {phaseType: [] for phaseType in phaseTypes}
+        self.phaseModels = phaseModels if phaseModels is not None else {}
+        # Stores built from fixed-layout records have a column for every field they can hold
+        self.fixedLayout = fixedLayout
+    def __len__(self):
+        return len(self.index)
+    @classmethod
+    def fromJSON(cls, datafile):
+        # Build the store from a JSON output series, streaming one calculation at a time
+        index = []
+        columns = {}
+        phaseNames = {phaseType: [] for phaseType in phaseTypes}
+        phaseModels = {}
+        for n, (i, record) in enumerate(thermoTools.iterDatabase(datafile)):
+            index.append(i)
+            for phaseType in phaseTypes:
+                for phaseName, phase in record.get(phaseType, {}).items():
+                    if phaseName not in phaseNames[phaseType]:
+                        phaseNames[phaseType].append(phaseName)
+                        phaseModels[phaseName] = phase.get('phase model', '')
+            for path, value in flattenRecord(record):
+                if path not in columns:
+                    # Backfill earlier calculations that did not have this column
+                    columns[path] = [np.nan] * n
+                columns[path].append(value)
+            # Pad columns that this calculation did not have
+            for column in columns.values():
+                if len(column) == n:
+                    column.append(np.nan)
+        paths = list(columns.keys())
+        values = np.array([columns[path] for path in paths], dtype=float).reshape(len(paths), len(index))
+        return cls(np.array(index), paths, values, phaseNames, phaseModels)
+    @classmethod
+    def fromBinary(cls, datafile, mmap=True):
+        # Wrap a Thermochimica binary output file; the value array is a transposed view of its records
+        columns, records = thermoTools.readBinaryOutput(datafile, mmap=mmap)
+        return cls.fromRecords(columns, records)
+    @classmethod
+    def fromRecords(cls, columns, records):
+        # Build the store from fixed-layout result records (calculations x columns)
+        phaseNames = {phaseType: [] for phaseType in phaseTypes}
+        for path in columns:
+            if path[0] in phaseTypes and path[1] not in phaseNames[path[0]]:
+                phaseNames[path[0]].append(path[1])
+        return cls(records[:, 0].astype(int), list(columns.keys()), records.T, phaseNames, fixedLayout=True)
+    def save(self, filename):
+        # Uncompressed so that load can memory-map the value array straight out of the archive
+        np.savez(filename,
+                 version=np.array(storeVersion),
+                 index=self.index,
+                 values=np.ascontiguousarray(self.values),
+                 metadata=np.array(json.dumps({'paths': [list(path) for path in self.paths],
+                                               'phaseNames': self.phaseNames,
+                                               'phaseModels': self.phaseModels,
+                                               'fixedLayout': self.fixedLayout})))
+    @classmethod
+    def load(cls, filename, mmap=True):
+        with np.load(filename) as archive:
+            version = int(archive['version'])
+            if version > storeVersion:
+                raise ValueError(f'{filename} was written by a newer result store version ({version})')
+            index = archive['index']
+            metadata = json.loads(str(archive['metadata']))
+            values = archive['values'] if not mmap else None
+        if mmap:
+            values = memmapNpz(filename, 'values')
+        return cls(index, metadata['paths'], values, metadata['phaseNames'], metadata['phaseModels'], metadata.get('fixedLayout', False))
+    def checkRecorded(self, path):
+        # Paths missing from a fixed-layout store are fields that such records do not hold at all
+        if tuple(path) not in self.columnIndex:
+            raise KeyError(f'{tuple(path)} is not recorded in fixed-layout result records ({thermoTools.binaryOmitted} are only written to JSON)')
+    def column(self, path, where=None):
+        # Return the values of a single path, optionally restricted by a boolean mask or index array
+        if self.fixedLayout:
+            self.checkRecorded(path)
+        values = self.values[self.columnIndex[tuple(path)]]
+        if where is not None:
+            values = values[where]
+        return values
+    def select(self, paths, where=None):
+        # Return a (len(paths) x points) array for a list of paths; unknown paths give NaN rows (or raise a
+        # KeyError for fixed-layout stores)
+        if self.fixedLayout:
+            for path in paths:
+                self.checkRecorded(path)
+        rows = np.full((len(paths), len(self)), np.nan)
+        known = [(i, self.columnIndex[tuple(path)]) for i, path in enumerate(paths) if tuple(path) in self.columnIndex]
+        if known:
+            rowIndex, columnIndex = zip(*known)
+            rows[list(rowIndex)] = self.values[list(columnIndex)]
+        if where is not None:
+            rows = rows[:, where]
+        return rows
+    def match(self, pattern):
+        # List the stored paths matching pattern, where None matches any key at that level
+        return [path for path in self.paths
+                if len(path) == len(pattern) and all(p is None or p == k for p, k in zip(pattern, path))]
+    def stable(self, phaseName, tol=1e-8):
+        # Boolean mask of the calculations in which phaseName is present
+        for phaseType in phaseTypes:
+            path = (phaseType, phaseName, 'moles')
+            if path in self.columnIndex:
+                return np.nan_to_num(self.column(path)) > tol
+        return np.zeros(len(self), dtype=bool)
+    def plotData(self, xkey, yused, yused2=None):
+        # Equivalent of thermoTools.readPlotData: calculations missing any requested value are dropped
+        def getRows(used):
+            rows = []
+            for path in used:
+                if len(path) == 5 and path[4] == 'vapor pressure':
+                    rows.append(self.select([list(path[:4]) + ['mole fraction']])[0] * self.select([['pressure']])[0])
+                else:
+                    rows.append(self.select([path])[0])
+            return np.array(rows).reshape(len(used), len(self))
+        if xkey == 'iteration':
+            x = self.index.astype(float)
+        else:
+            x = self.select([[xkey]])[0]
+        y = getRows(yused)
+        y2 = getRows(yused2) if yused2 else np.empty((0, len(self)))
+        valid = np.isfinite(x) & np.all(np.isfinite(y), axis=0) & np.all(np.isfinite(y2), axis=0)
+        if xkey == 'iteration':
+            x = self.index
+        return x[valid].tolist(), y[:, valid].tolist(), y2[:, valid].tolist()
+
+def flattenRecord(record, path=()):
+    # Yield (path, value) for every numeric leaf of a JSON record
+    for key, value in record.items():
+        if isinstance(value, dict):
+            yield from flattenRecord(value, path + (key,))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path + (key,), value
+
+def memmapNpz(filename, name, mode='r'):
+    # Memory-map an array stored uncompressed inside a .npz archive (also used for diagram archives)
+    with zipfile.ZipFile(filename) as archive:
+        info = archive.getinfo(f'{name}.npy')
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f'{name} is compressed in {filename} and cannot be memory-mapped')
+    with open(filename, 'rb') as f:
+        # Skip the local file header to reach the .npy data
+        f.seek(info.header_offset)
+        header = f.read(30)
+        if header[:4] != b'PK\x03\x04':
+            raise ValueError(f'{filename} is not a valid archive')
+        nameLength = int.from_bytes(header[26:28], 'little')
+        extraLength = int.from_bytes(header[28:30], 'little')
+        f.seek(info.header_offset + 30 + nameLength + extraLength)
+        npyVersion = np.lib.format.read_magic(f)
+        if npyVersion == (1, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    # np.memmap cannot map an empty array
+    if np.prod(shape) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode=mode, shape=shape, offset=offset, order='F' if fortranOrder else 'C')
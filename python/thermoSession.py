@@ -0,0 +1,110 @@
+import ctypes
+import os
+import numpy as np
+import thermoTools
+import thermoResults
+
+# In-process Thermochimica: loads the shared library (obj/libthermochimica.so, built by make) once,
+# parses the data-file once, and then runs calculations directly through the TCAPI_* bindings in
+# src/api/CouplingUtilitiesISO_C.f90. Results come back as fixed-layout records, the same layout as the
+# binary output files (see thermoTools.readBinaryOutput), so no input script or JSON is written.
+# Thermochimica keeps its state in Fortran modules, so there can only be one active session per process.
+
+class Session:
+    def __init__(self, datafile, elements, tunit='K', punit='atm', munit='moles', heatCapacity=False, fuzzyStoichiometry=False, gibbsMinCheck=False, library=None, thermochimica_path='.'):
+        if library is None:
+            library = f'{thermochimica_path}/obj/libthermochimica.so'
+        self.lib = ctypes.CDLL(os.path.abspath(library))
+        self.lib.TCAPI_getDatabasePhaseAtIndex.restype = ctypes.c_void_p
+        self.lib.TCAPI_getDatabaseSpeciesAtIndex.restype = ctypes.c_void_p
+        self.lib.TCAPI_getElementAtIndex.restype = ctypes.c_void_p
+        self.datafile = os.path.abspath(datafile)
+        self.elements = elements
+        self.atomicNumbers = [thermoTools.atomic_number_map.index(element)+1 for element in elements]
+        self.units = (tunit, punit, munit)
+
+        self.setString('TCAPI_setThermoFilename', self.datafile)
+        self.lib.TCAPI_setPrintResultsMode(ctypes.byref(ctypes.c_int(0)))
+        self.lib.TCAPI_setHeatCapacityEnthalpyEntropyRequested(ctypes.byref(ctypes.c_int(int(heatCapacity))))
+        self.lib.TCAPI_setFuzzyStoich(ctypes.byref(ctypes.c_bool(fuzzyStoichiometry)))
+        self.lib.TCAPI_setGibbsMinCheck(ctypes.byref(ctypes.c_bool(gibbsMinCheck)))
+        self.parse()
+
+        # Record layout of the parsed data-file
+        sizes = [ctypes.c_int() for _ in range(5)]
+        self.lib.TCAPI_getResultLayout(*[ctypes.byref(size) for size in sizes])
+        nElements, nPhases, nSolnSpecies, nPure, self.recordLength = [size.value for size in sizes]
+        elementNames = [self.getString('TCAPI_getElementAtIndex', i) for i in range(1, nElements+1)]
+        phaseNames = []
+        lastSpecies = []
+        for i in range(1, nPhases+1):
+            last = ctypes.c_int()
+            phaseNames.append(self.getString('TCAPI_getDatabasePhaseAtIndex', i, last))
+            lastSpecies.append(last.value)
+        speciesNames = [self.getString('TCAPI_getDatabaseSpeciesAtIndex', i) for i in range(1, nSolnSpecies+nPure+1)]
+        self.layout = (elementNames, phaseNames, np.array(lastSpecies, dtype=int), speciesNames)
+        self.columns = self.recordColumns()
+        self.nCalculations = 0
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def setString(self, function, value):
+        value = value.encode()
+        getattr(self.lib, function)(ctypes.c_char_p(value), ctypes.c_size_t(len(value)))
+    def getString(self, function, index, *extra):
+        length = ctypes.c_int()
+        pointer = getattr(self.lib, function)(ctypes.byref(ctypes.c_int(index)), ctypes.byref(length), *[ctypes.byref(e) for e in extra])
+        return ctypes.string_at(pointer, length.value).decode().strip()
+    def recordColumns(self):
+        # Columns of the records, with miscibility gap copies tagged as in JSON by the calculations so far
+        tags = []
+        for i in range(1, len(self.layout[1])+1):
+            tag = ctypes.c_int()
+            self.lib.TCAPI_getDatabasePhaseTag(ctypes.byref(ctypes.c_int(i)), ctypes.byref(tag))
+            tags.append(tag.value)
+        return thermoTools.recordColumns(len(thermoTools.binaryScalars), *self.layout, tags=np.array(tags, dtype=int))
+    def info(self):
+        info = ctypes.c_int()
+        self.lib.TCAPI_checkInfoThermo(ctypes.byref(info))
+        return info.value
+    def parse(self):
+        self.lib.TCAPI_parseCSDataFile()
+        info = self.info()
+        if info != 0:
+            raise RuntimeError(f'Thermochimica could not parse {self.datafile} (INFO = {info})')
+    def calculate(self, temperature, pressure, masses, record=None):
+        # Run one calculation and return its result record; failed calculations have a nonzero INFO
+        # column and NaN for everything after the state point
+        if record is None:
+            record = np.empty(self.recordLength)
+        tunit, punit, munit = self.units
+        self.setString('TCAPI_setUnitTemperature', tunit)
+        self.setString('TCAPI_setUnitPressure', punit)
+        self.setString('TCAPI_setUnitMass', munit)
+        self.lib.TCAPI_setTemperaturePressure(ctypes.byref(ctypes.c_double(temperature)), ctypes.byref(ctypes.c_double(pressure)))
+        for atomicNumber, mass in zip(self.atomicNumbers, masses):
+            self.lib.TCAPI_setElementMass(ctypes.byref(ctypes.c_int(atomicNumber)), ctypes.byref(ctypes.c_double(mass)))
+        self.lib.TCAPI_thermochimica()
+        self.nCalculations += 1
+        self.lib.TCAPI_getResultRecord(ctypes.byref(ctypes.c_int(self.nCalculations)), record.ctypes.data_as(ctypes.POINTER(ctypes.c_double)))
+        # Reset for the next calculation, reparsing only after a failure (as RunCalculationList does)
+        if self.info() == 0:
+            self.lib.TCAPI_resetThermo()
+        else:
+            self.lib.TCAPI_resetThermoAll()
+            self.lib.TCAPI_resetInfoThermo()
+            self.setString('TCAPI_setThermoFilename', self.datafile)
+            self.parse()
+        return record
+    def calculateList(self, calcList):
+        # Run a list of [temperature, pressure, mass 1, mass 2, ...] calculations (as for
+        # thermoTools.WriteRunCalculationList) and return the results as a thermoResults.ResultStore
+        records = np.empty((len(calcList), self.recordLength))
+        for i, calc in enumerate(calcList):
+            self.calculate(calc[0], calc[1], calc[2:], records[i])
+        records[:,0] = np.arange(1, len(calcList)+1)
+        self.columns = self.recordColumns()
+        return thermoResults.ResultStore.fromRecords(self.columns, records)
+    def close(self):
+        self.lib.TCAPI_resetThermoAll()
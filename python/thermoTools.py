@@ -3,8 +3,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 import json
 import shutil
-from pathlib import Path
 import os
+import math
+import tempfile
+import concurrent.futures
 
 atomic_number_map = [
     'H','He','Li','Be','B','C','N','O','F','Ne','Na','Mg','Al','Si','P',
@@ -17,7 +19,7 @@ atomic_number_map = [
     'Sg','Bh','Hs','Mt','Ds','Rg','Cn','Nh','Fl','Mc','Lv','Ts', 'Og'
 ]
 
-def WriteRunCalculationList(filename,datafile,elements,calcList,tunit='K',punit='atm',munit='moles',printMode=2,heatCapacity=False,writeJson=True,debugMode=False,reinitialization=False,minSpecies=None,excludePhases=None,excludePhasesExcept=None,fuzzyStoichiometry=False,fuzzyMagnitude=-1,gibbsMinCheck=False):
+def WriteRunCalculationList(filename,datafile,elements,calcList,tunit='K',punit='atm',munit='moles',printMode=2,heatCapacity=False,writeJson=True,debugMode=False,reinitialization=False,minSpecies=None,excludePhases=None,excludePhasesExcept=None,fuzzyStoichiometry=False,fuzzyMagnitude=-1,gibbsMinCheck=False,outputFile=None,writeBinary=False,binaryFile=None,parseCache=False):
     nElements = len(elements)
     with open(filename, 'w') as inputFile:
         inputFile.write('! Python-generated input file for Thermochimica\n')
@@ -31,6 +33,15 @@ def WriteRunCalculationList(filename,datafile,elements,calcList,tunit='K',punit=
         inputFile.write(f'heat capacity     = {".TRUE." if heatCapacity else ".FALSE."}\n')
         # Toggle for writing JSON output database
         inputFile.write(f'write json        = {".TRUE." if writeJson else ".FALSE."}\n')
+        # Path for JSON output (Thermochimica default is outputs/thermoout.json)
+        if outputFile:
+            inputFile.write(f'output file       = {outputFile}\n')
+        # Toggle for writing fixed-layout binary output alongside (or instead of) JSON
+        if writeBinary:
+            inputFile.write(f'write binary      = .TRUE.\n')
+            # Path for binary output (Thermochimica default is outputs/thermoout.bin)
+            if binaryFile:
+                inputFile.write(f'binary file       = {binaryFile}\n')
         # Outputs a huge amount of information to terminal
         inputFile.write(f'debug mode        = {".TRUE." if debugMode else ".FALSE."}\n')
         # Toggle reinitialization mode
@@ -56,6 +67,9 @@ def WriteRunCalculationList(filename,datafile,elements,calcList,tunit='K',punit=
         if (fuzzyStoichiometry and (fuzzyMagnitude >= 0)):
             inputFile.write(f'fuzzy magnitude   = {fuzzyMagnitude}\n')
         inputFile.write(f'gibbs min         = {".TRUE." if gibbsMinCheck else ".FALSE."}\n')
+        # Load the parsed database from (and store it to) Thermochimica's parse cache
+        if parseCache:
+            inputFile.write(f'parse cache       = .TRUE.\n')
 
         # Number of calculations to be run in list
         inputFile.write(f'nCalc             = {len(calcList)}\n')
@@ -63,7 +77,7 @@ def WriteRunCalculationList(filename,datafile,elements,calcList,tunit='K',punit=
         for calc in calcList:
             inputFile.write(f'{calc[0]} {calc[1]} {" ".join([str(calc[i]) for i in range(2,len(calc))])}\n')
 
-def WriteInputScript(filename,datafile,elements,tstart,tend,ntstep,pstart,pend,npstep,masses,tunit='K',punit='atm',munit='moles',printMode=2,heatCapacity=False,writeJson=True,debugMode=False,reinitialization=False,minSpecies=None,stepTogether=False,excludePhases=None,excludePhasesExcept=None,fuzzyStoichiometry=False,fuzzyMagnitude=-1,gibbsMinCheck=False):
+def WriteInputScript(filename,datafile,elements,tstart,tend,ntstep,pstart,pend,npstep,masses,tunit='K',punit='atm',munit='moles',printMode=2,heatCapacity=False,writeJson=True,debugMode=False,reinitialization=False,minSpecies=None,stepTogether=False,excludePhases=None,excludePhasesExcept=None,fuzzyStoichiometry=False,fuzzyMagnitude=-1,gibbsMinCheck=False,outputFile=None,parseCache=False):
     nElements = len(elements)
     with open(filename, 'w') as inputFile:
         inputFile.write('! Python-generated input file for Thermochimica\n')
@@ -96,6 +110,9 @@ def WriteInputScript(filename,datafile,elements,tstart,tend,ntstep,pstart,pend,n
         inputFile.write(f'debug mode        = {".TRUE." if debugMode else ".FALSE."}\n')
         # Toggle for writing JSON output database
         inputFile.write(f'write json        = {".TRUE." if writeJson else ".FALSE."}\n')
+        # Path for JSON output (Thermochimica default is outputs/thermoout.json)
+        if outputFile:
+            inputFile.write(f'output file       = {outputFile}\n')
         # Toggle reinitialization mode
         inputFile.write(f'reinitialization  = {".TRUE." if reinitialization else ".FALSE."}\n')
         # Discard phases by name from database
@@ -115,61 +132,139 @@ def WriteInputScript(filename,datafile,elements,tstart,tend,ntstep,pstart,pend,n
         if (fuzzyStoichiometry and (fuzzyMagnitude >= 0)):
             inputFile.write(f'fuzzy magnitude   = {fuzzyMagnitude}\n')
         inputFile.write(f'gibbs min         = {".TRUE." if gibbsMinCheck else ".FALSE."}\n')
+        # Load the parsed database from (and store it to) Thermochimica's parse cache
+        if parseCache:
+            inputFile.write(f'parse cache       = .TRUE.\n')
+
+def GetOutputPath(jsonName,thermochimica_path='.'):
+    # Names are relative to the Thermochimica outputs directory unless given as absolute paths
+    if jsonName is None:
+        return f'{thermochimica_path}/outputs/thermoout.json'
+    if os.path.isabs(jsonName):
+        return str(jsonName)
+    return f'{thermochimica_path}/outputs/{jsonName}'
 
 def RunRunCalculationList(filename,checkOutput=False,jsonName=None,thermochimica_path = '.', noOutput=False):
     thermoOut = None
+    command = [f'{thermochimica_path}/bin/RunCalculationList',filename]
+    # Have Thermochimica write directly to the requested output file
+    if jsonName:
+        command.append(GetOutputPath(jsonName,thermochimica_path))
     if checkOutput:
-        thermoOut = subprocess.check_output([f'{thermochimica_path}/bin/RunCalculationList',filename]).decode("utf-8")
+        thermoOut = subprocess.check_output(command).decode("utf-8")
     elif noOutput:
-        subprocess.run([f'{thermochimica_path}/bin/RunCalculationList',filename], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     else:
-        subprocess.run([f'{thermochimica_path}/bin/RunCalculationList',filename])
-    if jsonName:
-        try:
-            shutil.copy2(f'{thermochimica_path}/outputs/thermoout.json', f'{thermochimica_path}/outputs/{jsonName}')
-        except:
-            pass
+        subprocess.run(command)
     return thermoOut
 
-def RunInputScript(filename,checkOutput=False,jsonName=None,thermochimica_path = '.', noOutput=False):
-    thermoOut = None
-    
-    # For the results to be saved properly, the thermochimica calculation must be given an output path relative to the thermochimica
-    # directory
-
-    if jsonName is not None:
-        output_path = Path(jsonName)
-        thermochimica_outputs = (Path(thermochimica_path) / 'outputs').resolve()
-
-        # Determine the common ancestor for both paths
-        common_parts = []
-        for part1, part2 in zip(output_path.parts, thermochimica_outputs.parts):
-            if part1 == part2:
-                common_parts.append(part1)
-            else:
-                break
+def RunRunCalculationListParallel(filename,nWorkers=None,chunkSize=None,timeout=None,jsonName=None,thermochimica_path='.',noOutput=True,scratchDirectory=None,keepScratch=False):
+    # Split the calculation list in filename (as written by WriteRunCalculationList) into shards, run each shard as a
+    # separate RunCalculationList process in its own scratch directory, and merge the outputs in the original order.
+    # Shards that do not finish within timeout seconds (or fail) are killed and their calculations are left out of the
+    # result. Returns (data, missing, outputPath): the merged output, the (1-based) indices of the calculations left
+    # out, and the file the merged output was written to. If jsonName is None, this is a new temporary file in
+    # scratchDirectory (the system temporary directory by default), which the caller owns and should delete.
+    # Raises ValueError if filename has no nCalc line.
+    if nWorkers is None:
+        nWorkers = os.cpu_count() or 1
+    with open(filename, 'r') as inputFile:
+        lines = inputFile.readlines()
+
+    # Separate the header (everything up to and including nCalc) from the calculation lines
+    header = []
+    calcLines = []
+    nCalc = None
+    for line in lines:
+        if nCalc is None:
+            tag, _, value = line.partition('=')
+            tag = tag.strip()
+            if tag in ['ncalc','nCalc']:
+                nCalc = int(value)
+                continue
+            # Shards run in their own directories, so relative data file paths have to be made absolute
+            if tag.lower() in ['data','data_file','data file','dat','dat_file','dat file']:
+                datafile = value.strip()
+                if not os.path.isabs(datafile):
+                    line = f'{tag} = {os.path.abspath(datafile)}\n'
+            header.append(line)
+        elif line.strip():
+            calcLines.append(line)
+    if nCalc is None:
+        raise ValueError(f'Calculation list not found in {filename}')
+    calcLines = calcLines[:nCalc]
+
+    if chunkSize is None:
+        chunkSize = math.ceil(len(calcLines) / nWorkers)
+    chunkSize = max(1, int(chunkSize))
+    # An empty list has no shards, and writes an empty output
+    offsets = list(range(0, len(calcLines), chunkSize))
+
+    executable = os.path.abspath(f'{thermochimica_path}/bin/RunCalculationList')
+    shardDirectories = []
+    for offset in offsets:
+        shardDirectory = tempfile.mkdtemp(prefix='thermochimica-shard-', dir=scratchDirectory)
+        shardDirectories.append(shardDirectory)
+        shardCalcs = calcLines[offset:offset+chunkSize]
+        with open(os.path.join(shardDirectory, 'input.ti'), 'w') as shardFile:
+            shardFile.writelines(header)
+            shardFile.write(f'nCalc             = {len(shardCalcs)}\n')
+            shardFile.writelines(shardCalcs)
 
-        # Count how many steps up from thermochimica_outputs to the common ancestor
-        steps_up = len(thermochimica_outputs.parts) - len(common_parts)
+    def runShard(shardDirectory):
+        stream = subprocess.DEVNULL if noOutput else None
+        try:
+            subprocess.run([executable, 'input.ti', 'thermoout.json'], cwd=shardDirectory, stdout=stream, stderr=stream, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f'Calculation shard in {shardDirectory} timed out and was cancelled')
+            return None
+        try:
+            return readDatabase(os.path.join(shardDirectory, 'thermoout.json'))
+        except (OSError, json.JSONDecodeError):
+            print(f'Data load failed for calculation shard in {shardDirectory}')
+            return None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nWorkers) as executor:
+        shardData = list(executor.map(runShard, shardDirectories))
+
+    # Merge shard outputs, keyed by position in the original calculation list
+    data = {}
+    for offset, shard in zip(offsets, shardData):
+        if shard is None:
+            continue
+        for key in sorted(shard.keys(), key=int):
+            data[str(offset + int(key))] = shard[key]
+
+    missing = [i for i in range(1, len(calcLines)+1) if str(i) not in data]
+    if missing:
+        print(f'{len(missing)} of {len(calcLines)} calculations are missing from the merged output')
 
-        # Create the relative parts consisting of the steps up and then the unique parts of output_path
-        relative_parts = ['..'] * steps_up + list(output_path.parts[len(common_parts):])
+    if not keepScratch:
+        for shardDirectory in shardDirectories:
+            shutil.rmtree(shardDirectory, ignore_errors=True)
 
-        # Combine the parts into a relative path and overwrite the output path, the final result is an output path relative
-        # to the thermochimica directory
-        jsonName = str(Path(*relative_parts))
+    # Without a jsonName, write to a file of this call's own rather than the shared outputs/thermoout.json
+    if jsonName is None:
+        descriptor, outputPath = tempfile.mkstemp(prefix='thermochimica-', suffix='.json', dir=scratchDirectory)
+        os.close(descriptor)
+    else:
+        outputPath = GetOutputPath(jsonName,thermochimica_path)
+    with open(outputPath, 'w') as outfile:
+        json.dump(data, outfile, indent=4)
+    return data, missing, outputPath
 
+def RunInputScript(filename,checkOutput=False,jsonName=None,thermochimica_path = '.', noOutput=False):
+    thermoOut = None
+    command = [f'{thermochimica_path}/bin/InputScriptMode',filename]
+    # Have Thermochimica write directly to the requested output file
+    if jsonName:
+        command.append(GetOutputPath(jsonName,thermochimica_path))
     if checkOutput:
-        thermoOut = subprocess.check_output([f'{thermochimica_path}/bin/InputScriptMode',filename]).decode("utf-8")
+        thermoOut = subprocess.check_output(command).decode("utf-8")
     elif noOutput:
-        subprocess.run([f'{thermochimica_path}/bin/InputScriptMode',filename], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     else:
-        subprocess.run([f'{thermochimica_path}/bin/InputScriptMode',filename])
-    if jsonName:
-        try:
-            shutil.copy2(f'{thermochimica_path}/outputs/thermoout.json', f'{thermochimica_path}/outputs/{jsonName}')
-        except:
-            pass
+        subprocess.run(command)
 
     # Delete input file
     os.remove(filename)
@@ -257,7 +352,7 @@ def selectData(yen,ykey,leg,yen2=None,ykey2=None,leg2=None):
 
     return yused, legend, yused2, legend2
 
-def plotDataSetup(datafile,xkey,yused,yused2=None,sort=True):
+def readPlotData(datafile,xkey,yused,yused2=None):
     # Init axes
     x = []
     y = [[] for _ in range(len(yused))]
@@ -266,39 +361,57 @@ def plotDataSetup(datafile,xkey,yused,yused2=None,sort=True):
     else:
         y2 = []
     
+    # Only keep the top-level fields that are needed
+    fields = [yu[0] for yu in yused]
+    if yused2:
+        fields.extend([yu[0] for yu in yused2])
+    fields.extend(['pressure', xkey])
+
     # Loop over all calculations and get requested values
-    data = readDatabase(datafile)
-    for j in data.keys():
+    for j, record in iterDatabase(datafile,fields=fields):
         try:
             for yi in range(len(yused)):
                 if len(yused[yi]) == 1:
-                    y[yi].append(data[j][yused[yi][0]])
+                    y[yi].append(record[yused[yi][0]])
                 elif len(yused[yi]) == 3:
-                    y[yi].append(data[j][yused[yi][0]][yused[yi][1]][yused[yi][2]])
+                    y[yi].append(record[yused[yi][0]][yused[yi][1]][yused[yi][2]])
                 elif len(yused[yi]) == 5:
                     if yused[yi][4] == 'vapor pressure':
-                        y[yi].append(data[j][yused[yi][0]][yused[yi][1]][yused[yi][2]][yused[yi][3]]['mole fraction']*data[j]['pressure'])
+                        y[yi].append(record[yused[yi][0]][yused[yi][1]][yused[yi][2]][yused[yi][3]]['mole fraction']*record['pressure'])
                     else:
-                        y[yi].append(data[j][yused[yi][0]][yused[yi][1]][yused[yi][2]][yused[yi][3]][yused[yi][4]])
+                        y[yi].append(record[yused[yi][0]][yused[yi][1]][yused[yi][2]][yused[yi][3]][yused[yi][4]])
             if yused2:
                 for yi in range(len(yused2)):
                     if len(yused2[yi]) == 1:
-                        y2[yi].append(data[j][yused2[yi][0]])
+                        y2[yi].append(record[yused2[yi][0]])
                     elif len(yused2[yi]) == 3:
-                        y2[yi].append(data[j][yused2[yi][0]][yused2[yi][1]][yused2[yi][2]])
+                        y2[yi].append(record[yused2[yi][0]][yused2[yi][1]][yused2[yi][2]])
                     elif len(yused2[yi]) == 5:
                         if yused2[yi][4] == 'vapor pressure':
-                            y2[yi].append(data[j][yused2[yi][0]][yused2[yi][1]][yused2[yi][2]][yused2[yi][3]]['mole fraction']*data[j]['pressure'])
+                            y2[yi].append(record[yused2[yi][0]][yused2[yi][1]][yused2[yi][2]][yused2[yi][3]]['mole fraction']*record['pressure'])
                         else:
-                            y2[yi].append(data[j][yused2[yi][0]][yused2[yi][1]][yused2[yi][2]][yused2[yi][3]][yused2[yi][4]])
+                            y2[yi].append(record[yused2[yi][0]][yused2[yi][1]][yused2[yi][2]][yused2[yi][3]][yused2[yi][4]])
             if xkey == 'iteration':
-                x.append(int(j))
+                x.append(j)
             else:
-                x.append(data[j][xkey])
+                x.append(record[xkey])
         except:
             # do nothing
             continue
-    
+
+    return x,y,y2
+
+def plotDataSetup(datafile,xkey,yused,yused2=None,sort=True):
+    # Get requested values from either a columnar result store or a JSON output series
+    if str(datafile).endswith('.npz'):
+        import thermoResults
+        x,y,y2 = thermoResults.ResultStore.load(datafile).plotData(xkey,yused,yused2)
+    elif str(datafile).endswith('.bin'):
+        import thermoResults
+        x,y,y2 = thermoResults.ResultStore.fromBinary(datafile).plotData(xkey,yused,yused2)
+    else:
+        x,y,y2 = readPlotData(datafile,xkey,yused,yused2)
+
     # Sort data unless asked not to
     if sort:
         sortOrder = [i for i,_ in sorted(enumerate(x),key=lambda s:s[1])]
@@ -452,3 +565,185 @@ def readDatabase(datafile):
     f.close()
     return data
 
+def iterDatabase(datafile,fields=None,chunkSize=1<<20):
+    # Yield (index, record) pairs from a Thermochimica JSON output series one calculation at a time,
+    # so only a single record is held in memory. If fields is given, only those top-level keys are kept.
+    decoder = json.JSONDecoder()
+    with open(datafile,) as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def nextToken():
+            # Skip whitespace and commas between entries, reading more of the file as needed
+            nonlocal buffer, pos, eof
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return buffer[pos] if pos < len(buffer) else ''
+                buffer = f.read(chunkSize)
+                pos = 0
+                eof = not buffer
+
+        def decodeValue():
+            # Decode the next complete JSON value, reading more of the file until it is available
+            nonlocal buffer, pos, eof
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A number at the end of the buffer may have been cut off
+                    if end < len(buffer) or eof or not isinstance(value, (int, float)):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                more = f.read(chunkSize)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+
+        if nextToken() != '{':
+            raise ValueError(f'{datafile} does not contain a JSON object')
+        pos += 1
+        while True:
+            token = nextToken()
+            if token == '}':
+                return
+            if token != '"':
+                raise ValueError(f'Unexpected content in {datafile}')
+            key = decodeValue()
+            if nextToken() != ':':
+                raise ValueError(f'Unexpected content in {datafile}')
+            pos += 1
+            nextToken()
+            record = decodeValue()
+            # Drop what has already been parsed
+            buffer = buffer[pos:]
+            pos = 0
+            if fields is not None and isinstance(record, dict):
+                record = {field: record[field] for field in fields if field in record}
+            try:
+                index = int(key)
+            except ValueError:
+                index = key
+            yield index, record
+
+binaryScalars = ['index','INFO','temperature','pressure','integral Gibbs energy','entropy','enthalpy','heat capacity',
+                 'functional norm','GEM iterations','# solution phases','# pure condensed phases']
+binaryVersion = 3
+elementProperties = ['moles of element in phase','mole fraction of phase by element','mole fraction of element by phase']
+# JSON output that fixed-layout result records do not hold
+binaryOmitted = 'phase models, stoichiometries, sublattice and quadruplet data and magnetic properties'
+
+class RecordColumns(dict):
+    # Columns of fixed-layout result records; looking up a path that is not recorded says so
+    def __missing__(self, path):
+        raise KeyError(f'{path} is not recorded in fixed-layout result records ({binaryOmitted} are only written to JSON)')
+
+def readBinaryOutput(datafile,mmap=True):
+    # Read a Thermochimica binary output file (write binary = .TRUE.). Returns (columns, records), where
+    # records is a (calculations x record length) array, memory-mapped unless mmap is False, and columns
+    # maps JSON-style key tuples, e.g. ('solution phases','LIQUID','species','Pd','mole fraction'), to
+    # record columns. Entries that do not apply to a calculation are NaN.
+    def names(f, count, length):
+        return [name.decode().strip() for name in np.fromfile(f, dtype=f'S{length}', count=count)]
+    with open(datafile,'rb') as f:
+        if f.read(8) != b'THERMOBN':
+            raise ValueError(f'{datafile} is not a Thermochimica binary output file')
+        version, headerLength, recordLength, nScalars, nElements, nPhases, nSolnSpecies, nPure = np.fromfile(f, dtype='<i4', count=8)
+        if version > binaryVersion:
+            raise ValueError(f'{datafile} was written by a newer binary output version ({version})')
+        elements = names(f, nElements, 3)
+        phases = names(f, nPhases, 25)
+        # Phase models are not needed to locate columns
+        names(f, nPhases, 8)
+        lastSpecies = np.fromfile(f, dtype='<i4', count=nPhases)
+        tags = np.fromfile(f, dtype='<i4', count=nPhases) if version >= 3 else None
+        species = names(f, nSolnSpecies + nPure, 25)
+    columns = recordColumns(nScalars, elements, phases, lastSpecies, species, version, tags)
+
+    nRecords = (os.path.getsize(datafile) - headerLength) // (8 * recordLength)
+    if nRecords == 0:
+        records = np.empty((0, recordLength))
+    elif mmap:
+        records = np.memmap(datafile, dtype='<f8', mode='r', offset=headerLength, shape=(nRecords, recordLength))
+    else:
+        records = np.fromfile(datafile, dtype='<f8', offset=headerLength, count=nRecords*recordLength).reshape(nRecords, recordLength)
+    return columns, records
+
+def recordColumns(nScalars,elements,phases,lastSpecies,species,version=binaryVersion,tags=None):
+    # Map JSON-style key tuples to the columns of a fixed-layout result record (binary output or
+    # thermoSession), given the data-file element, solution phase and species names. Version 1 records
+    # end after the pure condensed phases.
+    nSolnSpecies = lastSpecies[-1] if len(lastSpecies) > 0 else 0
+    # Miscibility gap copies share a name in the database. JSON tags them with their index in the system
+    # (tags, 0 for copies that no record has labelled), otherwise their database index is used
+    if tags is None:
+        tags = np.zeros(len(phases), dtype=int)
+    phases = [f'{phase}#{tags[i] if tags[i] > 0 else i+1}' if i > 0 and phase == phases[i-1] else phase for i, phase in enumerate(phases)]
+    # Pure condensed phases sharing a name are tagged in order of appearance
+    pureNames = []
+    seen = {}
+    for name in species[nSolnSpecies:]:
+        seen[name] = seen.get(name, 0) + 1
+        pureNames.append(f'{name}#{seen[name]}' if seen[name] > 1 else name)
+
+    columns = RecordColumns()
+    def addBlock(paths):
+        for path in paths:
+            # Species repeated within a phase (or pure phases sharing a name) are tagged like phases
+            name, n = path[-2] if len(path) > 1 else path[0], 1
+            while path in columns:
+                n += 1
+                path = path[:-2] + (f'{name}#{n}', path[-1])
+            columns[path] = len(columns)
+    addBlock([(key,) for key in binaryScalars[:nScalars]])
+    for prop in ['moles','element potential']:
+        addBlock([('elements', element, prop) for element in elements])
+    for prop in ['moles','driving force']:
+        addBlock([('solution phases', phase, prop) for phase in phases])
+    phaseOfSpecies = np.searchsorted(lastSpecies, np.arange(nSolnSpecies), side='right')
+    for prop in ['mole fraction','chemical potential']:
+        addBlock([('solution phases', phases[phaseOfSpecies[i]], 'species', species[i], prop) for i in range(nSolnSpecies)])
+    for prop in ['moles','chemical potential','driving force']:
+        addBlock([('pure condensed phases', name, prop) for name in pureNames])
+    if version < 2:
+        return columns
+    addBlock([('solution phases', phases[phaseOfSpecies[i]], 'species', species[i], 'moles') for i in range(nSolnSpecies)])
+    for prop in elementProperties:
+        addBlock([('solution phases', phase, 'elements', element, prop) for phase in phases for element in elements])
+    for prop in elementProperties:
+        addBlock([('pure condensed phases', name, 'elements', element, prop) for name in pureNames for element in elements])
+    return columns
+
+def serpentineOrder(calcList):
+    # Order a list of [temperature, pressure, mass 1, mass 2, ...] calculations as a path for warm-started
+    # runs (reinitialization = True): increasing temperature, with composition sweeping back and forth so
+    # consecutive calculations are neighbours. Returns the indices of calcList in path order.
+    temperatures = sorted(set(calc[0] for calc in calcList))
+    rows = {t: [] for t in temperatures}
+    for i, calc in enumerate(calcList):
+        rows[calc[0]].append(i)
+    order = []
+    for n, t in enumerate(temperatures):
+        row = sorted(rows[t], key=lambda i: (calcList[i][1],) + tuple(calcList[i][2:]))
+        order.extend(row[::-1] if n % 2 else row)
+    return order
+
+def warmStartSavings(datafile):
+    # GEM iterations per calculation of a warm-started JSON output series. Returns (index, iterations,
+    # warm, savings), where warm marks calculations seeded from the previous result and savings is the
+    # mean iteration count of the cold-started calculations less the iterations of each calculation.
+    index, iterations, warm = [], [], []
+    for i, record in iterDatabase(datafile, fields=['GEM iterations','warm start']):
+        if 'GEM iterations' not in record:
+            continue
+        index.append(i)
+        iterations.append(record['GEM iterations'])
+        warm.append(bool(record.get('warm start', 0)))
+    iterations = np.array(iterations, dtype=float)
+    warm = np.array(warm, dtype=bool)
+    coldMean = iterations[~warm].mean() if np.any(~warm) else np.nan
+    return np.array(index), iterations, warm, coldMean - iterations
@@ -96,4 +96,11 @@ extern "C"
   void TCAPI_setFuzzyStoich(bool *);
   void TCAPI_setFuzzyMagnitude(double *);
   void TCAPI_setGibbsMinCheck(bool *);
+
+  // Fixed-layout results (same layout as the binary output records)
+  void TCAPI_getResultLayout(int *, int *, int *, int *, int *);
+  char *TCAPI_getDatabasePhaseAtIndex(int *, int *, int *);
+  void TCAPI_getDatabasePhaseTag(int *, int *);
+  char *TCAPI_getDatabaseSpeciesAtIndex(int *, int *);
+  void TCAPI_getResultRecord(int *, double *);
 }
@@ -1181,3 +1181,96 @@ subroutine SetFuzzyStoichISO(lFuzzyStoichIn) &
 
     return
   end subroutine SetGibbsMinCheckISO
+
+  subroutine GetResultLayoutISO(nElementsOut, nSolnPhasesOut, nSolnSpeciesOut, nPureConOut, nRecordLengthOut) &
+    bind(C, name="TCAPI_getResultLayout")
+
+    USE,INTRINSIC :: ISO_C_BINDING
+    USE ModuleThermoIO, ONLY: iSolnPhaseTagCS
+    USE ModuleParseCS, ONLY: nElementsCS, nSpeciesCS, nSolnPhasesSysCS, nSpeciesPhaseCS
+
+    implicit none
+    integer(C_INT), intent(out) :: nElementsOut, nSolnPhasesOut, nSolnSpeciesOut, nPureConOut, nRecordLengthOut
+    integer :: nRecordLength
+
+    nElementsOut    = nElementsCS
+    nSolnPhasesOut  = nSolnPhasesSysCS
+    nSolnSpeciesOut = nSpeciesPhaseCS(nSolnPhasesSysCS)
+    nPureConOut     = nSpeciesCS - nSpeciesPhaseCS(nSolnPhasesSysCS)
+    call GetBinaryRecordLength(nRecordLength)
+    nRecordLengthOut = nRecordLength
+
+    ! Start a new series of records, in which no miscibility gap copies have been labelled yet:
+    if (allocated(iSolnPhaseTagCS)) deallocate(iSolnPhaseTagCS)
+    allocate(iSolnPhaseTagCS(nSolnPhasesSysCS))
+    iSolnPhaseTagCS = 0
+
+    return
+  end subroutine GetResultLayoutISO
+
+  function GetDatabasePhaseAtIndexISO(index, len, iLastSpecies) &
+    bind(C, name='TCAPI_getDatabasePhaseAtIndex')
+
+    USE,INTRINSIC :: ISO_C_BINDING
+    USE ModuleParseCS, ONLY: cSolnPhaseNameCS, nSpeciesPhaseCS
+
+    implicit none
+    integer(C_INT), intent(in)  :: index
+    integer(C_INT), intent(out) :: len, iLastSpecies
+    type(c_ptr) :: GetDatabasePhaseAtIndexISO
+
+    GetDatabasePhaseAtIndexISO = c_loc(cSolnPhaseNameCS(index))
+    len = len_trim(cSolnPhaseNameCS(index))
+    iLastSpecies = nSpeciesPhaseCS(index)
+
+    return
+  end function GetDatabasePhaseAtIndexISO
+
+  subroutine GetDatabasePhaseTagISO(index, iTag) &
+    bind(C, name='TCAPI_getDatabasePhaseTag')
+
+    USE,INTRINSIC :: ISO_C_BINDING
+    USE ModuleThermoIO, ONLY: iSolnPhaseTagCS
+
+    implicit none
+    integer(C_INT), intent(in)  :: index
+    integer(C_INT), intent(out) :: iTag
+
+    iTag = 0
+    if (allocated(iSolnPhaseTagCS)) iTag = iSolnPhaseTagCS(index)
+
+    return
+  end subroutine GetDatabasePhaseTagISO
+
+  function GetDatabaseSpeciesAtIndexISO(index, len) &
+    bind(C, name='TCAPI_getDatabaseSpeciesAtIndex')
+
+    USE,INTRINSIC :: ISO_C_BINDING
+    USE ModuleParseCS, ONLY: cSpeciesNameCS
+
+    implicit none
+    integer(C_INT), intent(in)  :: index
+    integer(C_INT), intent(out) :: len
+    type(c_ptr) :: GetDatabaseSpeciesAtIndexISO
+
+    GetDatabaseSpeciesAtIndexISO = c_loc(cSpeciesNameCS(index))
+    len = len_trim(cSpeciesNameCS(index))
+
+    return
+  end function GetDatabaseSpeciesAtIndexISO
+
+  subroutine GetResultRecordISO(iRecord, dRecord) &
+    bind(C, name="TCAPI_getResultRecord")
+
+    USE,INTRINSIC :: ISO_C_BINDING
+
+    implicit none
+    integer(C_INT), intent(in)                :: iRecord
+    real(C_DOUBLE), intent(out), dimension(*) :: dRecord
+    integer :: nRecordLength
+
+    call GetBinaryRecordLength(nRecordLength)
+    call GetBinaryRecord(iRecord, dRecord, nRecordLength)
+
+    return
+  end subroutine GetResultRecordISO
@@ -28,6 +28,15 @@
     !> \param       cThermoFileName  Name of a ChemSage data-file (e.g., 'UO2fuelthermo.dat').
     !!                            NOTE: this has a maximum of 120 characters, which includes the path and the
     !!                            file extension.
+    !> \param       cOutputFileName  Path of the JSON output file. If left blank, the default
+    !!                            outputs/thermoout.json in the Thermochimica directory is used.
+    !> \param       lParseCache      Load parsed data-files from, and store them to, the parse cache
+    !!                            (see ParseCSCache.F90).
+    !> \param       cBinaryFileName  Path of the binary output file, written when lWriteBinary is set. If left
+    !!                            blank, the default outputs/thermoout.bin in the Thermochimica directory is used.
+    !> \param       iSolnPhaseTagCS  The system index with which each data-file solution phase has been labelled as a
+    !!                            miscibility gap copy (e.g. 'IONIC_LIQ#2') in the result records written so far
+    !!                            (0 if it has not been), recorded in the binary output header.
     !> \param       cInputUnitTemperature:  A character scalar representing the temperature units
     !!                                       ['K', 'C', 'F', 'R'];
     !> \param       cInputUnitPressure:  A character scalar representing the pressure units
@@ -52,14 +61,17 @@ module ModuleThermoIO
 
     ! INPUT VARIABLES:
     integer                                  :: iCounter, iPrintResultsMode, nMinSpeciesPerPhase = 2
+    integer,       parameter                 :: nBinaryScalars = 12
+    integer,       dimension(:), allocatable :: iSolnPhaseTagCS
     real(8)                                  :: dTemperature, dPressure, dFuzzMag = 1D-12
     real(8),       dimension(0:168)          :: dElementMass
     logical,       dimension(0:118)          :: lPreset = .FALSE.
     character(15)                            :: cInputUnitTemperature, cInputUnitPressure, cInputUnitMass
     character(:), allocatable                :: cThermoFileName
+    character(1024)                          :: cOutputFileName = '', cBinaryFileName = ''
     logical                                  :: lReinitAvailable = .FALSE., lReinitLoaded = .FALSE., lReinitRequested = .FALSE.
-    logical                                  :: lStepTogether = .FALSE., lWriteJSON = .FALSE.
-    logical                                  :: lFuzzyStoich = .FALSE., lGibbsMinCheck = .FALSE.
+    logical                                  :: lStepTogether = .FALSE., lWriteJSON = .FALSE., lWriteBinary = .FALSE.
+    logical                                  :: lFuzzyStoich = .FALSE., lGibbsMinCheck = .FALSE., lParseCache = .FALSE.
     integer                                  :: nPhasesExcluded = 0, nPhasesExcludedExcept = 0
     character(25), dimension(1000)           :: cPhasesExcluded = '', cPhasesExcludedExcept = ''
 
@@ -104,6 +104,7 @@
     ! ====================
     !
     !> \param[in]  cFileName    A character string representing the path and name of the ChemSage data-file.
+    !  lParseCache  Load the parsed state from (and store it to) the parse cache, see ParseCSCache.F90.
     !  INFO         An integer scalar representing a successful exit or an error.
     !
     !-------------------------------------------------------------------------------------------------------------
@@ -112,12 +113,13 @@
 subroutine ParseCSDataFile(cFileName)
 
     USE ModuleParseCS
-    USE ModuleThermoIO, ONLY: INFOThermo
+    USE ModuleThermoIO, ONLY: INFOThermo, lParseCache
 
     implicit none
 
     character(*)::  cFileName
     character(1024) :: cFileNameLen
+    logical :: lLoaded
 
     cFileNameLen = cFileName(1:min(1024,len(cFileName)))
 
@@ -126,6 +128,12 @@ subroutine ParseCSDataFile(cFileName)
     INFOThermo = 0
     INFO       = 0
 
+    ! Load the parsed state of this data-file from the parse cache if it is up to date:
+    if (lParseCache) then
+        call ReadCSCache(TRIM(cFileNameLen), lLoaded)
+        if (lLoaded) return
+    end if
+
     ! Attempt to open the ChemSage datafile:
     open (UNIT = 1, FILE = cFileNameLen, STATUS = 'old', ACTION = 'read', IOSTAT = INFO)
 
@@ -151,6 +159,9 @@ subroutine ParseCSDataFile(cFileName)
     ! Make sure that there aren't any issues closing the data-file:
     if (INFO /= 0) INFOThermo = 6
 
+    ! Store the parsed state for later runs:
+    if (lParseCache .AND. (INFOThermo == 0)) call WriteCSCache(TRIM(cFileNameLen))
+
     return
 
 end subroutine ParseCSDataFile
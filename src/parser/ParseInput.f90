@@ -299,6 +299,24 @@ subroutine ParseInput(cInputFileName,dTempLow,dTempHigh,dDeltaT,dPressLow,dPress
           print *,  trim(cErrMsg)
           return
         end if
+      case ('output file','Output file','Output File','output_file','Output_file','Output_File',&
+        'json file','JSON file','JSON File','json_file','JSON_file','JSON_File')
+        read(cValue,'(A)',IOSTAT = INFO) cOutputFileName
+        if (INFO /= 0) then
+          INFOThermo = 54
+          write (cErrMsg, '(A37,I10)') 'Cannot read output filename on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        endif
+      case ('parse cache','Parse cache','Parse Cache','parse_cache','Parse_cache','Parse_Cache',&
+        'parseCache','ParseCache')
+        read(cValue,*,IOSTAT = INFO) lParseCache
+        if (INFO /= 0) then
+          INFOThermo = 54
+          write (cErrMsg, '(A38,I10)') 'Cannot read parse cache mode on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        end if
       case ('nMinSpeciesPerPhase','species per phase','min species','minimum species per phase')
         read(cValue,*,IOSTAT = INFO) nMinSpeciesPerPhase
         if (INFO /= 0) then
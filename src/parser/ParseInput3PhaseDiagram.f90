@@ -300,6 +300,24 @@ subroutine ParseInput3PhaseDiagram(cInputFileName,dTemp,dX1lo,dX1hi,dDeltaX1,dX2
           print *,  trim(cErrMsg)
           return
         endif
+      case ('output file','Output file','Output File','output_file','Output_file','Output_File',&
+        'json file','JSON file','JSON File','json_file','JSON_file','JSON_File')
+        read(cValue,'(A)',IOSTAT = INFO) cOutputFileName
+        if (INFO /= 0) then
+          INFOThermo = 44
+          write (cErrMsg, '(A37,I10)') 'Cannot read output filename on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        endif
+      case ('parse cache','Parse cache','Parse Cache','parse_cache','Parse_cache','Parse_Cache',&
+        'parseCache','ParseCache')
+        read(cValue,*,IOSTAT = INFO) lParseCache
+        if (INFO /= 0) then
+          INFOThermo = 44
+          write (cErrMsg, '(A38,I10)') 'Cannot read parse cache mode on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        end if
       case ('fuzzy','fuzzy stoichiometry','fuzzystoichiometry','fuzzy_stoichiometry',&
         'Fuzzy','Fuzzy Stoichiometry','FuzzyStoichiometry','Fuzzy_Stoichiometry')
         read(cValue,*,IOSTAT = INFO) lFuzzyStoich
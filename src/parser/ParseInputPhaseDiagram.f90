@@ -310,6 +310,41 @@ subroutine ParseInputPhaseDiagram(cInputFileName,dTempLow,dTempHigh,dDeltaT,dXlo
           print *,  trim(cErrMsg)
           return
         endif
+      case ('output file','Output file','Output File','output_file','Output_file','Output_File',&
+        'json file','JSON file','JSON File','json_file','JSON_file','JSON_File')
+        read(cValue,'(A)',IOSTAT = INFO) cOutputFileName
+        if (INFO /= 0) then
+          INFOThermo = 44
+          write (cErrMsg, '(A37,I10)') 'Cannot read output filename on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        endif
+      case ('parse cache','Parse cache','Parse Cache','parse_cache','Parse_cache','Parse_Cache',&
+        'parseCache','ParseCache')
+        read(cValue,*,IOSTAT = INFO) lParseCache
+        if (INFO /= 0) then
+          INFOThermo = 44
+          write (cErrMsg, '(A38,I10)') 'Cannot read parse cache mode on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        end if
+      case ('writeBinary','writebinary','WriteBinary','write_binary','Write_Binary',&
+        'write binary','Write binary','Write Binary')
+        read(cValue,*,IOSTAT = INFO) lWriteBinary
+        if (INFO /= 0) then
+          INFOThermo = 44
+          write (cErrMsg, '(A39,I10)') 'Cannot read write binary mode on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        end if
+      case ('binary file','Binary file','Binary File','binary_file','Binary_file','Binary_File')
+        read(cValue,'(A)',IOSTAT = INFO) cBinaryFileName
+        if (INFO /= 0) then
+          INFOThermo = 44
+          write (cErrMsg, '(A37,I10)') 'Cannot read binary filename on line: ', iCounter
+          print *,  trim(cErrMsg)
+          return
+        endif
       case ('fuzzy','fuzzy stoichiometry','fuzzystoichiometry','fuzzy_stoichiometry',&
         'Fuzzy','Fuzzy Stoichiometry','FuzzyStoichiometry','Fuzzy_Stoichiometry')
         read(cValue,*,IOSTAT = INFO) lFuzzyStoich
@@ -0,0 +1,103 @@
+    !-------------------------------------------------------------------------------------------------------------
+    !
+    !> \file    ThermochimicaWarmStart.f90
+    !> \brief   Run Thermochimica seeded from the previous converged result, with a cold fallback.
+    !> \sa      SaveReinitData.f90
+    !> \sa      LoadReinitData.f90
+    !
+    !
+    ! Purpose:
+    ! ========
+    !> \details The purpose of this subroutine is to chain calculations along a sweep (e.g. neighbouring points
+    !! of a temperature-composition grid). When a warm start is requested, the calculation is initialized from
+    !! the reinitialization data saved after the previous successful calculation rather than from the leveling
+    !! solver. If a warm-started calculation fails, the data-file is parsed again and the calculation is repeated
+    !! from a cold start. After a successful calculation the result is saved to seed the next one.
+    !
+    ! Pertinent variables:
+    ! ====================
+    !> \param   lWarmStart     A logical indicating whether a warm start is requested.
+    !> \param   lWarm          A logical indicating whether the calculation was started from saved data.
+    !> \param   lColdRetry     A logical indicating whether a failed warm start was repeated from a cold start.
+    !
+    !-------------------------------------------------------------------------------------------------------------
+
+
+subroutine ThermochimicaWarmStart(lWarmStart, lWarm, lColdRetry)
+
+  USE ModuleThermoIO
+
+  implicit none
+
+  logical, intent(in)  :: lWarmStart
+  logical, intent(out) :: lWarm, lColdRetry
+  real(8)              :: dTemperatureIn, dPressureIn
+  real(8), dimension(0:168) :: dElementMassIn
+  character(15)        :: cUnitTemperatureIn, cUnitPressureIn, cUnitMassIn
+
+  lWarm      = .FALSE.
+  lColdRetry = .FALSE.
+
+  ! Keep the input state, which the setup routines convert in place, for a possible cold retry:
+  dTemperatureIn     = dTemperature
+  dPressureIn        = dPressure
+  dElementMassIn     = dElementMass
+  cUnitTemperatureIn = cInputUnitTemperature
+  cUnitPressureIn    = cInputUnitPressure
+  cUnitMassIn        = cInputUnitMass
+
+  lReinitRequested = lWarmStart
+  call Thermochimica
+  lWarm = lReinitLoaded
+
+  if ((INFOThermo /= 0) .AND. lWarm) then
+      ! Discard the saved data and repeat from a cold start:
+      lWarm      = .FALSE.
+      lColdRetry = .TRUE.
+      call ResetThermoAll
+      INFOThermo = 0
+      call ParseCSDataFile(cThermoFileName)
+      dTemperature          = dTemperatureIn
+      dPressure             = dPressureIn
+      dElementMass          = dElementMassIn
+      cInputUnitTemperature = cUnitTemperatureIn
+      cInputUnitPressure    = cUnitPressureIn
+      cInputUnitMass        = cUnitMassIn
+      if (INFOThermo == 0) call Thermochimica
+  end if
+
+  ! The heat capacity calculation switches reinitialization off, so restore the request:
+  lReinitRequested = lWarmStart
+  if (lWarmStart .AND. (INFOThermo == 0)) call SaveReinitData
+
+  return
+
+end subroutine ThermochimicaWarmStart
+
+!-------------------------------------------------------------------------------------------------------------
+!-------------------------------------------------------------------------------------------------------------
+
+subroutine PrintWarmStartSummary(nWarm, nCold, nColdRetry, iterWarm, iterCold)
+
+  ! Print the number of warm-started calculations and the mean GEM iterations with and without a warm start.
+
+  implicit none
+
+  integer, intent(in) :: nWarm, nCold, nColdRetry, iterWarm, iterCold
+  real(8)             :: dMeanWarm, dMeanCold
+
+  dMeanWarm = 0D0
+  dMeanCold = 0D0
+  if (nWarm > 0) dMeanWarm = DBLE(iterWarm) / DBLE(nWarm)
+  if (nCold > 0) dMeanCold = DBLE(iterCold) / DBLE(nCold)
+
+  print '(A,I8,A,I8,A,I6,A)', ' Warm start: ', nWarm, ' of ', nWarm + nCold, &
+      ' converged calculations seeded from the previous result (', nColdRetry, ' cold restarts)'
+  if ((nWarm > 0) .AND. (nCold > 0)) then
+      print '(A,F8.2,A,F8.2,A,F8.2,A)', ' Mean GEM iterations: ', dMeanWarm, ' warm, ', dMeanCold, &
+          ' cold (', dMeanCold - dMeanWarm, ' saved per warm-started calculation)'
+  end if
+
+  return
+
+end subroutine PrintWarmStartSummary